@@ -1,50 +1,103 @@
 from flask import Flask, request, jsonify, render_template_string, Response
-import queue
+from flask.logging import default_handler as flask_default_handler
 from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+import asyncio
 import json
 import threading
 import logging
 import werkzeug
 from datetime import datetime, timezone
 import os
+import time
 import ipaddress
+import csv
+import io
+from types import MappingProxyType
+from pod_index import PodIndex, pod_info_from_dict
+from k8s_raw import RawCoreV1Api, LabelPatches, MERGE_PATCH
+from ratelimit import TokenBucket, RateLimitedApi
+from service_index import ServiceIndex
+from coalescer import PatchCoalescer
+from workers import RemediationPool, AsyncRemediationPool
+from log_hub import LogHub
+from peers import PeerNode
+from incidents import IncidentTracker, event_time
+from eve_tail import EveTailer
+from eve_socket import EveSocketServer
+from eve_parse import event_type_of, extract_alert, normalize_event
+from negative_cache import NegativeCache, parse_cidrs
+from thresholds import ThresholdTracker, parse_threshold
+import metrics
+from rules_store import RulesStore, set_op, del_op, apply_ops
 
 RULES_FILE = '/etc/ips/rules.json'  # Ruta para persistir las reglas (montar como PVC)
+RULES_RELOAD_INTERVAL = float(os.environ.get("IPS_RULES_RELOAD_INTERVAL", "2"))  # Segundos entre comprobaciones del archivo
+
+# Journal de cambios + snapshots atómicos de las reglas (ver rules_store.py)
+rules_store = RulesStore(RULES_FILE)
+rules_stamp = None  # Marca de los archivos de reglas en la última carga (ver watch_rules_file())
 
 def load_rules_from_file():
     """
-    Carga las reglas desde el archivo JSON persistente. Si no existe, lo crea vacío.
-    Convierte las claves a int para usarlas como signature_id.
+    Carga las reglas persistentes (snapshot + journal) y compacta el journal pendiente.
     """
-    global RULES
-    if not os.path.exists(RULES_FILE):
-        with open(RULES_FILE, 'w') as f:
-            json.dump({}, f)
-        RULES = {}
-        return
+    global RULES, rules_stamp
+    # Antes de leer: un cambio de otro worker durante la carga se recarga después
+    rules_stamp = rules_store.stamp()
     try:
-        with open(RULES_FILE, 'r') as f:
-            content = f.read().strip()
-            if not content:
-                RULES = {}
-            else:
-                data = json.loads(content)
-                RULES = {int(k): v for k, v in data.items()}
+        RULES = MappingProxyType(rules_store.load())
+        rules_store.compact()
     except Exception as e:
-        # Loguea el error si el archivo no puede ser leído o parseado
-        app.logger.error(f"[load_rules_from_file] Error al parsear {RULES_FILE}: {e}")
-        RULES = {}
+        # Loguea el error si las reglas no pueden ser leídas
+        app.logger.error(f"[load_rules_from_file] Error al cargar {RULES_FILE}: {e}")
+        RULES = MappingProxyType({})
+
+def apply_rule_changes(ops):
+    """
+    Aplica un lote de cambios (set_op/del_op) sobre una copia de RULES, publica la copia
+    como nueva tabla inmutable con una única asignación y persiste el lote.
+    RULES nunca se modifica en el sitio: los lectores (/alert, GET /rules) usan la tabla
+    que había al empezar sin tomar ningún lock. Debe llamarse con rules_write_lock tomado.
+    """
+    global RULES
+    rules = dict(RULES)
+    apply_ops(rules, ops)
+    RULES = MappingProxyType(rules)
+    save_rules(ops)
 
-def save_rules_to_file():
+def save_rules(ops):
     """
-    Guarda las reglas actuales en el archivo JSON persistente.
+    Persiste un lote de cambios de reglas en el journal (un único write + fsync).
+    Se llama con rules_write_lock tomado; /alert no lo usa y nunca espera al disco.
     """
     try:
-        with open(RULES_FILE, 'w') as f:
-            json.dump(RULES, f)
+        rules_store.append(ops)
     except Exception as e:
         # Loguea el error si no se puede guardar
-        app.logger.error(f"[save_rules_to_file] Error al guardar {RULES_FILE}: {e}")
+        app.logger.error(f"[save_rules] Error al guardar {RULES_FILE}: {e}")
+
+def watch_rules_file():
+    """
+    Recarga RULES cuando cambian el snapshot o el journal. Con varios workers de gunicorn
+    cada proceso tiene su propia copia de las reglas, y así ve los cambios hechos desde
+    los demás. También compacta periódicamente el journal.
+    """
+    global RULES
+    last = rules_stamp
+    while True:
+        time.sleep(RULES_RELOAD_INTERVAL)
+        try:
+            rules_store.maybe_compact()
+            stamp = rules_store.stamp()
+            if stamp == last:
+                continue
+            # Con rules_write_lock para no pisar un cambio local aún no escrito en el journal
+            with rules_write_lock:
+                RULES = MappingProxyType(rules_store.load())
+            last = stamp
+        except Exception as e:
+            app.logger.error(f"[watch_rules_file] Error al recargar {RULES_FILE}: {e}")
 
 # Suprime el logging HTTP por defecto de Flask para limpiar la consola
 werkzeug_logger = logging.getLogger('werkzeug')
@@ -52,19 +105,47 @@ werkzeug_logger.setLevel(logging.INFO)
 
 app = Flask(__name__)
 app.logger.propagate = True
+# Nivel de la salida estándar (kubectl logs); los eventos van además al panel
+flask_default_handler.setLevel(os.environ.get("IPS_STDERR_LOG_LEVEL", "INFO").upper())
 app.logger.info(">>> Flask logger inicializado")
 
-# Cola para logs de eventos (utilizado en el stream SSE para mostrar logs en el frontend)
-log_queue = queue.Queue()
+class EventFormatter(logging.Formatter):
+    """
+    Formatter del panel: si el registro lleva el evento de Suricata (extra={"event": ...}),
+    lo añade a la línea en JSON. La salida estándar no lo incluye, así que el json.dumps
+    solo se hace cuando un cliente de /log-stream va a leer la línea.
+    """
+    def format(self, record):
+        msg = super().format(record)
+        event = getattr(record, "event", None)
+        if event is not None:
+            msg += " | " + json.dumps(event, ensure_ascii=False)
+        return msg
+
+# Difusión de logs de eventos a todos los navegadores conectados al stream SSE del frontend.
+# Buffer de tamaño fijo: sin nadie conectado los logs más antiguos se descartan.
+LOG_HISTORY = int(os.environ.get("IPS_LOG_HISTORY", "1000"))
+LOG_SUBSCRIBER_BUFFER = int(os.environ.get("IPS_LOG_SUBSCRIBER_BUFFER", "500"))
+log_hub = LogHub(
+    formatter=EventFormatter('%(asctime)s - %(levelname)s - %(message)s'),
+    history=LOG_HISTORY,
+    subscriber_buffer=LOG_SUBSCRIBER_BUFFER,
+)
+SSE_HEARTBEAT = 15  # Segundos sin eventos antes de enviar un keep-alive al navegador
+# Con gthread cada stream abierto ocupa un hilo de gunicorn: el tope deja hilos libres
+# para /alert (el núcleo asyncio no tiene este límite)
+LOG_STREAM_MAX_CLIENTS = int(os.environ.get("IPS_LOG_STREAM_MAX_CLIENTS", "8"))
+log_stream_slots = threading.BoundedSemaphore(LOG_STREAM_MAX_CLIENTS)
+log_stream_rejected = 0
 
 class QueueHandler(logging.Handler):
     """
-    Handler personalizado para enviar logs a la cola.
+    Handler personalizado para publicar los logs en log_hub.
     Permite mostrar eventos en tiempo real en la UI vía Server Sent Events.
+    No formatea el registro: log_hub lo formatea solo si algún cliente lo va a leer.
     """
     def emit(self, record):
-        msg = self.format(record)
-        log_queue.put(msg)
+        log_hub.publish(record)
 
 # Configuración del logger raíz: solo este handler para evitar duplicados
 root_logger = logging.getLogger()
@@ -72,17 +153,294 @@ root_logger.setLevel(logging.INFO)
 for h in root_logger.handlers[:]:
     root_logger.removeHandler(h)
 queue_handler = QueueHandler()
-queue_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
 root_logger.addHandler(queue_handler)
+# Avisos y errores de los módulos (índices, reglas, remediación, eve) también a kubectl
+# logs; los de app.logger ya salen por el handler de Flask
+stderr_handler = logging.StreamHandler()
+stderr_handler.setLevel(logging.WARNING)
+stderr_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(name)s: %(message)s'))
+stderr_handler.addFilter(lambda record: record.name != app.logger.name)
+root_logger.addHandler(stderr_handler)
 
-# Lock para operaciones thread-safe sobre las reglas
-lock = threading.Lock()
-RULES = {}
+# Serializa los cambios de reglas para que el journal siga el mismo orden que la memoria.
+# Los lectores no lo necesitan: RULES es una tabla inmutable que se sustituye entera.
+rules_write_lock = threading.Lock()
+RULES = MappingProxyType({})
 load_rules_from_file()
 
-# Configuración para acceder a la API de Kubernetes desde dentro del clúster
-config.load_incluster_config()
-v1 = client.CoreV1Api()
+# Cliente de la API de Kubernetes e índice de pods por IP mantenido con un watch
+# (evita listar el clúster por cada alerta). Se inicializan en create_app().
+v1 = None
+pod_index = None
+# PATCH de etiquetas con cuerpos precalculados en bytes y sin deserializar la respuesta (ver k8s_raw.py)
+v1_raw = None
+# Cliente asíncrono del núcleo asyncio (ver asgi.py y k8s_async.py); None con gunicorn/Flask
+v1_async = None
+k8s_async_client = None
+# Historial de concesiones IP -> pod para atribuir las alertas que llegan tarde (ver pod_index.py)
+POD_IP_HISTORY_TTL = float(os.environ.get("IPS_POD_IP_HISTORY_TTL", "600"))  # Segundos que se recuerda un pod borrado
+CLOCK_SKEW = float(os.environ.get("IPS_CLOCK_SKEW", "2"))  # Tolerancia entre el reloj de Suricata y el de la API
+# Índice de Services/EndpointSlices para resolver ClusterIPs a sus pods (IPS_RESOLVE_SERVICES=false lo desactiva)
+RESOLVE_SERVICES = os.environ.get("IPS_RESOLVE_SERVICES", "true").lower() not in ("0", "false", "no")
+service_index = None
+
+# Acceso a la API fuera del clúster (pruebas locales, p. ej. con bench/fake_apiserver.py):
+# - IPS_K8S_API_URL: URL de un servidor de API sin autenticación.
+# - IPS_KUBECONFIG: ruta de un kubeconfig.
+# Si no se indica ninguna, se usa la cuenta de servicio del pod.
+K8S_API_URL = os.environ.get("IPS_K8S_API_URL")
+KUBECONFIG = os.environ.get("IPS_KUBECONFIG")
+
+# Workers de gunicorn (ver gunicorn.conf.py): con más de uno, cada worker escucha en un
+# socket Unix de IPS_PEER_DIR y pide a los demás el estado que no tiene (ver peers.py)
+WORKER_PROCESSES = max(1, int(os.environ.get("IPS_GUNICORN_WORKERS", "1")))
+PEER_DIR = os.environ.get("IPS_PEER_DIR", "") if WORKER_PROCESSES > 1 else ""
+PEER_TIMEOUT = float(os.environ.get("IPS_PEER_TIMEOUT", "1"))  # Segundos máximos de una consulta a otro worker
+peer_node = None
+
+# Conexiones y ritmo de las llamadas a la API (por proceso):
+# - IPS_K8S_POOL_SIZE: conexiones keep-alive del pool compartido. Por defecto, una por
+#   worker de remediación más los watches (pods, Services, EndpointSlices) y margen
+#   para el panel; con menos, las peticiones que no caben abren conexiones TLS nuevas.
+# - IPS_K8S_QPS / IPS_K8S_BURST: token bucket del cliente (0 = sin límite), para todo el
+#   listener: con varios workers cada uno usa su parte.
+# - IPS_K8S_RETRIES: reintentos de una respuesta 429 (respetando Retry-After).
+# - IPS_K8S_TIMEOUT: segundos máximos de un PATCH de etiqueta.
+K8S_POOL_SIZE = int(os.environ.get("IPS_K8S_POOL_SIZE", "0"))
+K8S_QPS = float(os.environ.get("IPS_K8S_QPS", "20"))
+K8S_BURST = int(os.environ.get("IPS_K8S_BURST", "40"))
+K8S_RETRIES = int(os.environ.get("IPS_K8S_RETRIES", "3"))
+K8S_TIMEOUT = float(os.environ.get("IPS_K8S_TIMEOUT", "10"))
+k8s_bucket = TokenBucket(K8S_QPS / WORKER_PROCESSES, K8S_BURST / WORKER_PROCESSES) if K8S_QPS > 0 else None
+
+def load_kube_config():
+    """
+    Configura el cliente de Kubernetes según IPS_K8S_API_URL, IPS_KUBECONFIG o,
+    por defecto, la configuración de dentro del clúster, con el tamaño del pool de
+    conexiones y TCP keep-alive.
+    """
+    if K8S_API_URL:
+        configuration = client.Configuration()
+        configuration.host = K8S_API_URL
+        client.Configuration.set_default(configuration)
+    elif KUBECONFIG:
+        config.load_kube_config(config_file=KUBECONFIG)
+    else:
+        config.load_incluster_config()
+    configuration = client.Configuration.get_default_copy()
+    configuration.connection_pool_maxsize = K8S_POOL_SIZE or REMEDIATION_WORKERS + 8
+    configuration.keep_alive = True
+    client.Configuration.set_default(configuration)
+
+def k8s_api(api):
+    """
+    Envuelve un cliente de la API con las métricas y, si está activo, el límite de ritmo.
+    Las métricas van por dentro: cada intento (también los 429) cuenta por separado.
+    """
+    api = metrics.InstrumentedApi(api, K8S_REQUESTS, K8S_REQUEST_SECONDS)
+    if k8s_bucket is None:
+        return api
+    return RateLimitedApi(api, k8s_bucket, retries=K8S_RETRIES,
+                          on_wait=lambda waited, operation: K8S_THROTTLE_SECONDS.observe(waited, operation=operation))
+
+# Etiqueta 'seguridad' que aplica cada acción de regla, de menor a mayor severidad
+LABEL_MAP = {
+    1: "solo-detectar",
+    2: "detectar-registro",
+    3: "confinamiento-namespace",
+    4: "aislamiento-completo"
+}
+# Severidad de cada etiqueta: el escalado automático nunca rebaja la etiqueta de un pod
+LABEL_SEVERITY = {label: action for action, label in LABEL_MAP.items()}
+label_patches = LabelPatches("seguridad", LABEL_MAP.values())
+
+# Evita repetir el mismo PATCH sobre un pod durante ráfagas de alertas (segundos)
+COALESCE_WINDOW = float(os.environ.get("IPS_COALESCE_WINDOW", "5"))
+coalescer = PatchCoalescer(LABEL_SEVERITY, window=COALESCE_WINDOW)
+
+# Qué hacer cuando la IP de origen corresponde a varios pods (ClusterIP de un Service con
+# varios endpoints o IP de un nodo con varios pods hostNetwork):
+# - unique: solo se etiqueta si hay un único candidato; si no, la alerta queda como "ambiguous".
+# - all: se etiquetan todos los candidatos.
+MULTI_MATCH_POLICY = os.environ.get("IPS_MULTI_MATCH_POLICY", "unique")
+if MULTI_MATCH_POLICY not in ("unique", "all"):
+    raise ValueError(f"IPS_MULTI_MATCH_POLICY debe ser 'unique' o 'all', no '{MULTI_MATCH_POLICY}'")
+
+# IPs de origen que no son de ningún pod: se responde 404 sin encolar remediación
+# - IPS_POD_CIDRS: redes de pods (HOME_NET); lo que quede fuera no se busca. Vacío = sin filtro.
+# - IPS_NON_POD_CIDRS: redes que nunca son de pods (nodos, Services, EXTERNAL_NET...).
+# - IPS_NEGATIVE_CACHE_TTL: segundos que se recuerda una IP sin pod.
+non_pod_cache = NegativeCache(
+    ttl=float(os.environ.get("IPS_NEGATIVE_CACHE_TTL", "60")),
+    max_size=int(os.environ.get("IPS_NEGATIVE_CACHE_SIZE", "10000")),
+    pod_cidrs=parse_cidrs(os.environ.get("IPS_POD_CIDRS", "")),
+    non_pod_cidrs=parse_cidrs(os.environ.get("IPS_NON_POD_CIDRS", "")),
+)
+
+# Contadores de las reglas con umbral ("threshold": {"count": N, "seconds": T}) por
+# (regla, IP de origen); IPS_THRESHOLD_MAX_KEYS acota cuántas parejas se recuerdan
+threshold_tracker = ThresholdTracker(max_keys=int(os.environ.get("IPS_THRESHOLD_MAX_KEYS", "100000")))
+
+# Pool de workers que aplica las acciones fuera de la petición HTTP de /alert
+REMEDIATION_WORKERS = int(os.environ.get("IPS_REMEDIATION_WORKERS", "4"))
+REMEDIATION_QUEUE_SIZE = int(os.environ.get("IPS_REMEDIATION_QUEUE_SIZE", "1000"))
+# Con el núcleo asyncio cada worker es una tarea, no un hilo: trabajos en vuelo a la vez
+ASYNC_REMEDIATION_WORKERS = int(os.environ.get("IPS_ASYNC_REMEDIATION_WORKERS", "64"))
+
+# Lectura directa de los eve.json de Suricata en el nodo (sin fluent-bit). Vacío = desactivado.
+EVE_TAIL = os.environ.get("IPS_EVE_TAIL", "")  # p. ej. /var/log/suricata/alertas.json (admite comodines)
+EVE_CHECKPOINT = os.environ.get("IPS_EVE_CHECKPOINT", "/etc/ips/eve-checkpoint.json")
+EVE_START_AT_END = os.environ.get("IPS_EVE_START", "end") != "beginning"  # Sin checkpoint: ¿leer el histórico?
+eve_tailer = None
+# Socket Unix para la salida eve-log unix_stream de Suricata. Vacío = desactivado.
+EVE_SOCKET = os.environ.get("IPS_EVE_SOCKET", "")  # p. ej. /var/run/suricata/eve.sock
+eve_socket = None
+
+# --- Métricas (endpoint /metrics, formato OpenMetrics para Prometheus) ---
+registry = metrics.Registry()
+ALERT_STAGE_SECONDS = registry.histogram(
+    "ips_alert_stage_seconds", "Tiempo de cada etapa del tratamiento de una alerta", ["stage"])
+ALERTS = registry.counter(
+    "ips_alerts", "Alertas tratadas por firma y resultado", ["signature_id", "outcome"])
+K8S_REQUESTS = registry.counter(
+    "ips_k8s_requests", "Llamadas a la API de Kubernetes por operación y código", ["operation", "code"])
+K8S_REQUEST_SECONDS = registry.histogram(
+    "ips_k8s_request_seconds", "Latencia de las llamadas a la API de Kubernetes", ["operation"])
+K8S_THROTTLE_SECONDS = registry.histogram(
+    "ips_k8s_throttle_seconds", "Espera en el límite de ritmo del cliente antes de cada llamada a la API", ["operation"])
+ENFORCEMENT_SECONDS = registry.histogram(
+    "ips_enforcement_seconds", "Latencia de aislamiento desde la detección de Suricata hasta la etiqueta confirmada",
+    ["segment"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+# Incidentes recientes con sus marcas de tiempo (detección, recepción, PATCH, confirmación)
+INCIDENT_CONFIRM_TTL = float(os.environ.get("IPS_INCIDENT_CONFIRM_TTL", "120"))
+incident_tracker = IncidentTracker(ENFORCEMENT_SECONDS, confirm_ttl=INCIDENT_CONFIRM_TTL)
+
+def count_alert(sig_id, outcome):
+    ALERTS.inc(signature_id="" if sig_id is None else sig_id, outcome=outcome)
+
+remediation_pool = RemediationPool(
+    workers=REMEDIATION_WORKERS,
+    queue_size=REMEDIATION_QUEUE_SIZE,
+    on_start=lambda wait: ALERT_STAGE_SECONDS.observe(wait, stage="queue_wait"),
+)
+
+registry.gauge_func("ips_remediation_queue_depth", "Trabajos esperando en la cola de remediación",
+                    lambda: remediation_pool.stats()["queue_depth"])
+registry.gauge_func("ips_remediation_queue_capacity", "Capacidad de la cola de remediación",
+                    lambda: remediation_pool.queue_size)
+registry.gauge_func("ips_remediation_busy_workers", "Workers de remediación ocupados",
+                    lambda: remediation_pool.stats()["busy_workers"])
+registry.counter_func("ips_remediation_rejected", "Alertas rechazadas por cola llena",
+                      lambda: remediation_pool.stats()["rejected"])
+registry.counter_func("ips_patches", "PATCH enviados y descartados por el coalescer", lambda: {
+    (reason,): value for reason, value in (
+        ("sent", coalescer.patches),
+        ("noop", coalescer.suppressed_noop),
+        ("window", coalescer.suppressed_window),
+        ("weaker", coalescer.suppressed_weaker),
+    )
+}, ["result"])
+registry.gauge_func("ips_log_buffer_used", "Registros en el buffer de logs",
+                    lambda: log_hub.stats()["buffer_used"])
+registry.gauge_func("ips_log_subscribers", "Clientes conectados a /log-stream",
+                    lambda: log_hub.stats()["subscribers"])
+registry.counter_func("ips_log_stream_rejected", "Conexiones a /log-stream rechazadas por el tope de clientes",
+                      lambda: log_stream_rejected)
+registry.counter_func("ips_log_subscriber_drops", "Líneas de log descartadas por clientes lentos",
+                      lambda: log_hub.stats()["subscriber_drops"])
+registry.gauge_func("ips_pod_index_pods", "Pods en el índice en memoria",
+                    lambda: pod_index.size() if pod_index is not None else 0)
+registry.gauge_func("ips_service_index_services", "Services con IP en el índice en memoria",
+                    lambda: service_index.size() if service_index is not None else 0)
+registry.gauge_func("ips_k8s_qps_limit", "Ritmo actual del límite de llamadas a la API (baja tras un 429)",
+                    lambda: k8s_bucket.qps if k8s_bucket is not None else 0)
+registry.counter_func("ips_k8s_throttled", "Respuestas 429 (o 503 con Retry-After) de la API",
+                      lambda: k8s_bucket.throttled if k8s_bucket is not None else 0)
+registry.gauge_func("ips_incidents_pending_confirmation", "PATCH aplicados pendientes de ver en el watch",
+                    lambda: incident_tracker.stats()["pending_confirmation"])
+registry.counter_func("ips_incidents_unconfirmed", "PATCH que el watch no confirmó a tiempo",
+                      lambda: incident_tracker.stats()["unconfirmed"])
+registry.counter_func("ips_negative_cache_lookups", "Consultas a la caché de IPs sin pod", lambda: {
+    ("hit",): non_pod_cache.hits,
+    ("cidr",): non_pod_cache.cidr_hits,
+    ("miss",): non_pod_cache.misses,
+}, ["result"])
+registry.gauge_func("ips_threshold_tracked", "Parejas (regla, IP de origen) con alertas en la ventana de su umbral",
+                    threshold_tracker.size)
+registry.gauge_func("ips_negative_cache_size", "IPs sin pod recordadas",
+                    lambda: non_pod_cache.stats()["size"])
+registry.counter_func("ips_eve_tail_lines", "Líneas leídas de los eve.json",
+                      lambda: eve_tailer.lines if eve_tailer is not None else 0)
+registry.counter_func("ips_eve_tail_bytes", "Bytes leídos de los eve.json",
+                      lambda: eve_tailer.bytes if eve_tailer is not None else 0)
+registry.counter_func("ips_eve_socket_lines", "Registros recibidos por el socket eve de Suricata",
+                      lambda: eve_socket.lines if eve_socket is not None else 0)
+registry.gauge_func("ips_eve_socket_connections", "Conexiones abiertas en el socket eve de Suricata",
+                    lambda: eve_socket.connected if eve_socket is not None else 0)
+
+def create_app(async_core=False):
+    """
+    Inicializa el listener y devuelve la aplicación Flask:
+    - Configura el acceso a la API de Kubernetes (ver load_kube_config()).
+    - Arranca el índice de pods, los workers de remediación y la recarga de reglas.
+    - Con async_core (asgi.py), la remediación usa AsyncRemediationPool y el cliente
+      asíncrono; sus tareas las arranca asgi.py dentro del bucle de eventos.
+    - Si IPS_RESOLVE_SERVICES no es false, arranca el índice de Services y EndpointSlices.
+    - Si IPS_EVE_TAIL está definido, empieza a leer directamente los eve.json.
+    - Si IPS_EVE_SOCKET está definido, escucha la salida unix_stream de Suricata.
+    - Con varios workers de gunicorn (IPS_PEER_DIR), atiende las consultas de los demás.
+    Los hilos no sobreviven a un fork, así que en producción gunicorn debe llamarla en
+    cada worker (sin preload_app): IPS_CORE=wsgi gunicorn -c gunicorn.conf.py.
+    """
+    global v1, v1_raw, v1_async, k8s_async_client, pod_index, service_index, eve_tailer, eve_socket
+    global remediation_pool, remediate_job, peer_node
+    if pod_index is not None:
+        return app
+    if async_core:
+        # Se sustituye antes de arrancar los lectores de eve, que ya encolan trabajos
+        remediation_pool = AsyncRemediationPool(
+            workers=ASYNC_REMEDIATION_WORKERS,
+            queue_size=REMEDIATION_QUEUE_SIZE,
+            on_start=lambda wait: ALERT_STAGE_SECONDS.observe(wait, stage="queue_wait"),
+        )
+        remediate_job = remediate_async
+    load_kube_config()
+    # Un único ApiClient: todas las APIs comparten el mismo pool de conexiones
+    api_client = client.ApiClient()
+    core_v1 = client.CoreV1Api(api_client)
+    v1 = k8s_api(core_v1)
+    v1_raw = k8s_api(RawCoreV1Api(core_v1, request_timeout=K8S_TIMEOUT))
+    pod_index = PodIndex(v1, history_ttl=POD_IP_HISTORY_TTL, clock_skew=CLOCK_SKEW)
+    # El watch confirma que la etiqueta aplicada ha llegado al pod
+    pod_index.add_listener(incident_tracker.confirm)
+    # Un pod nuevo con una IP recordada como "sin pod" la invalida
+    pod_index.add_listener(non_pod_cache.on_pod)
+    pod_index.start()
+    if RESOLVE_SERVICES:
+        discovery_v1 = k8s_api(client.DiscoveryV1Api(api_client))
+        service_index = ServiceIndex(v1, discovery_v1).start()
+    if async_core:
+        # aiohttp solo hace falta con el núcleo asyncio (requirements-async.txt)
+        from k8s_async import AsyncCoreV1Api
+        k8s_async_client = AsyncCoreV1Api(client.Configuration.get_default_copy(), request_timeout=K8S_TIMEOUT)
+        v1_async = k8s_api(k8s_async_client)
+    else:
+        remediation_pool.start()
+    threading.Thread(target=watch_rules_file, name="rules-reload", daemon=True).start()
+    if EVE_TAIL:
+        eve_tailer = EveTailer(EVE_TAIL, ingest_eve_line, EVE_CHECKPOINT, start_at_end=EVE_START_AT_END).start()
+    if EVE_SOCKET:
+        eve_socket = EveSocketServer(EVE_SOCKET, ingest_eve_line).start()
+    if PEER_DIR:
+        peer_node = (PeerNode(PEER_DIR, timeout=PEER_TIMEOUT)
+                     .handle("job", remediation_pool.get)
+                     .handle("incident", incident_tracker.get)
+                     .handle("incidents", incident_tracker.recent)
+                     .handle("threshold_hit", threshold_tracker.hit)
+                     .stream("logs", peer_log_lines)
+                     .start())
+    return app
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -374,9 +732,7 @@ async function fetchLabeledPodsNamespace() {
         logOutput.textContent += event.data + "\\n";
         logOutput.scrollTop = logOutput.scrollHeight;
       };
-      eventSource.onerror = function(e) {
-        eventSource.close();
-      };
+      // Si se corta, EventSource reconecta solo y recupera lo perdido con Last-Event-ID
     }
 
     // ===========================================
@@ -409,6 +765,7 @@ async function fetchLabeledPodsNamespace() {
           <td>${rule.rule}</td>
           <td class="desc-cell">${rule.description}</td>
           <td class="action-cell">${actionMap[rule.action] || 'Desconocido'}</td>
+          <td>${rule.threshold ? `${rule.threshold.count} en ${rule.threshold.seconds} s por IP` : '-'}</td>
           <td>
             <button class="edit-btn" onclick="enableEdit(${rule.rule}, '${rule.description.replace(/'/g,"\\'")}', ${rule.action})">Editar</button>
             <button class="delete-btn" onclick="deleteRule(${rule.rule})">Eliminar</button>
@@ -598,7 +955,18 @@ async function deleteRule(ruleId) {
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify(alertData)
       });
-      const text = await response.text();
+      let text = await response.text();
+      // La alerta se procesa en segundo plano: consulta el estado del trabajo hasta que termine
+      if (response.status === 202) {
+        const jobId = JSON.parse(text).job_id;
+        for (let i = 0; i < 20; i++) {
+          const jobRes = await fetch(`/jobs/${jobId}`);
+          const job = await jobRes.json();
+          text = JSON.stringify(job, null, 2);
+          if (job.status === "done" || job.status === "failed") break;
+          await new Promise(r => setTimeout(r, 250));
+        }
+      }
       document.getElementById('logOutput').textContent = text;
     }
 
@@ -662,18 +1030,20 @@ async function modifyLabel(namespace, podName) {
   }
 }
 
+    let liveEventSource = null;
     function connectLiveLogStream() {
       const logOutput = document.getElementById("liveLogOutput");
       if (!logOutput) return;
       logOutput.textContent = ""; // Limpiar al cambiar de sección
+      if (liveEventSource) liveEventSource.close();
       const eventSource = new EventSource("/log-stream");
+      liveEventSource = eventSource;
       eventSource.onmessage = function(event) {
         logOutput.textContent += event.data + "\\n";
         logOutput.scrollTop = logOutput.scrollHeight;
       };
       eventSource.onerror = function(e) {
-        logOutput.textContent += "[stream disconnected]\\n";
-        eventSource.close();
+        logOutput.textContent += "[stream disconnected, reconectando...]\\n";
       };
     }
   </script>
@@ -698,6 +1068,7 @@ async function modifyLabel(namespace, podName) {
             <th>ID</th>
             <th>Descripción</th>
             <th>Acción</th>
+            <th>Umbral</th>
             <th>Acciones</th>
           </tr>
         </thead>
@@ -804,16 +1175,17 @@ def index():
 @app.route('/rules', methods=['GET', 'POST'])
 def manage_rules():
     """
-    GET: Devuelve la lista de reglas (signature_id, descripción, acción).
-    POST: Añade una nueva regla o la sobrescribe si ya existe.
+    GET: Devuelve la lista de reglas (signature_id, descripción, acción, umbral).
+    POST: Añade una nueva regla o la sobrescribe si ya existe. El umbral es opcional:
+    "threshold": {"count": N, "seconds": T} actúa solo a la N-ésima alerta de la misma
+    IP de origen en T segundos.
     """
-    global RULES
     if request.method == 'GET':
-        with lock:
-            return jsonify([
-                {"rule": rule_id, "description": r["description"], "action": r["action"]}
-                for rule_id, r in RULES.items()
-            ])
+        rules = RULES
+        return jsonify([
+            {"rule": rule_id, "description": r["description"], "action": r["action"], "threshold": r.get("threshold")}
+            for rule_id, r in rules.items()
+        ])
     data = request.json
     try:
         rule_id = int(data.get('rule'))
@@ -825,18 +1197,21 @@ def manage_rules():
             return jsonify({"error": "La descripción no puede estar vacía"}), 400
     except (ValueError, TypeError):
         return jsonify({"error": "Entrada inválida"}), 400
-    with lock:
-        RULES[rule_id] = {"description": description, "action": action}
-        save_rules_to_file()
+    try:
+        threshold = parse_threshold(data.get('threshold'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with rules_write_lock:
+        apply_rule_changes([set_op(rule_id, rule_value(description, action, threshold))])
     app.logger.info(f"Added rule ID {rule_id}")
     return jsonify({"status": "added", "rule": rule_id}), 201
 
 @app.route('/rules/<int:rule>', methods=['PUT'])
 def update_rule(rule):
     """
-    Actualiza una regla existente por ID.
+    Actualiza una regla existente por ID. Si no se indica "threshold" se mantiene el
+    umbral que tuviera; "threshold": null lo elimina.
     """
-    global RULES
     data = request.json
     try:
         description = str(data.get('description'))
@@ -845,11 +1220,16 @@ def update_rule(rule):
             raise ValueError("Acción inválida")
     except Exception:
         return jsonify({"error": "Entrada inválida"}), 400
-    with lock:
+    try:
+        threshold = parse_threshold(data.get('threshold'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with rules_write_lock:
         if rule not in RULES:
             return jsonify({"error": f"Regla {rule} no encontrada"}), 404
-        RULES[rule] = {"description": description, "action": action}
-        save_rules_to_file()
+        if 'threshold' not in data:
+            threshold = RULES[rule].get("threshold")
+        apply_rule_changes([set_op(rule, rule_value(description, action, threshold))])
     app.logger.info(f"Updated rule ID {rule}")
     return jsonify({"status": "updated", "rule": rule}), 200
 
@@ -858,13 +1238,149 @@ def delete_rule(rule):
     """
     Elimina una regla por ID.
     """
-    global RULES
-    with lock:
-        RULES.pop(rule, None)
-        save_rules_to_file()
+    with rules_write_lock:
+        apply_rule_changes([del_op(rule)])
     app.logger.info(f"Removed rule ID {rule}")
     return jsonify({"status": "removed", "rule": rule})
 
+def rule_value(description, action, threshold=None):
+    """
+    Regla tal como se guarda en RULES y en el journal (sin umbral, sin la clave threshold).
+    """
+    value = {"description": description, "action": action}
+    if threshold:
+        value["threshold"] = threshold
+    return value
+
+# --- Importación y exportación masiva de reglas ---
+
+BULK_ERRORS_SHOWN = 50  # Máximo de errores de validación devueltos en una importación
+
+def parse_rule(data):
+    """
+    Valida una regla de una importación masiva. Devuelve (signature_id, regla) o lanza
+    ValueError con el motivo. El umbral va en "threshold" (JSON) o en las columnas
+    threshold_count y threshold_seconds (CSV, vacías si no tiene).
+    """
+    if not isinstance(data, dict):
+        raise ValueError("se esperaba un objeto con rule, description y action")
+    try:
+        rule_id = int(data.get('rule'))
+        action = int(data.get('action'))
+    except (ValueError, TypeError):
+        raise ValueError("rule y action deben ser números enteros")
+    if action not in LABEL_MAP:
+        raise ValueError(f"acción inválida {action} (1-4)")
+    description = str(data.get('description') or '').strip()
+    if not description:
+        raise ValueError("la descripción no puede estar vacía")
+    threshold = data.get('threshold')
+    if threshold is None and data.get('threshold_count'):
+        threshold = {"count": data.get('threshold_count'), "seconds": data.get('threshold_seconds')}
+    return rule_id, rule_value(description, action, parse_threshold(threshold))
+
+def iter_bulk_rules(stream, content_type):
+    """
+    Recorre las reglas del cuerpo de PUT /rules/bulk sin cargarlo entero en memoria.
+    Devuelve pares (número de línea, regla en bruto). Acepta CSV con cabecera
+    rule,description,action[,threshold_count,threshold_seconds], NDJSON (una regla por
+    línea) o un array JSON.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    if "csv" in content_type:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("["):
+            # Array JSON: se parsea el resto del cuerpo de una vez
+            rows, _ = parse_json_payload(line + text.read())
+            for i, row in enumerate(rows, 1):
+                yield i, row
+            return
+        try:
+            yield line_num, json.loads(line)
+        except ValueError as e:
+            yield line_num, ValueError(f"JSON inválido: {e}")
+
+@app.route('/rules/bulk', methods=['PUT'])
+def bulk_import_rules():
+    """
+    Importa muchas reglas en una sola llamada (p. ej. un ruleset completo de Suricata).
+    Valida todas las reglas en una pasada; si alguna es inválida no se aplica ninguna.
+    Si todo es correcto se aplican de forma atómica y se persisten con una única escritura.
+    Con ?mode=replace, las reglas que no aparecen en la importación se eliminan.
+    """
+    mode = request.args.get("mode", "merge")
+    if mode not in ("merge", "replace"):
+        return jsonify({"error": f"Modo inválido '{mode}' (merge o replace)"}), 400
+    imported = {}
+    errors = []
+    error_count = 0
+    for line_num, row in iter_bulk_rules(request.stream, request.content_type or ""):
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            rule_id, rule_info = parse_rule(row)
+            imported[rule_id] = rule_info
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < BULK_ERRORS_SHOWN:
+                errors.append({"line": line_num, "error": str(e)})
+    if error_count:
+        return jsonify({"error": "Importación rechazada", "invalid": error_count, "errors": errors}), 400
+    ops = [set_op(rule_id, rule_info) for rule_id, rule_info in imported.items()]
+    with rules_write_lock:
+        removed = [rule_id for rule_id in RULES if rule_id not in imported] if mode == "replace" else []
+        ops.extend(del_op(rule_id) for rule_id in removed)
+        apply_rule_changes(ops)
+    app.logger.info(f"Bulk import: {len(imported)} reglas importadas, {len(removed)} eliminadas ({mode})")
+    return jsonify({"status": "imported", "mode": mode, "imported": len(imported), "removed": len(removed)}), 200
+
+@app.route('/rules/export')
+def export_rules():
+    """
+    Exporta todas las reglas como stream NDJSON (por defecto) o CSV (?format=csv),
+    en el mismo formato que acepta PUT /rules/bulk.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": f"Formato inválido '{fmt}' (ndjson o csv)"}), 400
+    return Response(export_rules_chunks(RULES, fmt), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=rules.{fmt}"})
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_rules_chunks(rules, fmt, chunk_size=1000):
+    """
+    Genera la exportación de una tabla de reglas en trozos de chunk_size reglas
+    (también la usa la ruta nativa de asgi.py).
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(["rule", "description", "action", "threshold_count", "threshold_seconds"])
+    for i, (rule_id, r) in enumerate(rules.items(), 1):
+        threshold = r.get("threshold")
+        if writer:
+            writer.writerow([rule_id, r["description"], r["action"],
+                             threshold["count"] if threshold else "", threshold["seconds"] if threshold else ""])
+        else:
+            row = {"rule": rule_id, "description": r["description"], "action": r["action"]}
+            if threshold:
+                row["threshold"] = threshold
+            buf.write(json.dumps(row, ensure_ascii=False))
+            buf.write("\n")
+        if i % chunk_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
 # --- Namespaces y Pods ---
 
 @app.route('/namespaces')
@@ -910,77 +1426,695 @@ def pod_details():
 def stream_logs():
     """
     Devuelve un stream SSE con los logs de eventos en tiempo real para el frontend.
+    Cada cliente recibe todas las líneas; al reconectar, el navegador envía Last-Event-ID
+    y se le reenvían las que se haya perdido si siguen en el buffer compartido.
+    Con varios workers recibe también las de los demás (ver follow_peer_logs()).
     """
+    global log_stream_rejected
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+    if not log_stream_slots.acquire(blocking=False):
+        log_stream_rejected += 1
+        return Response("retry: 30000\n\n", status=503, content_type="text/event-stream",
+                        headers={"Retry-After": "30"})
+
     def event_stream():
+        sub = log_hub.subscribe(last_event_id)
+        unfollow = follow_peer_logs(sub, last_event_id)
+        dropped = 0
+        # El id enviado nunca baja: con varios workers las líneas llegan algo desordenadas
+        # y Last-Event-ID debe ser la más reciente que ha visto el navegador
+        sent_id = 0
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                items = sub.wait(timeout=SSE_HEARTBEAT)
+                if not items:
+                    # Comentario SSE: detecta clientes desconectados y libera su hilo
+                    yield ": keep-alive\n\n"
+                    continue
+                chunk = []
+                if sub.dropped != dropped:
+                    chunk.append(f"data: [{sub.dropped - dropped} eventos descartados: cliente demasiado lento]\n\n")
+                    dropped = sub.dropped
+                for item in sorted(items, key=log_item_id):
+                    sent_id = max(sent_id, item[0])
+                    data = "\ndata: ".join(log_hub.format(item).splitlines() or [""])
+                    chunk.append(f"id: {sent_id}\ndata: {data}\n\n")
+                yield "".join(chunk)
+        finally:
+            if unfollow is not None:
+                unfollow()
+            log_hub.unsubscribe(sub)
+    response = Response(event_stream(), content_type="text/event-stream")
+    # El servidor cierra siempre la respuesta, aunque el cliente se vaya antes del primer evento
+    response.call_on_close(log_stream_slots.release)
+    return response
+
+def log_item_id(item):
+    return item[0]
+
+def follow_peer_logs(sub, last_event_id):
+    """
+    Con varios workers, añade al suscriptor las líneas de log de los demás, ya formateadas
+    por el worker que las publicó (ver peer_log_lines()). Devuelve la función que deja de
+    seguirlas, o None con un solo worker.
+    """
+    if peer_node is None:
+        return None
+
+    def on_message(message):
+        if isinstance(message, int):
+            sub.dropped += message
+        else:
+            sub.push([message[0], None, message[1]])
+    return peer_node.follow("logs", [last_event_id], on_message)
+
+async def peer_log_lines(last_event_id):
+    """
+    Stream "logs" de peers.py: las líneas de este worker para un /log-stream servido por
+    otro, en tandas de [secuencia, línea]; un entero es el número de líneas descartadas.
+    """
+    sub = log_hub.subscribe(last_event_id, loop=asyncio.get_running_loop())
+    dropped = 0
+    try:
         while True:
-            try:
-                msg = log_queue.get(timeout=5)
-                yield f"data: {msg}\n\n"
-            except queue.Empty:
-                continue
-    return Response(event_stream(), content_type="text/event-stream")
+            batch = [[item[0], log_hub.format(item)] for item in await sub.wait(SSE_HEARTBEAT)]
+            if sub.dropped != dropped:
+                batch.append(sub.dropped - dropped)
+                dropped = sub.dropped
+            yield batch
+    finally:
+        log_hub.unsubscribe(sub)
 
 # --- Recepción de alertas (acción automática sobre pods) ---
 
-@app.route('/alert', methods=['POST'])
-def alert():
+_json_decoder = json.JSONDecoder()
+
+class IgnoredEvent:
+    """
+    Registro que no es una alerta (flow, dns, stats...), descartado sin decodificarlo.
+    """
+    def __init__(self, event_type):
+        self.event_type = event_type
+
+def parse_json_payload(raw):
     """
-    Recibe una alerta en formato JSON, identifica el pod por IP y aplica la acción configurada:
-    - Etiqueta el pod según la acción de la regla.
+    Parsea un cuerpo JSON (p. ej. el de /alert). Acepta:
+    - Un único objeto JSON (formato original, también con saltos de línea).
+    - Un array JSON de eventos.
+    - JSON delimitado por saltos de línea (Format json_lines de fluent-bit).
+    Devuelve (eventos, es_lote). Los objetos que no se pueden parsear se devuelven
+    como excepciones ValueError en su posición, para responder un error por evento.
+    Las líneas con un event_type distinto de alert se devuelven como IgnoredEvent sin
+    decodificarlas.
+    """
+    text = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+    events = []
+    pos = 0
+    length = len(text)
+    while True:
+        # Salta espacios y saltos de línea entre objetos
+        while pos < length and text[pos] in " \t\r\n":
+            pos += 1
+        if pos >= length:
+            break
+        # Un registro de una sola línea que no es una alerta se descarta sin decodificarlo
+        next_line = text.find("\n", pos)
+        end = length if next_line == -1 else next_line
+        event_type = event_type_of(text, pos, end)
+        if event_type is not None and event_type != "alert" and text[pos] == "{" \
+                and text[pos:end].rstrip().endswith("}"):
+            events.append(IgnoredEvent(event_type))
+            pos = end
+            continue
+        try:
+            obj, pos = _json_decoder.raw_decode(text, pos)
+        except ValueError as e:
+            events.append(ValueError(f"JSON inválido: {e}"))
+            # Descarta el resto de la línea errónea y continúa con la siguiente
+            next_line = text.find("\n", pos)
+            if next_line == -1:
+                break
+            pos = next_line + 1
+            continue
+        if isinstance(obj, list):
+            events.extend(obj)
+        else:
+            events.append(obj)
+    is_batch = len(events) != 1 or text.lstrip().startswith("[")
+    return events, is_batch
+
+def process_event(data):
+    """
+    Valida un evento de alerta y lo evalúa contra RULES:
+    - Si hay regla asociada, encola un trabajo que etiqueta el pod según la acción (202).
+    - Si la regla tiene umbral y la IP aún no lo ha alcanzado, no actúa (200, below_threshold).
+    - Si la IP de origen no es de ningún pod (non_pod_cache), responde 404 sin encolar.
     - Si no hay regla asociada, no realiza acción.
+    Devuelve una tupla (respuesta, código HTTP).
     """
-    data = request.json
-    timestamp = datetime.fromtimestamp(data.get("date", 0), timezone.utc)
-    sig_id = data.get("signature_id")
-    src_ip = data.get("src_ip")
-    # Valida que la IP es IPv4 válida
-    try:
-        ip = ipaddress.ip_address(src_ip)
-        if ip.version != 4:
-            raise ValueError("Solo se aceptan direcciones IPv4")
-    except Exception as ve:
-        app.logger.error(f"Dirección IP inválida: {src_ip} ({ve})")
-        return jsonify({"error": f"Dirección IP inválida: {src_ip}", "detail": str(ve)}), 400
-    app.logger.info("Nuevo Evento recibido")
-    app.logger.info(json.dumps(data, ensure_ascii=False))
-    app.logger.info(f"Event type: {data.get('event_type')} | Signature: {sig_id} | Source IP: {src_ip} | Timestamp: {timestamp}")
+    if isinstance(data, ValueError):
+        count_alert(None, "invalid")
+        return {"error": str(data)}, 400
+    if not isinstance(data, dict) and not isinstance(data, IgnoredEvent):
+        count_alert(None, "invalid")
+        return {"error": "Evento inválido: se esperaba un objeto JSON"}, 400
+    event_type = data.event_type if isinstance(data, IgnoredEvent) else data.get("event_type")
+    if event_type not in (None, "alert"):
+        count_alert(None, "ignored")
+        return {"mensaje": f"Evento de tipo '{event_type}' ignorado"}, 200
+    # Registros eve.json originales: la firma viene en el objeto 'alert'
+    data = normalize_event(data)
+    with ALERT_STAGE_SECONDS.time(stage="validate"):
+        try:
+            timestamp = datetime.fromtimestamp(data.get("date", 0), timezone.utc)
+        except (TypeError, ValueError, OverflowError, OSError):
+            timestamp = None
+        sig_id = data.get("signature_id")
+        src_ip = data.get("src_ip")
+        # Valida que la IP es IPv4 válida
+        try:
+            ip = ipaddress.ip_address(src_ip)
+            if ip.version != 4:
+                raise ValueError("Solo se aceptan direcciones IPv4")
+        except Exception as ve:
+            app.logger.error(f"Dirección IP inválida: {src_ip} ({ve})")
+            count_alert(sig_id, "invalid")
+            return {"error": f"Dirección IP inválida: {src_ip}", "detail": str(ve)}, 400
+    # Una única línea por evento: el resumen va también a kubectl logs; el evento en JSON
+    # solo al panel, y solo se serializa si alguien lo lee (ver EventFormatter)
+    app.logger.info(
+        "Nuevo Evento recibido | Event type: %s | Signature: %s | Source IP: %s | Timestamp: %s",
+        data.get('event_type'), sig_id, src_ip, timestamp, extra={"event": data},
+    )
     try:
-        with lock:
+        with ALERT_STAGE_SECONDS.time(stage="rule_lookup"):
             rule_info = RULES.get(sig_id)
         if not rule_info:
-            app.logger.info(f"Firma {sig_id} no esta en la lista de reglas de IPS")
-            return jsonify({"mensaje": f"Nada que hacer. Rule ID {sig_id} no esta en la lista de reglas IPS"}), 200
+            app.logger.info("Firma %s no esta en la lista de reglas de IPS", sig_id)
+            count_alert(sig_id, "no_rule")
+            return {"mensaje": f"Nada que hacer. Rule ID {sig_id} no esta en la lista de reglas IPS"}, 200
         action = rule_info.get("action")
-        label_map = {
-            1: "solo-detectar",
-            2: "detectar-registro",
-            3: "confinamiento-namespace",
-            4: "aislamiento-completo"
-        }
-        if action not in label_map:
-            return jsonify({"error": f"Acción desconocida '{action}' para la regla {sig_id}"}), 400
-        label_value = label_map[action]
-        # Busca el pod con la IP indicada y lo etiqueta
-        pods = v1.list_pod_for_all_namespaces(watch=False)
-        for pod in pods.items:
-            if pod.status.pod_ip == src_ip:
-                v1.patch_namespaced_pod(
-                    name=pod.metadata.name,
-                    namespace=pod.metadata.namespace,
-                    body={"metadata": {"labels": {"seguridad": label_value}}}
-                )
-                app.logger.info(f"POD etiquetado. Label --> seguridad='{label_value}' al pod {pod.metadata.name} en el namespace {pod.metadata.namespace}")
-                return jsonify({
-                    "status": "labeled",
-                    "pod": pod.metadata.name,
-                    "namespace": pod.metadata.namespace,
+        if action not in LABEL_MAP:
+            count_alert(sig_id, "error")
+            return {"error": f"Acción desconocida '{action}' para la regla {sig_id}"}, 400
+        label_value = LABEL_MAP[action]
+        # IPs externas, de nodos o ya vistas sin pod: no hace falta encolar nada.
+        # Las IPs de Services y de nodos con pods hostNetwork quedan fuera de las redes
+        # de pods pero sí se resuelven a pods, así que se comprueban antes.
+        with ALERT_STAGE_SECONDS.time(stage="negative_cache"):
+            not_pod = None if resolves_to_pods(src_ip) else non_pod_cache.check(ip)
+        if not_pod:
+            count_alert(sig_id, "pod_not_found")
+            return {"error": "Pod no encontrado", "reason": not_pod, "src_ip": src_ip}, 404
+        detected = event_time(data)
+        # Reglas con umbral: solo se actúa a la N-ésima alerta de la IP dentro de la ventana
+        threshold = rule_info.get("threshold")
+        if threshold:
+            with ALERT_STAGE_SECONDS.time(stage="threshold"):
+                triggered, hits = threshold_hit(sig_id, src_ip, threshold, detected)
+            if not triggered:
+                count_alert(sig_id, "below_threshold")
+                return {
+                    "status": "below_threshold",
                     "rule_id": sig_id,
-                    "applied_label": {"seguridad": label_value},
-                }), 200
-        return jsonify({"error": "Pod no encontrado"}), 404
+                    "src_ip": src_ip,
+                    "hits": hits,
+                    "threshold": threshold,
+                }, 200
+        incident = incident_tracker.open(sig_id, src_ip, detected)
+        # La búsqueda del pod y el PATCH se hacen en el pool de workers
+        job_id = remediation_pool.submit(
+            lambda: remediate_job(sig_id, src_ip, label_value, incident),
+            rule_id=sig_id, src_ip=src_ip, incident_id=incident["id"],
+        )
+        if job_id is None:
+            app.logger.error(f"Cola de remediación llena, alerta descartada (regla {sig_id}, IP {src_ip})")
+            count_alert(sig_id, "rejected")
+            incident_tracker.close(incident, "rejected")
+            return {"error": "Cola de remediación llena, reintentar más tarde"}, 503
+        return {
+            "status": "queued",
+            "job_id": job_id,
+            "incident_id": incident["id"],
+            "rule_id": sig_id,
+            "src_ip": src_ip,
+            "applied_label": {"seguridad": label_value},
+        }, 202
     except Exception as e:
         app.logger.error(f"Error handling alert: {e}")
-        return jsonify({"error": str(e)}), 500
+        count_alert(sig_id, "error")
+        return {"error": str(e)}, 500
+
+def threshold_hit(sig_id, src_ip, threshold, detected):
+    """
+    Cuenta una alerta de una regla con umbral. Con varios workers la cuenta siempre el
+    worker dueño de la pareja (regla, IP), para que todas sus alertas caigan en la misma
+    ventana; si ese worker no responde, se cuenta en este. La consulta es una ida y vuelta
+    por socket Unix (como mucho IPS_PEER_TIMEOUT) y con el núcleo asyncio ocupa el bucle.
+    """
+    if peer_node is not None:
+        try:
+            return peer_node.call_owner(f"{sig_id}|{src_ip}", "threshold_hit", sig_id, src_ip, threshold, detected)
+        except (OSError, ValueError, RuntimeError) as e:
+            app.logger.warning(f"Umbral de la regla {sig_id} contado en este worker: {e}")
+    return threshold_tracker.hit(sig_id, src_ip, threshold, detected)
+
+def indexes_ready():
+    """
+    Indica, sin esperar, si los índices de pods y Services ya tienen su primer LIST.
+    """
+    return pod_index.is_ready() and (service_index is None or service_index.is_ready())
+
+def resolves_to_pods(src_ip):
+    """
+    Indica si la IP, sin ser de un pod, es la de un Service o la de un nodo con pods hostNetwork.
+    """
+    return ((service_index is not None and service_index.has(src_ip))
+            or (pod_index is not None and pod_index.has_host_ip(src_ip)))
+
+def resolve_pods(src_ip, at=None):
+    """
+    Devuelve (pods, via): los pods candidatos para una IP de origen en el instante at
+    (hora del evento) y cómo se han encontrado.
+    - "pod": la IP es la de un pod (siempre tiene prioridad).
+    - "pod_gone" / "ip_reused" (sin pods): la IP era de un pod que ya no existe o el pod
+      actual la recibió después del evento; no se etiqueta al que la ha heredado.
+    - "service:<namespace>/<nombre>": ClusterIP/externalIP de un Service; sus endpoints.
+    - "host_network": IP de un nodo; sus pods con hostNetwork.
+    Todo sale de los índices en memoria, sin llamadas a la API.
+    """
+    pod, reason = pod_index.resolve_ip(src_ip, at)
+    if pod is not None:
+        return [pod], "pod"
+    if reason != "not_found":
+        return [], reason
+    if service_index is not None:
+        resolved = service_index.resolve(src_ip)
+        if resolved is not None:
+            (namespace, name), keys = resolved
+            pods = [p for p in (pod_index.get(*key) for key in sorted(keys)) if p is not None]
+            return pods, f"service:{namespace}/{name}"
+    pods = pod_index.host_network_pods(src_ip)
+    if pods:
+        return sorted(pods, key=lambda p: (p.namespace, p.name)), "host_network"
+    return [], None
+
+def remediate(sig_id, src_ip, label_value, incident):
+    """
+    Trabajo de remediación: resuelve la IP indicada a sus pods con los índices y los etiqueta.
+    Si hay varios candidatos se aplica IPS_MULTI_MATCH_POLICY.
+    Se ejecuta en un worker de remediation_pool. Devuelve una tupla (respuesta, código HTTP).
+    """
+    done, pods, via = plan_remediation(sig_id, src_ip, incident)
+    if done is not None:
+        return done
+    # Política "all": el incidente sigue al primer pod; el resto se etiqueta sin seguimiento
+    results = [label_pod(sig_id, pod, label_value, incident if i == 0 else None) for i, pod in enumerate(pods)]
+    return remediation_result(sig_id, via, label_value, results)
+
+async def remediate_async(sig_id, src_ip, label_value, incident):
+    """
+    remediate() para el núcleo asyncio (asgi.py): los PATCH de los candidatos van en paralelo.
+    Mientras los índices terminan su primer LIST, plan_remediation() espera por ellos en
+    un hilo para no bloquear el bucle de eventos.
+    """
+    if indexes_ready():
+        done, pods, via = plan_remediation(sig_id, src_ip, incident)
+    else:
+        done, pods, via = await asyncio.get_running_loop().run_in_executor(
+            None, plan_remediation, sig_id, src_ip, incident)
+    if done is not None:
+        return done
+    results = await asyncio.gather(*(label_pod_async(sig_id, pod, label_value, incident if i == 0 else None)
+                                     for i, pod in enumerate(pods)))
+    return remediation_result(sig_id, via, label_value, results)
+
+# Trabajo que encola process_event(): remediate en el pool de hilos o remediate_async
+# con el núcleo asyncio (ver create_app())
+remediate_job = remediate
+
+def plan_remediation(sig_id, src_ip, incident):
+    """
+    Resuelve la IP a sus pods y decide a cuáles etiquetar. Devuelve (respuesta, pods, via):
+    respuesta es (cuerpo, código HTTP) si la alerta termina sin ningún PATCH (sin pod,
+    pod borrado o IP ambigua); si no, es None y pods son los pods a etiquetar.
+    """
+    with ALERT_STAGE_SECONDS.time(stage="pod_resolve"):
+        pods, via = resolve_pods(src_ip, incident["detected"])
+    if via in ("pod_gone", "ip_reused"):
+        app.logger.warning("IP %s: el pod que la tenía al detectarse la alerta ya no existe (%s), no se etiqueta",
+                           src_ip, via)
+        count_alert(sig_id, "pod_gone")
+        incident_tracker.close(incident, "pod_gone", reason=via)
+        return ({"error": "El pod que tenía la IP ya no existe", "reason": via, "src_ip": src_ip}, 404), None, via
+    if not pods:
+        if via is None:
+            non_pod_cache.add(src_ip)
+            # Si el pod ha aparecido entre la búsqueda y el add, el listener ya no lo verá
+            if pod_index.get_by_ip(src_ip) is not None:
+                non_pod_cache.invalidate(src_ip)
+        count_alert(sig_id, "pod_not_found")
+        incident_tracker.close(incident, "pod_not_found", via=via)
+        body = {"error": "Pod no encontrado"}
+        if via is not None:
+            body["via"] = via
+        return (body, 404), None, via
+    if len(pods) > 1 and MULTI_MATCH_POLICY == "unique":
+        candidates = [f"{p.namespace}/{p.name}" for p in pods]
+        app.logger.warning("IP %s (%s) corresponde a %d pods, no se etiqueta ninguno: %s",
+                           src_ip, via, len(pods), ", ".join(candidates))
+        count_alert(sig_id, "ambiguous")
+        incident_tracker.close(incident, "ambiguous", via=via, candidates=candidates)
+        return ({
+            "error": "La IP corresponde a varios pods",
+            "via": via,
+            "candidates": candidates,
+            "rule_id": sig_id,
+        }, 409), None, via
+    return None, pods, via
+
+def remediation_result(sig_id, via, label_value, results):
+    """
+    Respuesta del trabajo de remediación a partir del (respuesta, código HTTP, resultado)
+    de label_pod() de cada pod etiquetado.
+    """
+    if len(results) == 1:
+        body, status, outcome = results[0]
+        count_alert(sig_id, outcome)
+        if via != "pod":
+            body["via"] = via
+        return body, status
+    outcomes = {outcome for _, _, outcome in results}
+    outcome = next((o for o in ("labeled", "error", "pod_gone") if o in outcomes), "unchanged")
+    count_alert(sig_id, outcome)
+    return {
+        "status": outcome,
+        "via": via,
+        "rule_id": sig_id,
+        "pods": [dict(body, code=status) for body, status, _ in results],
+        "applied_label": {"seguridad": label_value},
+    }, 500 if outcome == "error" else 200
+
+# Reintentos de un PATCH rechazado porque el pod ha cambiado desde que se decidió (409)
+LABEL_CONFLICT_RETRIES = 3
+
+def label_patch(pod, label_value):
+    """
+    Devuelve (cuerpo en bytes, Content-Type) del merge patch que pone la etiqueta. Si se
+    conoce el UID del pod, el patch lo lleva como precondición junto con su
+    resourceVersion: si el nombre ya es de otro pod (p. ej. un StatefulSet recreado) o
+    si otro PATCH ha cambiado el pod mientras tanto, la API responde 409 en lugar de
+    aplicarlo, sin un GET previo.
+    """
+    if not pod.uid:
+        return label_patches.merge(label_value), MERGE_PATCH
+    return label_patches.conditional(pod.uid, label_value, pod.resource_version), MERGE_PATCH
+
+def label_pod(sig_id, pod, label_value, incident):
+    """
+    Aplica la etiqueta a un pod (salvo que el coalescer lo descarte) y lo registra en
+    el incidente, si se indica. Devuelve (respuesta, código HTTP, resultado).
+    """
+    done = prepare_label(sig_id, pod, label_value, incident)
+    if done is not None:
+        return done
+    for attempt in range(LABEL_CONFLICT_RETRIES + 1):
+        try:
+            body, content_type = label_patch(pod, label_value)
+            with ALERT_STAGE_SECONDS.time(stage="patch"):
+                v1_raw.patch_namespaced_pod(pod.name, pod.namespace, body, content_type)
+            return label_result(sig_id, pod, label_value, incident)
+        except Exception as e:
+            if not is_conflict(e, pod):
+                return label_result(sig_id, pod, label_value, incident, e)
+            if attempt == LABEL_CONFLICT_RETRIES:
+                return label_result(sig_id, pod, label_value, incident, conflict_error(pod))
+            try:
+                fresh = pod_info_from_dict(v1_raw.read_namespaced_pod(pod.name, pod.namespace))
+            except Exception as read_error:
+                return label_result(sig_id, pod, label_value, incident, read_error)
+            pod, done = relabel(sig_id, pod, fresh, label_value, incident, e)
+            if done is not None:
+                return done
+
+async def label_pod_async(sig_id, pod, label_value, incident):
+    """
+    label_pod() con el cliente asíncrono de la API (núcleo asyncio, ver asgi.py).
+    """
+    done = prepare_label(sig_id, pod, label_value, incident)
+    if done is not None:
+        return done
+    for attempt in range(LABEL_CONFLICT_RETRIES + 1):
+        try:
+            body, content_type = label_patch(pod, label_value)
+            with ALERT_STAGE_SECONDS.time(stage="patch"):
+                await v1_async.patch_namespaced_pod(pod.name, pod.namespace, body, content_type)
+            return label_result(sig_id, pod, label_value, incident)
+        except Exception as e:
+            if not is_conflict(e, pod):
+                return label_result(sig_id, pod, label_value, incident, e)
+            if attempt == LABEL_CONFLICT_RETRIES:
+                return label_result(sig_id, pod, label_value, incident, conflict_error(pod))
+            try:
+                fresh = pod_info_from_dict(await v1_async.read_namespaced_pod(pod.name, pod.namespace))
+            except Exception as read_error:
+                return label_result(sig_id, pod, label_value, incident, read_error)
+            pod, done = relabel(sig_id, pod, fresh, label_value, incident, e)
+            if done is not None:
+                return done
+
+def is_conflict(error, pod):
+    """
+    Indica si un PATCH fallido merece releer el pod y volver a decidir: un 409 de un
+    PATCH con precondiciones (UID distinto o pod modificado mientras tanto).
+    """
+    return isinstance(error, ApiException) and error.status == 409 and pod.uid is not None
+
+def conflict_error(pod):
+    return RuntimeError(f"El pod {pod.namespace}/{pod.name} ha seguido cambiando tras "
+                        f"{LABEL_CONFLICT_RETRIES} reintentos del PATCH (409)")
+
+def relabel(sig_id, pod, fresh, label_value, incident, error):
+    """
+    Tras un 409, decide con el pod releído (fresh) si se reintenta el PATCH. Devuelve
+    (pod, None) para reintentar con esa copia, o (pod, resultado) si termina aquí: otro
+    pod con el mismo nombre (UID distinto), o el coalescer lo descarta porque otra alerta
+    ya ha puesto esa etiqueta o una más fuerte.
+    """
+    if fresh.uid != pod.uid:
+        return pod, label_result(sig_id, pod, label_value, incident, error)
+    suppressed = coalescer.recheck(fresh, label_value)
+    if suppressed:
+        return fresh, unchanged_result(sig_id, fresh, label_value, incident, suppressed)
+    return fresh, None
+
+def prepare_label(sig_id, pod, label_value, incident):
+    """
+    Decide si hace falta el PATCH. Devuelve el resultado de label_pod() si el coalescer
+    lo descarta, o None si hay que enviarlo (y el incidente pasa a esperarlo).
+    """
+    # No repite el PATCH si la etiqueta ya está puesta o se acaba de enviar,
+    # ni rebaja un pod que ya tiene una etiqueta más fuerte
+    suppressed = coalescer.check(pod, label_value)
+    if suppressed:
+        return unchanged_result(sig_id, pod, label_value, incident, suppressed)
+    if incident is not None:
+        incident_tracker.expect(incident, pod.namespace, pod.name, label_value)
+    return None
+
+def unchanged_result(sig_id, pod, label_value, incident, suppressed):
+    """
+    Resultado de label_pod() cuando el coalescer descarta el PATCH.
+    """
+    if incident is not None:
+        incident_tracker.close(incident, "unchanged", reason=suppressed, pod=pod.name, namespace=pod.namespace)
+    return {
+        "status": "unchanged",
+        "reason": suppressed,
+        "pod": pod.name,
+        "namespace": pod.namespace,
+        "rule_id": sig_id,
+        "current_label": {"seguridad": pod.labels.get("seguridad")},
+        "applied_label": {"seguridad": label_value},
+    }, 200, "unchanged"
+
+def label_result(sig_id, pod, label_value, incident, error=None):
+    """
+    Registra el resultado del PATCH (error es la excepción, si la ha habido) y devuelve
+    (respuesta, código HTTP, resultado) como label_pod().
+    """
+    if error is not None:
+        coalescer.forget(pod.namespace, pod.name)
+        # 404: el pod ya no existe; 409: la precondición del UID ha fallado (otro pod con el mismo nombre)
+        if isinstance(error, ApiException) and error.status in (404, 409):
+            if incident is not None:
+                incident_tracker.close(incident, "pod_gone", reason="uid_mismatch" if error.status == 409 else "deleted",
+                                       pod=pod.name, namespace=pod.namespace)
+            app.logger.warning("El pod %s/%s (uid %s) ya no existe, no se etiqueta", pod.namespace, pod.name, pod.uid)
+            return {"error": "El pod ya no existe", "pod": pod.name, "namespace": pod.namespace,
+                    "uid": pod.uid}, 404, "pod_gone"
+        if incident is not None:
+            incident_tracker.close(incident, "error", error=str(error))
+        app.logger.error(f"Error handling alert: {error}")
+        return {"error": str(error), "pod": pod.name, "namespace": pod.namespace}, 500, "error"
+    if incident is not None:
+        incident_tracker.patched(incident)
+    app.logger.info("POD etiquetado. Label --> seguridad='%s' al pod %s en el namespace %s", label_value, pod.name, pod.namespace)
+    return {
+        "status": "labeled",
+        "pod": pod.name,
+        "namespace": pod.namespace,
+        "rule_id": sig_id,
+        "applied_label": {"seguridad": label_value},
+    }, 200, "labeled"
+
+def ingest_eve_line(line):
+    """
+    Procesa una línea de eve.json (de eve_tailer o de eve_socket) con el mismo camino que /alert.
+    Los registros que no son alertas se descartan sin decodificarlos y de las alertas
+    solo se extraen los campos necesarios; si la línea no tiene la forma esperada se
+    decodifica entera.
+    """
+    event_type = event_type_of(line)
+    if event_type is not None and event_type != "alert":
+        return
+    record = extract_alert(line) if event_type == "alert" else None
+    if record is None:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            count_alert(None, "invalid")
+            app.logger.error(f"Línea de eve.json inválida: {e}")
+            return
+        if not isinstance(record, dict) or record.get("event_type") != "alert":
+            return
+    # fluent-bit añade la hora de lectura en 'date'
+    record.setdefault("date", time.time())
+    process_event(record)
+
+@app.route('/alert', methods=['POST'])
+def alert():
+    """
+    Recibe una o varias alertas en formato JSON y las procesa con process_event().
+    - Un único objeto: responde con el resultado y su código HTTP (202 si se ha encolado).
+    - Un array o varias líneas (json_lines de fluent-bit): responde con un array de
+      resultados, uno por evento y en el mismo orden, cada uno con su "code" (ver
+      process_batch()).
+    """
+    with ALERT_STAGE_SECONDS.time(stage="parse"):
+        events, is_batch = parse_json_payload(request.get_data(cache=False))
+    if not events:
+        return jsonify({"error": "Cuerpo de la petición vacío"}), 400
+    if not is_batch:
+        body, status = process_event(events[0])
+        return jsonify(body), status
+    results, status = process_batch(events)
+    return jsonify(results), status
+
+def process_batch(events):
+    """
+    Procesa un lote de eventos en orden. Devuelve (resultados, código HTTP): 200, o 503
+    si la cola de remediación se ha llenado. En ese caso se para en el evento rechazado,
+    porque fluent-bit solo reintenta el lote si la respuesta no es 2xx; los eventos ya
+    encolados que se repitan los descarta el coalescer.
+    """
+    results = []
+    for event in events:
+        body, status = process_event(event)
+        body["code"] = status
+        results.append(body)
+        if status == 503:
+            return results, 503
+    return results, 200
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Devuelve el estado de un trabajo de remediación encolado por /alert.
+    """
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Trabajo {job_id} no encontrado"}), 404
+    return jsonify(job)
+
+def find_job(job_id):
+    """
+    Busca un trabajo en este worker y, si no está, en los demás.
+    """
+    job = remediation_pool.get(job_id)
+    if job is None and peer_node is not None:
+        job = next((job for job in peer_node.call("job", job_id) if job is not None), None)
+    return job
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Devuelve las métricas del listener en formato OpenMetrics para Prometheus.
+    """
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/log-stats')
+def log_stats():
+    """
+    Devuelve la ocupación del buffer de logs, los descartes y los clientes conectados.
+    """
+    return jsonify(log_hub.stats())
+
+@app.route('/stats')
+def stats():
+    """
+    Devuelve contadores internos del listener (cola de remediación, PATCH enviados y
+    descartados, clientes del stream de logs).
+    """
+    return jsonify({
+        "remediation": remediation_pool.stats(),
+        "coalescer": coalescer.stats(),
+        "log_stream": dict(log_hub.stats(), max_clients=LOG_STREAM_MAX_CLIENTS, rejected=log_stream_rejected),
+        "incidents": incident_tracker.stats(),
+        "negative_cache": non_pod_cache.stats(),
+        "thresholds": threshold_tracker.stats(),
+        "service_index": service_index.stats() if service_index is not None else None,
+        "k8s_rate_limit": k8s_bucket.stats() if k8s_bucket is not None else None,
+        "eve_tail": eve_tailer.stats() if eve_tailer is not None else None,
+        "eve_socket": eve_socket.stats() if eve_socket is not None else None,
+        "peers": peer_node.stats() if peer_node is not None else None,
+    })
+
+@app.route('/incidents')
+def incidents():
+    """
+    Devuelve los últimos incidentes (más recientes primero) con sus marcas de tiempo:
+    detected (Suricata), received, patched y confirmed (visto en el watch de pods).
+    Parámetro opcional: limit (por defecto 100).
+    """
+    try:
+        limit = max(1, int(request.args.get("limit", 100)))
+    except ValueError:
+        return jsonify({"error": "limit debe ser un entero"}), 400
+    recent = incident_tracker.recent(limit)
+    if peer_node is not None:
+        # Cada worker conoce solo sus incidentes: se mezclan los últimos de todos
+        for other in peer_node.call("incidents", limit):
+            recent.extend(other)
+        recent.sort(key=lambda incident: incident["received"], reverse=True)
+        del recent[limit:]
+    return jsonify(recent)
+
+@app.route('/incidents/<incident_id>')
+def incident_detail(incident_id):
+    """
+    Devuelve un incidente concreto por su id (el incident_id que devuelve /alert).
+    """
+    incident = incident_tracker.get(incident_id)
+    if incident is None and peer_node is not None:
+        incident = next((i for i in peer_node.call("incident", incident_id) if i is not None), None)
+    if incident is None:
+        return jsonify({"error": f"Incidente {incident_id} no encontrado"}), 404
+    return jsonify(incident)
 
 # --- Listado y gestión de pods etiquetados para seguridad ---
 
@@ -993,19 +2127,14 @@ def labeled_pods():
     ns = request.args.get("namespace")
     pods_labeled = []
     try:
-        if ns:
-            pods = v1.list_namespaced_pod(ns)
-        else:
-            pods = v1.list_pod_for_all_namespaces(watch=False)
-        for pod in pods.items:
-            labels = pod.metadata.labels or {}
-            if 'seguridad' in labels and labels['seguridad']:
+        for pod in pod_index.pods(ns):
+            if pod.labels.get('seguridad'):
                 pods_labeled.append({
-                    "namespace": pod.metadata.namespace,
-                    "name": pod.metadata.name,
-                    "src_ip": pod.status.pod_ip,
-                    "node": pod.spec.node_name,
-                    "label": labels.get('seguridad')
+                    "namespace": pod.namespace,
+                    "name": pod.name,
+                    "src_ip": pod.ip,
+                    "node": pod.node,
+                    "label": pod.labels.get('seguridad')
                 })
         return jsonify(pods_labeled)
     except Exception as e:
@@ -1030,6 +2159,7 @@ def unlabel_pod(namespace, pod):
             namespace=namespace,
             body=patch
         )
+        coalescer.forget(namespace, pod)
         app.logger.info(f"Patch enviado para eliminar 'seguridad' de {pod} en {namespace}")
         return jsonify({"status": "unlabeled"}), 200
     except Exception as e:
@@ -1043,11 +2173,13 @@ def modify_label(namespace, pod):
     """
     data = request.json
     new_label = data.get("label")
-    if new_label not in ["solo-detectar", "detectar-registro", "confinamiento-namespace", "aislamiento-completo"]:
+    if new_label not in LABEL_SEVERITY:
         return jsonify({"error": "Etiqueta inválida"}), 400
     try:
+        # Cambio manual: puede rebajar la etiqueta, a diferencia del escalado automático
         body = {"metadata": {"labels": {"seguridad": new_label}}}
         v1.patch_namespaced_pod(name=pod, namespace=namespace, body=body)
+        coalescer.forget(namespace, pod)
         return jsonify({"status": "modified"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1058,12 +2190,14 @@ def debug_pods():
     """
     Devuelve todos los pods y sus etiquetas, útil para depuración rápida.
     """
-    pods = v1.list_pod_for_all_namespaces(watch=False)
     output = []
-    for pod in pods.items:
-        output.append(f"{pod.metadata.namespace}/{pod.metadata.name} {pod.metadata.labels}")
+    for pod in pod_index.pods():
+        output.append(f"{pod.namespace}/{pod.name} {pod.labels}")
     return "<br>".join(output)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Servidor de desarrollo de Flask; en producción se usa gunicorn (ver gunicorn.conf.py).
+    # Sin recargador: create_app() arranca hilos (índices, remediación) y el proceso
+    # vigilante del recargador los duplicaría
+    create_app().run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
\ No newline at end of file
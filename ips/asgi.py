@@ -0,0 +1,395 @@
+"""
+Núcleo asyncio del alert-listener detrás de una aplicación ASGI.
+
+Con gunicorn gthread cada petición ocupa un hilo mientras espera a la red: un PATCH
+contra la API de Kubernetes, un LIST de pods del panel o, durante todo el tiempo que
+está abierto, cada cliente de /log-stream. Aquí un único bucle de eventos atiende:
+- /alert y /jobs/<id>: process_event() encola corrutinas en AsyncRemediationPool y los
+  PATCH se envían con el cliente asíncrono (k8s_async.py), con el mismo límite de ritmo.
+- /log-stream: cada cliente SSE es una tarea que espera en log_hub, no un hilo (con
+  varios workers, las líneas de los demás llegan por el hilo de peers.py).
+- /namespaces, /pods/<namespace>, /pod-details, /labeled-pods, /unlabel y /modify-label.
+- /rules/export: en streaming, sin reunir la exportación entera en memoria.
+El resto de rutas (reglas, métricas, incidentes, panel...) no hace E/S de red y se sirve
+con la aplicación Flask en un pequeño pool de hilos (IPS_ASGI_WSGI_THREADS), con las
+mismas respuestas JSON, así que el panel embebido (HTML_PAGE) funciona igual.
+
+Los watches de pods, Services y EndpointSlices, la recarga de reglas y los lectores de
+eve siguen siendo hilos, uno por cada uno. Requiere requirements-async.txt:
+
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 5000
+    gunicorn -c gunicorn.conf.py                (IPS_CORE=asgi, el valor por defecto)
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+
+import app as listener
+
+# Hilos para las rutas que se sirven con la aplicación Flask
+WSGI_THREADS = int(os.environ.get("IPS_ASGI_WSGI_THREADS", "4"))
+
+
+class Request:
+    """
+    Petición HTTP de un scope ASGI: método, ruta, parámetros, cabeceras y cuerpo.
+    """
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        self._body = None
+
+    async def body(self):
+        if self._body is None:
+            chunks = []
+            while True:
+                message = await self.receive()
+                if message["type"] == "http.disconnect":
+                    break
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            self._body = b"".join(chunks)
+        return self._body
+
+
+async def send_response(send, status, body, content_type="application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, body, status=200):
+    await send_response(send, status, json.dumps(body).encode())
+
+
+# --- Alertas ---
+
+async def alert(request, send):
+    """
+    POST /alert: como la ruta de Flask; los trabajos se encolan en el bucle de eventos.
+    """
+    with listener.ALERT_STAGE_SECONDS.time(stage="parse"):
+        events, is_batch = listener.parse_json_payload(await request.body())
+    if not events:
+        return await send_json(send, {"error": "Cuerpo de la petición vacío"}, 400)
+    if not is_batch:
+        body, status = listener.process_event(events[0])
+        return await send_json(send, body, status)
+    results, status = listener.process_batch(events)
+    await send_json(send, results, status)
+
+
+async def job_status(request, send, job_id):
+    job = listener.remediation_pool.get(job_id)
+    if job is None and listener.peer_node is not None:
+        # Consulta bloqueante a los demás workers: fuera del bucle
+        job = await asyncio.get_running_loop().run_in_executor(None, listener.find_job, job_id)
+    if job is None:
+        return await send_json(send, {"error": f"Trabajo {job_id} no encontrado"}, 404)
+    await send_json(send, job)
+
+
+# --- Log streaming en vivo ---
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream_logs(request, send):
+    """
+    GET /log-stream: el mismo stream SSE que la ruta de Flask, con un suscriptor asíncrono.
+    """
+    try:
+        last_event_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_event_id = None
+    hub = listener.log_hub
+    sub = hub.subscribe(last_event_id, loop=asyncio.get_running_loop())
+    unfollow = listener.follow_peer_logs(sub, last_event_id)
+    disconnected = asyncio.ensure_future(wait_disconnect(request.receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")],
+        })
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        dropped = 0
+        # El id enviado nunca baja: con varios workers las líneas llegan algo desordenadas
+        # y Last-Event-ID debe ser la más reciente que ha visto el navegador
+        sent_id = 0
+        while True:
+            waiter = asyncio.ensure_future(sub.wait(listener.SSE_HEARTBEAT))
+            await asyncio.wait((waiter, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                waiter.cancel()
+                break
+            items = waiter.result()
+            if not items:
+                chunk = ": keep-alive\n\n"
+            else:
+                parts = []
+                if sub.dropped != dropped:
+                    parts.append(f"data: [{sub.dropped - dropped} eventos descartados: cliente demasiado lento]\n\n")
+                    dropped = sub.dropped
+                for item in sorted(items, key=listener.log_item_id):
+                    sent_id = max(sent_id, item[0])
+                    data = "\ndata: ".join(hub.format(item).splitlines() or [""])
+                    parts.append(f"id: {sent_id}\ndata: {data}\n\n")
+                chunk = "".join(parts)
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    except OSError:
+        pass
+    finally:
+        disconnected.cancel()
+        if unfollow is not None:
+            unfollow()
+        hub.unsubscribe(sub)
+
+
+# --- Reglas ---
+
+async def export_rules(request, send):
+    """
+    GET /rules/export: la exportación en streaming de la ruta de Flask, trozo a trozo en
+    lugar de pasar por call_wsgi(), que reúne la respuesta completa en memoria.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in listener.EXPORT_MIMETYPES:
+        return await send_json(send, {"error": f"Formato inválido '{fmt}' (ndjson o csv)"}, 400)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", listener.EXPORT_MIMETYPES[fmt].encode()),
+                    (b"content-disposition", f"attachment; filename=rules.{fmt}".encode())],
+    })
+    for chunk in listener.export_rules_chunks(listener.RULES, fmt):
+        if chunk:
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+# --- Namespaces y pods ---
+
+async def list_namespaces(request, send):
+    try:
+        namespaces = await listener.v1_async.list_namespace()
+        await send_json(send, [ns["metadata"]["name"] for ns in namespaces["items"]])
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+async def list_pods(request, send, namespace):
+    try:
+        pods = await listener.v1_async.list_namespaced_pod(namespace)
+        await send_json(send, [
+            {"name": pod["metadata"]["name"], "ip": pod["status"]["podIP"]}
+            for pod in pods["items"] if (pod.get("status") or {}).get("podIP")
+        ])
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+async def pod_details(request, send):
+    namespace = request.args.get("namespace")
+    pod_name = request.args.get("pod")
+    if not namespace or not pod_name:
+        return await send_json(send, {"error": "Missing parameters"}, 400)
+    try:
+        pod = await listener.v1_async.read_namespaced_pod(pod_name, namespace)
+        await send_json(send, {"ip": (pod.get("status") or {}).get("podIP"),
+                               "labels": pod["metadata"].get("labels") or {}})
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+async def labeled_pods(request, send):
+    # pods() esperaría al primer LIST del índice bloqueando el bucle
+    if not listener.pod_index.is_ready():
+        await send_json(send, {"error": "El índice de pods aún no está listo"}, 503)
+        return
+    await send_json(send, [
+        {"namespace": pod.namespace, "name": pod.name, "src_ip": pod.ip, "node": pod.node,
+         "label": pod.labels.get("seguridad")}
+        for pod in listener.pod_index.pods(request.args.get("namespace")) if pod.labels.get("seguridad")
+    ])
+
+
+async def unlabel_pod(request, send, namespace, pod):
+    try:
+        await listener.v1_async.patch_namespaced_pod(pod, namespace, {"metadata": {"labels": {"seguridad": None}}})
+        listener.coalescer.forget(namespace, pod)
+        listener.app.logger.info(f"Patch enviado para eliminar 'seguridad' de {pod} en {namespace}")
+        await send_json(send, {"status": "unlabeled"})
+    except Exception as e:
+        listener.app.logger.error(f"Error eliminando etiqueta: {e}")
+        await send_json(send, {"error": str(e)}, 500)
+
+
+async def modify_label(request, send, namespace, pod):
+    try:
+        new_label = json.loads(await request.body()).get("label")
+    except (ValueError, AttributeError):
+        return await send_json(send, {"error": "Se esperaba un objeto JSON con 'label'"}, 400)
+    if new_label not in listener.LABEL_SEVERITY:
+        return await send_json(send, {"error": "Etiqueta inválida"}, 400)
+    try:
+        # Cambio manual: puede rebajar la etiqueta, a diferencia del escalado automático
+        await listener.v1_async.patch_namespaced_pod(pod, namespace, {"metadata": {"labels": {"seguridad": new_label}}})
+        listener.coalescer.forget(namespace, pod)
+        await send_json(send, {"status": "modified"})
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+ROUTES = [
+    ("POST", re.compile(r"/alert"), alert),
+    ("GET", re.compile(r"/jobs/(?P<job_id>[^/]+)"), job_status),
+    ("GET", re.compile(r"/log-stream"), stream_logs),
+    ("GET", re.compile(r"/rules/export"), export_rules),
+    ("GET", re.compile(r"/namespaces"), list_namespaces),
+    ("GET", re.compile(r"/pods/(?P<namespace>[^/]+)"), list_pods),
+    ("GET", re.compile(r"/pod-details"), pod_details),
+    ("GET", re.compile(r"/labeled-pods"), labeled_pods),
+    ("POST", re.compile(r"/unlabel/(?P<namespace>[^/]+)/(?P<pod>[^/]+)"), unlabel_pod),
+    ("POST", re.compile(r"/modify-label/(?P<namespace>[^/]+)/(?P<pod>[^/]+)"), modify_label),
+]
+
+
+# --- Rutas servidas por Flask ---
+
+def wsgi_environ(scope, body):
+    """
+    Entorno WSGI (PEP 3333) equivalente a un scope HTTP de ASGI.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """
+    Ejecuta la aplicación WSGI y devuelve (código, cabeceras, cuerpo) con la respuesta completa.
+    """
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [int(status.split(" ", 1)[0]), headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response[0], response[1], body
+
+
+# --- Aplicación ASGI ---
+
+class AsgiApp:
+    """
+    Aplicación ASGI: las rutas de ROUTES se atienden en el bucle y el resto con la
+    aplicación Flask en un pool de hilos.
+    """
+
+    def __init__(self, flask_app, wsgi_threads=WSGI_THREADS):
+        self.flask_app = flask_app
+        self._executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+        self._started = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        # Sin lifespan (uvicorn --lifespan off) se arranca con la primera petición
+        self._start()
+        request = Request(scope, receive)
+        for method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(request.path)
+            if match is not None and method == request.method:
+                return await handler(request, send, **match.groupdict())
+        await self._wsgi(request, send)
+
+    async def _wsgi(self, request, send):
+        environ = wsgi_environ(request.scope, await request.body())
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(self._executor, call_wsgi, self.flask_app, environ)
+        content_type = "text/html; charset=utf-8"
+        extra = []
+        for name, value in headers:
+            name = name.lower()
+            if name == "content-type":
+                content_type = value
+            elif name != "content-length":
+                extra.append((name.encode("latin-1"), value.encode("latin-1")))
+        await send_response(send, status, body, content_type, extra)
+
+    def _start(self):
+        # Las tareas de remediación se arrancan en el bucle del servidor
+        if not self._started:
+            self._started = True
+            listener.remediation_pool.start()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                listener.remediation_pool.stop()
+                await listener.k8s_async_client.close()
+                self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app():
+    """
+    Inicializa el listener con el núcleo asyncio y devuelve la aplicación ASGI.
+    Como create_app(), debe llamarse en cada proceso (sin preload).
+    """
+    return AsgiApp(listener.create_app(async_core=True))
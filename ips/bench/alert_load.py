@@ -0,0 +1,82 @@
+"""
+Prueba de carga sencilla contra /alert.
+
+Lanza varios hilos que envían la misma alerta en bucle, cada uno con su propia
+conexión keep-alive, y muestra el throughput y los percentiles de latencia.
+
+    python bench/alert_load.py --url http://127.0.0.1:5000 --threads 16 --duration 10
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def worker(url, body, deadline, latencies, errors):
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/alert", body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 500:
+                errors.append(resp.status)
+        except Exception:
+            errors.append(0)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--signature-id", type=int, default=1001)
+    parser.add_argument("--src-ip", default="10.10.0.2")
+    args = parser.parse_args()
+
+    body = json.dumps({
+        "date": time.time(),
+        "event_type": "alert",
+        "src_ip": args.src_ip,
+        "signature_id": args.signature_id,
+        "signature_text": "Load test",
+    })
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(urlparse(args.url), body, deadline, latencies, errors))
+        for _ in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+Reproduce flujos de alertas tipo eve.json contra /alert a ritmo controlado.
+
+Escenarios (--scenario):
+- single: un evento por petición, como un envío directo.
+- batch: lotes json_lines de --batch-size eventos con firmas e IPs mezcladas (fluent-bit).
+- sqlmap: ráfagas de lotes de la misma IP con la firma 1001003 y pausas entre ellas,
+  como un sqlmap --batch contra database.default.svc (escenario/ataques.txt).
+- log4j: eventos sueltos (firmas 1000012/1000013) con llegadas de Poisson, como los
+  bucles curl con sleep aleatorio de escenario/ataques.txt.
+
+El ritmo es de lazo abierto: las peticiones se programan a --rates (una fase por
+ritmo) o en rampa (--ramp inicio:fin) sin esperar a las respuestas, y la latencia se
+mide desde la hora programada, de modo que si el listener se atasca la espera cuenta.
+Con --rates 0 cada conexión envía en bucle lo más rápido posible.
+
+Al final de cada fase se espera a que se vacíe la cola de remediación y se calculan
+las llamadas a la API de Kubernetes por alerta a partir de /metrics.
+
+    python bench/alert_replay.py --url http://127.0.0.1:5000 --scenario batch --rates 50,100,200 \\
+        --duration 10 --install-rules 4 --output resultados.json
+    python bench/alert_replay.py --compare antes.json despues.json
+"""
+import argparse
+import http.client
+import ipaddress
+import json
+import os
+import queue
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from alert_load import percentile
+
+# Firmas de las reglas de Suricata del despliegue (ids/suricata_daemonset.yaml)
+SQLMAP_SIGNATURE = (1001003, "[SQLi] Intento de escaneo con sqlmap detectado")
+LOG4J_SIGNATURES = (
+    (1000012, "[LOG4J] Posible intento de explotación Log4Shell en URL"),
+    (1000013, "[LOG4J] Posible intento de explotación Log4Shell en User-Agent"),
+)
+SIGNATURES = (SQLMAP_SIGNATURE,) + LOG4J_SIGNATURES
+SCENARIOS = ("single", "batch", "sqlmap", "log4j")
+
+_METRIC_LINE = re.compile(r'^(\w+)\{([^}]*)\} (\S+)$')
+
+
+def eve_event(sig, src_ip, rng):
+    """
+    Evento de alerta tal como lo envía fluent-bit: eve.json con 'alert' aplanado
+    (nest lift), signature renombrado a signature_text y la fecha en 'date'.
+    """
+    now = time.time()
+    return {
+        "date": now,
+        "timestamp": datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+0000"),
+        "flow_id": rng.getrandbits(50),
+        "in_iface": "eth0",
+        "event_type": "alert",
+        "src_ip": src_ip,
+        "src_port": rng.randint(32768, 60999),
+        "dest_ip": "10.96.0.80",
+        "dest_port": 80,
+        "proto": "TCP",
+        "action": "allowed",
+        "gid": 1,
+        "signature_id": sig[0],
+        "rev": 1,
+        "signature_text": sig[1],
+        "category": "Web Application Attack",
+        "severity": 1,
+    }
+
+
+class Scenario:
+    """
+    Genera los instantes de llegada y el cuerpo de cada petición de un escenario.
+    """
+
+    def __init__(self, name, src_ips, batch_size=20, burst=10):
+        self.name = name
+        self.src_ips = src_ips
+        self.batch_size = batch_size
+        self.burst = burst
+
+    def arrivals(self, rate_at, duration, rng):
+        """
+        Instantes (segundos desde el inicio de la fase) en los que enviar cada petición.
+        rate_at(t) es el ritmo medio de peticiones por segundo en el instante t.
+        """
+        t = 0.0
+        while t < duration:
+            rate = max(rate_at(t), 0.001)
+            if self.name == "sqlmap":
+                # Ráfaga a 10 veces el ritmo medio y pausa hasta recuperar la media
+                for _ in range(self.burst):
+                    if t >= duration:
+                        return
+                    yield t
+                    t += 1.0 / (10 * rate)
+                t += self.burst / rate - self.burst / (10 * rate)
+            elif self.name == "log4j":
+                t += rng.expovariate(rate)
+                if t < duration:
+                    yield t
+            else:
+                yield t
+                t += 1.0 / rate
+
+    def payload(self, rng, state):
+        """
+        Devuelve (cuerpo, número de eventos) de la siguiente petición.
+        """
+        if self.name == "single":
+            return json.dumps(eve_event(rng.choice(SIGNATURES), rng.choice(self.src_ips), rng)).encode(), 1
+        if self.name == "log4j":
+            return json.dumps(eve_event(rng.choice(LOG4J_SIGNATURES), rng.choice(self.src_ips), rng)).encode(), 1
+        if self.name == "sqlmap":
+            # La misma IP atacante durante toda una ráfaga
+            if state.get("left", 0) <= 0:
+                state["src_ip"] = rng.choice(self.src_ips)
+                state["left"] = self.burst
+            state["left"] -= 1
+            events = [eve_event(SQLMAP_SIGNATURE, state["src_ip"], rng) for _ in range(self.batch_size)]
+        else:
+            events = [eve_event(rng.choice(SIGNATURES), rng.choice(self.src_ips), rng)
+                      for _ in range(self.batch_size)]
+        return "\n".join(json.dumps(e) for e in events).encode(), len(events)
+
+
+def src_ips_from(args):
+    if args.src_ip:
+        return args.src_ip
+    network = ipaddress.ip_network(args.src_cidr, strict=False)
+    hosts = []
+    for ip in network.hosts():
+        hosts.append(str(ip))
+        if len(hosts) >= args.src_count:
+            break
+    return hosts
+
+
+def http_json(url, method="GET", body=None, timeout=10):
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, url.path + (("?" + url.query) if url.query else ""), body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def scrape(base):
+    """
+    Lee de /metrics las llamadas a la API de Kubernetes por operación y las alertas
+    por resultado.
+    """
+    status, data = http_json(urlparse(base + "/metrics"))
+    k8s, outcomes = {}, {}
+    if status != 200:
+        return k8s, outcomes
+    for line in data.decode().splitlines():
+        m = _METRIC_LINE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.groups()
+        labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels))
+        if name == "ips_k8s_requests_total":
+            op = labels.get("operation", "")
+            k8s[op] = k8s.get(op, 0) + float(value)
+        elif name == "ips_alerts_total":
+            outcome = labels.get("outcome", "")
+            outcomes[outcome] = outcomes.get(outcome, 0) + float(value)
+    return k8s, outcomes
+
+
+def wait_drained(base, timeout):
+    """
+    Espera a que la cola de remediación del listener quede vacía.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, data = http_json(urlparse(base + "/stats"))
+            remediation = json.loads(data).get("remediation", {}) if status == 200 else {}
+            if not remediation.get("queue_depth") and not remediation.get("busy_workers"):
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def delta(after, before):
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+
+class Phase:
+    """
+    Una fase de la prueba: un ritmo fijo, una rampa o lazo cerrado (ritmo 0).
+    """
+
+    def __init__(self, name, rate_at, closed_loop=False):
+        self.name = name
+        self.rate_at = rate_at
+        self.closed_loop = closed_loop
+
+
+def sender(url, scenario, jobs, deadline, results, seed, closed_loop):
+    rng = random.Random(seed)
+    state = {}
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    latencies, service, codes, event_codes = [], [], {}, {}
+    events_sent = 0
+    while True:
+        if closed_loop:
+            if time.perf_counter() >= deadline:
+                break
+            scheduled = time.perf_counter()
+        else:
+            scheduled = jobs.get()
+            if scheduled is None:
+                break
+            wait = scheduled - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        body, n_events = scenario.payload(rng, state)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", url.path or "/alert", body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            status = resp.status
+        except Exception:
+            status = 0
+            data = b""
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        end = time.perf_counter()
+        latencies.append(end - scheduled)
+        service.append(end - start)
+        events_sent += n_events
+        codes[status] = codes.get(status, 0) + 1
+        # En los lotes el resultado de cada evento va en su "code"
+        if status == 200 and n_events > 1 or data[:1] == b"[":
+            try:
+                for item in json.loads(data):
+                    code = item.get("code", status)
+                    event_codes[code] = event_codes.get(code, 0) + 1
+            except (ValueError, AttributeError):
+                pass
+        else:
+            event_codes[status] = event_codes.get(status, 0) + n_events
+    conn.close()
+    results.append((latencies, service, codes, event_codes, events_sent))
+
+
+def run_phase(args, base, scenario, phase):
+    url = urlparse(base + "/alert")
+    rng = random.Random(args.seed)
+    k8s_before, outcomes_before = scrape(base)
+    jobs = queue.Queue()
+    results = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=sender, args=(url, scenario, jobs, deadline, results,
+                                              (args.seed or 0) * 1000 + i, phase.closed_loop))
+        for i in range(args.connections)
+    ]
+    for t in threads:
+        t.start()
+    if not phase.closed_loop:
+        for offset in scenario.arrivals(phase.rate_at, args.duration, rng):
+            jobs.put(start + offset)
+        for _ in threads:
+            jobs.put(None)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    drained = wait_drained(base, args.drain_timeout)
+    k8s_after, outcomes_after = scrape(base)
+
+    latencies, service, codes, event_codes, events = [], [], {}, {}, 0
+    for lat, svc, c, ec, n in results:
+        latencies.extend(lat)
+        service.extend(svc)
+        events += n
+        for k, v in c.items():
+            codes[str(k)] = codes.get(str(k), 0) + v
+        for k, v in ec.items():
+            event_codes[str(k)] = event_codes.get(str(k), 0) + v
+    requests = len(latencies)
+    errors = sum(v for k, v in codes.items() if k == "0" or int(k) >= 500)
+    event_errors = sum(v for k, v in event_codes.items() if k == "0" or int(k) >= 500)
+    k8s = delta(k8s_after, k8s_before)
+    latencies.sort()
+    service.sort()
+    return {
+        "phase": phase.name,
+        "scenario": scenario.name,
+        "duration_s": round(elapsed, 3),
+        "requests": requests,
+        "events": events,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "throughput_eps": round(events / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {p: round(percentile(latencies, q) * 1000, 3)
+                       for p, q in (("p50", 50), ("p99", 99), ("p999", 99.9))},
+        "service_ms": {p: round(percentile(service, q) * 1000, 3)
+                       for p, q in (("p50", 50), ("p99", 99), ("p999", 99.9))},
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "status_codes": codes,
+        "event_codes": event_codes,
+        "error_rate": round(errors / requests, 6) if requests else 0.0,
+        "event_error_rate": round(event_errors / events, 6) if events else 0.0,
+        "outcomes": delta(outcomes_after, outcomes_before),
+        "k8s_calls": k8s,
+        "k8s_calls_per_alert": round(sum(k8s.values()) / events, 4) if events else 0.0,
+        "drained": drained,
+    }
+
+
+def build_phases(args):
+    phases = []
+    if args.ramp:
+        low, high = (float(x) for x in args.ramp.split(":"))
+        duration = args.duration
+        phases.append(Phase(f"ramp {low:g}->{high:g}", lambda t: low + (high - low) * t / duration))
+    for rate in (float(r) for r in args.rates.split(",") if r.strip()):
+        if rate <= 0:
+            phases.append(Phase("closed-loop", None, closed_loop=True))
+        else:
+            phases.append(Phase(f"fixed {rate:g}", lambda t, rate=rate: rate))
+    return phases
+
+
+def install_rules(base, action):
+    for sig_id, text in SIGNATURES:
+        body = json.dumps({"rule": sig_id, "description": text, "action": action})
+        status, data = http_json(urlparse(base + "/rules"), "POST", body)
+        if status >= 300:
+            sys.exit(f"No se pudo crear la regla {sig_id}: {status} {data[:200]!r}")
+
+
+def git_version():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """
+    Compara dos archivos de resultados fase a fase (mismo nombre de fase y escenario).
+    """
+    with open(old_path) as f:
+        old = {(p["scenario"], p["phase"]): p for p in json.load(f)["phases"]}
+    with open(new_path) as f:
+        new = json.load(f)["phases"]
+    rows = []
+    for p in new:
+        o = old.get((p["scenario"], p["phase"]))
+        if o is None:
+            continue
+        row = {"scenario": p["scenario"], "phase": p["phase"]}
+        for key, path in (("throughput_rps", ("throughput_rps",)), ("p50_ms", ("latency_ms", "p50")),
+                          ("p99_ms", ("latency_ms", "p99")), ("p999_ms", ("latency_ms", "p999")),
+                          ("error_rate", ("error_rate",)), ("k8s_calls_per_alert", ("k8s_calls_per_alert",))):
+            a, b = o, p
+            for k in path:
+                a, b = a[k], b[k]
+            row[key] = {"old": a, "new": b, "change": round((b - a) / a, 4) if a else None}
+        rows.append(row)
+    print(json.dumps(rows, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="URL base del listener")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="single")
+    parser.add_argument("--rates", default="100", help="ritmos fijos en peticiones/s separados por comas (0 = lazo cerrado)")
+    parser.add_argument("--ramp", help="rampa lineal inicio:fin en peticiones/s durante --duration")
+    parser.add_argument("--duration", type=float, default=10, help="segundos por fase")
+    parser.add_argument("--connections", type=int, default=16, help="conexiones keep-alive concurrentes")
+    parser.add_argument("--batch-size", type=int, default=20, help="eventos por lote en batch y sqlmap")
+    parser.add_argument("--burst", type=int, default=10, help="peticiones por ráfaga en sqlmap")
+    parser.add_argument("--src-ip", action="append", help="IP de origen (repetible); por defecto se toman de --src-cidr")
+    parser.add_argument("--src-cidr", default="10.1.0.0/24", help="red de las IPs de origen (la de bench/fake_apiserver.py)")
+    parser.add_argument("--src-count", type=int, default=200, help="número de IPs de origen distintas")
+    parser.add_argument("--install-rules", type=int, choices=(1, 2, 3, 4),
+                        help="crea antes las reglas de las firmas usadas con esta acción")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="espera máxima a que se vacíe la cola")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"), help="compara dos archivos de resultados")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    base = args.url.rstrip("/")
+    if args.install_rules:
+        install_rules(base, args.install_rules)
+    scenario = Scenario(args.scenario, src_ips_from(args), args.batch_size, args.burst)
+    started = datetime.now(timezone.utc).isoformat()
+    phases = []
+    for phase in build_phases(args):
+        result = run_phase(args, base, scenario, phase)
+        phases.append(result)
+        print(json.dumps({k: result[k] for k in ("phase", "requests", "events", "throughput_rps",
+                                                 "latency_ms", "error_rate", "k8s_calls_per_alert")}),
+              flush=True)
+
+    report = {
+        "version": git_version(),
+        "started": started,
+        "url": base,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "phases": phases,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compara la ingesta de alertas por el socket Unix eve (IPS_EVE_SOCKET) con la ruta
+fluent-bit -> POST /alert.
+
+Para cada ruta envía --events alertas y mide el tiempo hasta que el listener las ha
+procesado todas (según ips_alerts_total en /metrics):
+- alert: lotes json_lines de --batch-size eventos ya aplanados, como los envía
+  fluent-bit tras sus filtros nest/rename, por --connections conexiones keep-alive.
+- socket: registros eve.json originales (con el objeto 'alert' anidado) por una
+  única conexión, como la salida unix_stream de Suricata.
+
+Por defecto se usa una firma sin regla, para medir solo la ingesta y la evaluación de
+reglas sin encolar remediaciones.
+
+    IPS_EVE_SOCKET=/tmp/eve.sock python app.py
+    python bench/eve_ingest.py --url http://127.0.0.1:5000 --socket /tmp/eve.sock --events 50000
+"""
+import argparse
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from alert_replay import eve_event, scrape
+
+
+def nested_eve_event(sig, src_ip, rng):
+    """
+    Registro eve.json tal como lo escribe Suricata, con los datos de la firma en 'alert'.
+    """
+    event = eve_event(sig, src_ip, rng)
+    event.pop("date")
+    alert = {key: event.pop(key) for key in ("action", "gid", "signature_id", "rev", "category", "severity")}
+    alert["signature"] = event.pop("signature_text")
+    event["alert"] = alert
+    return event
+
+
+def processed(base):
+    return sum(scrape(base)[1].values())
+
+
+def wait_processed(base, target, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if processed(base) >= target:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def send_alert(base, lines, batch_size, connections):
+    url = urlparse(base + "/alert")
+    batches = [b"\n".join(lines[i:i + batch_size]) for i in range(0, len(lines), batch_size)]
+    errors = []
+
+    def worker(chunk):
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+        for body in chunk:
+            conn.request("POST", url.path, body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(batches[i::connections],)) for i in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def send_socket(path, lines, chunk_size=64 * 1024):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    data = b"\n".join(lines) + b"\n"
+    view = memoryview(data)
+    for i in range(0, len(data), chunk_size):
+        sock.sendall(view[i:i + chunk_size])
+    sock.close()
+    return []
+
+
+def run(name, base, send, events, timeout):
+    before = processed(base)
+    start = time.perf_counter()
+    errors = send()
+    sent = time.perf_counter() - start
+    done = wait_processed(base, before + events, timeout)
+    elapsed = time.perf_counter() - start
+    return {
+        "route": name,
+        "events": events,
+        "send_s": round(sent, 3),
+        "processed_s": round(elapsed, 3),
+        "events_per_s": round(events / elapsed, 1),
+        "errors": len(errors),
+        "complete": done,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="URL base del listener")
+    parser.add_argument("--socket", required=True, help="ruta de IPS_EVE_SOCKET del listener")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=100, help="eventos por petición en la ruta /alert")
+    parser.add_argument("--connections", type=int, default=4, help="conexiones concurrentes en la ruta /alert")
+    parser.add_argument("--signature-id", type=int, default=999999, help="firma de las alertas (sin regla por defecto)")
+    parser.add_argument("--src-ip", default="10.1.0.1")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--routes", default="alert,socket")
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    base = args.url.rstrip("/")
+    rng = random.Random(1)
+    sig = (args.signature_id, "Benchmark de ingesta")
+    results = []
+    for route in args.routes.split(","):
+        if route == "alert":
+            lines = [json.dumps(eve_event(sig, args.src_ip, rng)).encode() for _ in range(args.events)]
+            send = lambda: send_alert(base, lines, args.batch_size, args.connections)
+        elif route == "socket":
+            lines = [json.dumps(nested_eve_event(sig, args.src_ip, rng)).encode() for _ in range(args.events)]
+            send = lambda: send_socket(args.socket, lines)
+        else:
+            parser.error(f"ruta desconocida: {route}")
+        result = run(route, base, send, args.events, args.timeout)
+        results.append(result)
+        print(json.dumps(result), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,736 @@
+"""
+Servidor local que imita la API de Kubernetes para probar el listener sin clúster.
+
+Genera un clúster sintético (namespaces, nodos y pods con IP) y sirve por HTTP los
+endpoints que usa el listener: LIST y WATCH de pods, Services y EndpointSlices, lista
+de namespaces, lectura, PATCH y borrado de pods. Cada aplicación de cada namespace
+tiene un Service con ClusterIP (10.96.0.0/12) y un EndpointSlice con sus pods, y cada
+nodo (192.168.0.0/16) puede tener pods con hostNetwork. Opcionalmente simula rotación
+de pods (se borran pods y se crean otros que reutilizan sus IPs; los EndpointSlices
+se actualizan) y latencia de la API.
+
+    python bench/fake_apiserver.py --pods 50000 --churn 20 --latency-ms 5 --kubeconfig /tmp/fake.kubeconfig
+    IPS_KUBECONFIG=/tmp/fake.kubeconfig python app.py
+    (o bien IPS_K8S_API_URL=http://127.0.0.1:8001 python app.py)
+
+También se puede arrancar dentro del propio proceso (p. ej. desde otro benchmark):
+
+    server = FakeApiServer(FakeCluster(pods=50000)).start()
+    ... server.url ...
+    server.stop()
+
+Limitaciones: sin autenticación ni TLS, sin paginación (limit/continue) y solo
+labelSelector de igualdad (clave=valor). Los resourceVersion son un contador global.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def status_body(code, reason, message):
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "metadata": {},
+        "status": "Failure",
+        "message": message,
+        "reason": reason,
+        "code": code,
+    }
+
+
+class ApiError(Exception):
+    def __init__(self, code, reason, message):
+        super().__init__(message)
+        self.code = code
+        self.reason = reason
+
+
+def merge_patch(target, patch):
+    """
+    Aplica un merge patch (RFC 7386) sobre un diccionario. Para las etiquetas y
+    anotaciones es equivalente al strategic merge patch de Kubernetes.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = merge_patch(target.get(key), value)
+    return target
+
+
+def _pointer(path):
+    if not path.startswith("/"):
+        raise ApiError(422, "Invalid", f"ruta JSON pointer inválida: {path}")
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def json_patch(target, ops):
+    """
+    Aplica un JSON patch (RFC 6902) con las operaciones add, replace, remove y test.
+    """
+    for op in ops:
+        parts = _pointer(op.get("path", ""))
+        parent = target
+        for part in parts[:-1]:
+            if isinstance(parent, list):
+                parent = parent[int(part)]
+            elif isinstance(parent, dict) and part in parent:
+                parent = parent[part]
+            else:
+                raise ApiError(422, "Invalid", f"no existe la ruta {op.get('path')}")
+        last = parts[-1]
+        kind = op.get("op")
+        if kind == "test":
+            current = parent.get(last) if isinstance(parent, dict) else parent[int(last)]
+            if current != op.get("value"):
+                raise ApiError(422, "Invalid", f"test fallido en {op.get('path')}")
+        elif kind in ("add", "replace"):
+            if isinstance(parent, list):
+                parent.insert(len(parent) if last == "-" else int(last), op.get("value"))
+            else:
+                if kind == "replace" and last not in parent:
+                    raise ApiError(422, "Invalid", f"no existe la ruta {op.get('path')}")
+                parent[last] = op.get("value")
+        elif kind == "remove":
+            try:
+                del parent[int(last) if isinstance(parent, list) else last]
+            except (KeyError, IndexError):
+                raise ApiError(422, "Invalid", f"no existe la ruta {op.get('path')}")
+        else:
+            raise ApiError(422, "Invalid", f"operación de JSON patch no soportada: {kind}")
+    return target
+
+
+class FakeCluster:
+    """
+    Estado del clúster sintético: pods, Services y EndpointSlices indexados por
+    (namespace, nombre), historial de eventos para el WATCH y contadores de peticiones
+    por operación.
+    """
+
+    def __init__(self, pods=1000, namespaces=20, nodes=50, churn=0.0, history=10000, seed=None,
+                 host_network_pods=0):
+        self.random = random.Random(seed)
+        self.namespaces = ["default", "kube-system"] + [f"ns-{i}" for i in range(namespaces)]
+        self.nodes = [f"node-{i}" for i in range(nodes)]
+        self.node_ips = {node: f"192.168.{1 + i // 254}.{1 + i % 254}" for i, node in enumerate(self.nodes)}
+        self.churn = churn
+        self._pods = {}
+        self._services = {}
+        self._slices = {}
+        self._objects = {"pods": self._pods, "services": self._services, "endpointslices": self._slices}
+        # Pods de cada Service (namespace, app) -> {nombre: IP}, en orden de creación
+        self._members = {}
+        self._free_ips = deque()
+        self._next_ip = 0
+        self._next_service_ip = 0
+        self._next_pod = 0
+        self._rv = 0
+        self._events = deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.requests = {}
+        self._requests_lock = threading.Lock()
+        for _ in range(pods):
+            self._create_pod(emit=False)
+        for service in self._members:
+            self._store_slice(service, None)
+        for node in self.nodes:
+            for k in range(host_network_pods):
+                self._create_host_network_pod(node, k)
+
+    # --- Generación de pods ---
+
+    def _allocate_ip(self):
+        if self._free_ips:
+            return self._free_ips.popleft()
+        n = self._next_ip
+        self._next_ip += 1
+        # 10.1.0.1 en adelante, sin usar .0 ni .255
+        n, host = divmod(n, 254)
+        n, third = divmod(n, 256)
+        return f"10.{1 + n}.{third}.{host + 1}"
+
+    def _allocate_service_ip(self):
+        # 10.96.0.1 en adelante (CIDR de Services por defecto de kubeadm)
+        n = self._next_service_ip
+        self._next_service_ip += 1
+        n, host = divmod(n, 254)
+        n, third = divmod(n, 256)
+        return f"10.{96 + n}.{third}.{host + 1}"
+
+    def _create_pod(self, emit=True):
+        i = self._next_pod
+        self._next_pod += 1
+        namespace = self.namespaces[2 + i % (len(self.namespaces) - 2)] if len(self.namespaces) > 2 else "default"
+        app = f"app-{i % 200}"
+        self._rv += 1
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        pod = {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": f"{app}-{i}",
+                "namespace": namespace,
+                "uid": str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+                "resourceVersion": str(self._rv),
+                "creationTimestamp": now,
+                "labels": {"app": app},
+            },
+            "spec": {
+                "nodeName": self.nodes[i % len(self.nodes)],
+                "containers": [{"name": "app", "image": "nginx:latest"}],
+            },
+            "status": {"phase": "Running", "podIP": self._allocate_ip(), "startTime": now,
+                       "hostIP": self.node_ips[self.nodes[i % len(self.nodes)]]},
+        }
+        self._store("pods", pod, "ADDED" if emit else None)
+        service = (namespace, app)
+        if service not in self._members:
+            self._members[service] = {}
+            self._create_service(service, emit)
+        self._members[service][pod["metadata"]["name"]] = pod["status"]["podIP"]
+        if emit:
+            self._store_slice(service, "MODIFIED")
+        return pod
+
+    def _create_host_network_pod(self, node, k):
+        self._rv += 1
+        ip = self.node_ips[node]
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        pod = {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": f"node-agent-{k}-{node}",
+                "namespace": "kube-system",
+                "uid": str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+                "resourceVersion": str(self._rv),
+                "creationTimestamp": now,
+                "labels": {"app": f"node-agent-{k}"},
+            },
+            "spec": {
+                "nodeName": node,
+                "hostNetwork": True,
+                "containers": [{"name": "agent", "image": "busybox:latest"}],
+            },
+            "status": {"phase": "Running", "podIP": ip, "hostIP": ip, "startTime": now},
+        }
+        self._store("pods", pod, None)
+
+    def _create_service(self, service, emit):
+        namespace, app = service
+        self._rv += 1
+        ip = self._allocate_service_ip()
+        svc = {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {"name": app, "namespace": namespace, "resourceVersion": str(self._rv)},
+            "spec": {
+                "type": "ClusterIP",
+                "clusterIP": ip,
+                "clusterIPs": [ip],
+                "selector": {"app": app},
+                "ports": [{"port": 80, "protocol": "TCP", "targetPort": 80}],
+            },
+        }
+        self._store("services", svc, "ADDED" if emit else None)
+        if emit:
+            self._store_slice(service, "ADDED")
+
+    def _store_slice(self, service, event_type):
+        # Un único EndpointSlice por Service con todos sus pods
+        namespace, app = service
+        if event_type is not None:
+            self._rv += 1
+        endpoint_slice = {
+            "apiVersion": "discovery.k8s.io/v1",
+            "kind": "EndpointSlice",
+            "metadata": {
+                "name": f"{app}-slice",
+                "namespace": namespace,
+                "resourceVersion": str(self._rv),
+                "labels": {"kubernetes.io/service-name": app},
+            },
+            "addressType": "IPv4",
+            "endpoints": [
+                {
+                    "addresses": [ip],
+                    "conditions": {"ready": True, "serving": True, "terminating": False},
+                    "targetRef": {"kind": "Pod", "namespace": namespace, "name": name},
+                }
+                for name, ip in self._members[service].items()
+            ],
+            "ports": [{"name": "", "port": 80, "protocol": "TCP"}],
+        }
+        self._store("endpointslices", endpoint_slice, event_type)
+
+    def _store(self, resource, obj, event_type):
+        key = (obj["metadata"]["namespace"], obj["metadata"]["name"])
+        raw = json.dumps(obj, separators=(",", ":"))
+        self._objects[resource][key] = (obj, raw)
+        if event_type:
+            self._emit(resource, event_type, raw)
+
+    def _emit(self, resource, event_type, raw):
+        # Se llama con self._cond adquirido; el rv del evento es el del objeto
+        self._events.append((self._rv, resource, f'{{"type":"{event_type}","object":{raw}}}\n'.encode()))
+        self._cond.notify_all()
+
+    def _delete(self, key):
+        pod, _ = self._pods.pop(key)
+        self._rv += 1
+        pod["metadata"]["resourceVersion"] = str(self._rv)
+        self._emit("pods", "DELETED", json.dumps(pod, separators=(",", ":")))
+        if pod["spec"].get("hostNetwork"):
+            return pod
+        self._free_ips.append(pod["status"]["podIP"])
+        service = (pod["metadata"]["namespace"], pod["metadata"]["labels"].get("app"))
+        if self._members.get(service, {}).pop(pod["metadata"]["name"], None) is not None:
+            self._store_slice(service, "MODIFIED")
+        return pod
+
+    def churn_loop(self):
+        """
+        Reemplaza pods a razón de self.churn por segundo: borra el más antiguo (como un
+        rolling update) y crea otro nuevo. Las IPs liberadas se reutilizan, como hace el
+        CNI de un clúster real.
+        """
+        if self.churn <= 0:
+            return
+        interval = 1.0 / self.churn
+        while not self._stop.wait(interval):
+            with self._cond:
+                # Los pods con hostNetwork (agentes de nodo) no rotan
+                oldest = next((key for key, (pod, _) in self._pods.items()
+                               if not pod["spec"].get("hostNetwork")), None)
+                if oldest is not None:
+                    self._delete(oldest)
+                self._create_pod()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    # --- Operaciones de la API ---
+
+    def count(self, operation):
+        with self._requests_lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def list(self, resource, namespace=None, selector=None):
+        with self._cond:
+            items = [raw for (ns, _), (obj, raw) in self._objects[resource].items()
+                     if (namespace is None or ns == namespace) and _matches(obj, selector)]
+            rv = self._rv
+        kind, api_version = LIST_KINDS[resource]
+        return (f'{{"kind":"{kind}","apiVersion":"{api_version}","metadata":{{"resourceVersion":"{rv}"}},"items":['
+                + ",".join(items) + "]}").encode()
+
+    def list_pods(self, namespace=None, selector=None):
+        return self.list("pods", namespace, selector)
+
+    def list_namespaces(self):
+        with self._cond:
+            rv = self._rv
+        items = [{"metadata": {"name": ns, "resourceVersion": "1"}, "status": {"phase": "Active"}}
+                 for ns in self.namespaces]
+        return {"kind": "NamespaceList", "apiVersion": "v1", "metadata": {"resourceVersion": str(rv)}, "items": items}
+
+    def get_pod(self, namespace, name):
+        with self._cond:
+            entry = self._pods.get((namespace, name))
+        if entry is None:
+            raise ApiError(404, "NotFound", f'pods "{name}" not found')
+        return entry[1].encode()
+
+    def patch_pod(self, namespace, name, content_type, patch):
+        with self._cond:
+            entry = self._pods.get((namespace, name))
+            if entry is None:
+                raise ApiError(404, "NotFound", f'pods "{name}" not found')
+            # Se trabaja sobre una copia para no dejar el pod a medias si el patch falla
+            pod = json.loads(entry[1])
+            if "json-patch" in content_type:
+                if not isinstance(patch, list):
+                    raise ApiError(400, "BadRequest", "un JSON patch debe ser una lista de operaciones")
+                pod = json_patch(pod, patch)
+            else:
+                if not isinstance(patch, dict):
+                    raise ApiError(400, "BadRequest", "un merge patch debe ser un objeto")
+                # Como la API real, metadata.uid y metadata.resourceVersion en el patch son precondiciones
+                uid = (patch.get("metadata") or {}).get("uid")
+                if uid is not None and uid != pod["metadata"].get("uid"):
+                    raise ApiError(409, "Conflict", f"Precondition failed: UID in precondition: {uid}, "
+                                                    f"UID in object meta: {pod['metadata'].get('uid')}")
+                rv = (patch.get("metadata") or {}).pop("resourceVersion", None)
+                if rv is not None and rv != pod["metadata"].get("resourceVersion"):
+                    raise ApiError(409, "Conflict", "the object has been modified; please apply your "
+                                                    "changes to the latest version and try again")
+                pod = merge_patch(pod, patch)
+            self._rv += 1
+            pod["metadata"]["resourceVersion"] = str(self._rv)
+            self._store("pods", pod, "MODIFIED")
+            return self._pods[(namespace, name)][1].encode()
+
+    def delete_pod(self, namespace, name):
+        with self._cond:
+            if (namespace, name) not in self._pods:
+                raise ApiError(404, "NotFound", f'pods "{name}" not found')
+            pod = self._delete((namespace, name))
+        return json.dumps(pod).encode()
+
+    def watch(self, resource_version, timeout, bookmarks, bookmark_interval=10.0, resource="pods"):
+        """
+        Generador de líneas de un WATCH de un recurso (pods, services o endpointslices)
+        desde resource_version. Si ese resourceVersion ya no está en el historial, emite
+        un ERROR 410 y termina.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not resource_version or resource_version == "0":
+                # Sin resourceVersion: estado actual como ADDED y después los cambios
+                last = self._rv
+                initial = [f'{{"type":"ADDED","object":{raw}}}\n'.encode()
+                           for _, raw in self._objects[resource].values()]
+            else:
+                last = int(resource_version)
+                initial = []
+        if initial:
+            yield b"".join(initial)
+        last_bookmark = time.monotonic()
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            expired = None
+            batch = []
+            with self._cond:
+                if self._rv <= last:
+                    self._cond.wait(min(remaining, bookmark_interval))
+                if self._events and self._events[-1][0] > last:
+                    first = self._events[0][0]
+                    if last < first - 1:
+                        expired = first - 1
+                    else:
+                        batch = list(itertools.islice(self._events, last + 1 - first, None))
+                        last = self._events[-1][0]
+            if expired is not None:
+                gone = status_body(410, "Expired", f"too old resource version: {last} ({expired})")
+                yield json.dumps({"type": "ERROR", "object": gone}).encode() + b"\n"
+                return
+            batch = [raw for _, r, raw in batch if r == resource]
+            if batch:
+                yield b"".join(batch)
+            elif bookmarks and time.monotonic() - last_bookmark >= bookmark_interval:
+                last_bookmark = time.monotonic()
+                kind, api_version = LIST_KINDS[resource]
+                yield json.dumps({"type": "BOOKMARK", "object": {
+                    "kind": kind[:-len("List")], "apiVersion": api_version,
+                    "metadata": {"resourceVersion": str(last)}}}).encode() + b"\n"
+
+    def stats(self):
+        with self._cond:
+            pods = len(self._pods)
+            services = len(self._services)
+            rv = self._rv
+        with self._requests_lock:
+            requests = dict(self.requests)
+        return {"pods": pods, "services": services, "resource_version": rv, "requests": requests}
+
+
+LIST_KINDS = {
+    "pods": ("PodList", "v1"),
+    "services": ("ServiceList", "v1"),
+    "endpointslices": ("EndpointSliceList", "discovery.k8s.io/v1"),
+}
+
+
+def _matches(pod, selector):
+    if not selector:
+        return True
+    labels = pod["metadata"].get("labels") or {}
+    for term in selector.split(","):
+        key, _, value = term.partition("=")
+        if labels.get(key.strip()) != value.strip():
+            return False
+    return True
+
+
+def _parse_bool(value):
+    return str(value).lower() in ("true", "1")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "fake-apiserver"
+    # Cabeceras y cuerpo van en dos write(): sin TCP_NODELAY, Nagle + ACK retardado
+    # añaden ~40 ms a cada respuesta en conexiones keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def cluster(self):
+        return self.server.cluster
+
+    def _delay(self, operation):
+        latency = self.server.latency.get(operation, self.server.latency.get("default", 0.0))
+        jitter = self.server.jitter
+        if latency or jitter:
+            time.sleep(max(0.0, random.gauss(latency, jitter)))
+
+    def _send(self, code, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, e):
+        self._send(e.code, status_body(e.code, e.reason, str(e)))
+
+    def _throttle(self):
+        """
+        Emula API Priority and Fairness: por encima de --max-qps responde 429 con
+        Retry-After (sin leer el cuerpo, así que cierra la conexión).
+        """
+        retry = self.server.admit()
+        if retry is None:
+            return False
+        self.cluster.count("throttled")
+        body = json.dumps(status_body(429, "TooManyRequests", "demasiadas peticiones")).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Retry-After", str(retry))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+        return True
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["fake", "stats"]:
+            return self._send(200, self.cluster.stats())
+        if not _parse_bool(query.get("watch")) and self._throttle():
+            return
+        if parts == ["apis", "discovery.k8s.io", "v1", "endpointslices"] and method == "GET":
+            return self._list_or_watch("endpointslices", "endpoint_slice_for_all_namespaces", query)
+        if parts[:2] != ["api", "v1"]:
+            raise ApiError(404, "NotFound", f"ruta no soportada: {url.path}")
+        rest = parts[2:]
+        if rest == ["pods"] and method == "GET":
+            return self._list_or_watch("pods", "pod_for_all_namespaces", query)
+        if rest == ["services"] and method == "GET":
+            return self._list_or_watch("services", "service_for_all_namespaces", query)
+        if rest == ["namespaces"] and method == "GET":
+            self.cluster.count("list_namespace")
+            self._delay("list")
+            return self._send(200, self.cluster.list_namespaces())
+        if len(rest) == 3 and rest[0] == "namespaces" and rest[2] == "pods" and method == "GET":
+            self.cluster.count("list_namespaced_pod")
+            self._delay("list")
+            return self._send(200, self.cluster.list_pods(rest[1], query.get("labelSelector")))
+        if len(rest) == 4 and rest[0] == "namespaces" and rest[2] == "pods":
+            namespace, name = rest[1], rest[3]
+            if method == "GET":
+                self.cluster.count("read_namespaced_pod")
+                self._delay("get")
+                return self._send(200, self.cluster.get_pod(namespace, name))
+            if method == "PATCH":
+                self.cluster.count("patch_namespaced_pod")
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    patch = json.loads(self.rfile.read(length) or b"null")
+                except ValueError as e:
+                    raise ApiError(400, "BadRequest", f"cuerpo JSON inválido: {e}")
+                self._delay("patch")
+                content_type = self.headers.get("Content-Type", "application/merge-patch+json")
+                return self._send(200, self.cluster.patch_pod(namespace, name, content_type, patch))
+            if method == "DELETE":
+                self.cluster.count("delete_namespaced_pod")
+                self._delay("delete")
+                return self._send(200, self.cluster.delete_pod(namespace, name))
+        raise ApiError(405 if rest else 404, "MethodNotAllowed", f"{method} {url.path} no soportado")
+
+    def _list_or_watch(self, resource, operation, query):
+        if _parse_bool(query.get("watch")):
+            return self._watch(resource, operation, query)
+        self.cluster.count(f"list_{operation}")
+        self._delay("list")
+        return self._send(200, self.cluster.list(resource, selector=query.get("labelSelector")))
+
+    def _watch(self, resource, operation, query):
+        self.cluster.count(f"watch_{operation}")
+        timeout = float(query.get("timeoutSeconds") or 1800)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in self.cluster.watch(query.get("resourceVersion"), timeout,
+                                            _parse_bool(query.get("allowWatchBookmarks")), resource=resource):
+                if self.server.watch_delay:
+                    time.sleep(self.server.watch_delay)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _handle(self, method):
+        try:
+            self._route(method)
+        except ApiError as e:
+            self._error(e)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP del clúster sintético. start() lo arranca en un hilo (junto con la
+    rotación de pods) y devuelve el propio servidor; url es la dirección a usar.
+    """
+    daemon_threads = True
+
+    def __init__(self, cluster, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 patch_latency=None, watch_delay=0.0, max_qps=0.0, retry_after=1):
+        super().__init__((host, port), Handler)
+        self.cluster = cluster
+        self.latency = {"default": latency}
+        if patch_latency is not None:
+            self.latency["patch"] = patch_latency
+        self.jitter = jitter
+        self.watch_delay = watch_delay
+        self.max_qps = max_qps
+        self.retry_after = retry_after
+        self._window = (0, 0)
+        self._window_lock = threading.Lock()
+        self._threads = []
+
+    def admit(self):
+        """
+        Cuenta una petición en la ventana del segundo actual. Devuelve None si se admite
+        o los segundos de Retry-After si supera max_qps.
+        """
+        if not self.max_qps:
+            return None
+        second = int(time.monotonic())
+        with self._window_lock:
+            start, count = self._window
+            count = count + 1 if start == second else 1
+            self._window = (second, count)
+        return self.retry_after if count > self.max_qps else None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        for target, name in ((self.serve_forever, "fake-apiserver"), (self.cluster.churn_loop, "fake-churn")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self.cluster.stop()
+        self.shutdown()
+        self.server_close()
+
+    def write_kubeconfig(self, path):
+        """
+        Escribe un kubeconfig que apunta a este servidor (sin autenticación).
+        """
+        kubeconfig = {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+            "users": [{"name": "fake", "user": {}}],
+            "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+            "current-context": "fake",
+        }
+        # JSON es YAML válido, así que no hace falta PyYAML
+        with open(path, "w") as f:
+            json.dump(kubeconfig, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--pods", type=int, default=50000)
+    parser.add_argument("--namespaces", type=int, default=50)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--host-network-pods", type=int, default=2, help="pods con hostNetwork por nodo")
+    parser.add_argument("--churn", type=float, default=0.0, help="pods reemplazados por segundo")
+    parser.add_argument("--history", type=int, default=10000, help="eventos que se conservan para el WATCH")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia media de cada petición")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="desviación típica de la latencia")
+    parser.add_argument("--patch-latency-ms", type=float, default=None, help="latencia de los PATCH (por defecto --latency-ms)")
+    parser.add_argument("--watch-delay-ms", type=float, default=0.0, help="retraso de entrega de los eventos del WATCH")
+    parser.add_argument("--max-qps", type=float, default=0.0, help="peticiones por segundo antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--retry-after", type=int, default=1, help="segundos de Retry-After en las respuestas 429")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--kubeconfig", help="escribe aquí un kubeconfig que apunta al servidor")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cluster = FakeCluster(pods=args.pods, namespaces=args.namespaces, nodes=args.nodes,
+                          churn=args.churn, history=args.history, seed=args.seed,
+                          host_network_pods=args.host_network_pods)
+    server = FakeApiServer(
+        cluster, args.host, args.port,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        patch_latency=None if args.patch_latency_ms is None else args.patch_latency_ms / 1000.0,
+        watch_delay=args.watch_delay_ms / 1000.0,
+        max_qps=args.max_qps,
+        retry_after=args.retry_after,
+    )
+    if args.kubeconfig:
+        server.write_kubeconfig(args.kubeconfig)
+    print(f"Clúster sintético de {args.pods} pods generado en {time.perf_counter() - start:.1f} s; "
+          f"escuchando en {server.url} (estadísticas en {server.url}/fake/stats)", flush=True)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
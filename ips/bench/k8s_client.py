@@ -0,0 +1,158 @@
+"""
+Compara el coste en CPU y memoria del cliente de Kubernetes con modelos (V1Pod) y del
+adaptador sin modelos (k8s_raw.py / pod_index.pod_info_from_dict) en las llamadas del
+camino caliente del listener:
+- list: LIST de todos los pods convertido a PodInfo (lo que hace el índice de pods al
+  arrancar y tras cada 410), repetido --repeat veces.
+- patch: PATCH de la etiqueta con el test del UID, --patches veces sobre pods distintos.
+
+Arranca bench/fake_apiserver.py con --pods pods en otro proceso y mide cada modo en un
+proceso propio, de modo que la CPU y el pico de RSS son solo los del cliente.
+
+    python bench/k8s_client.py --pods 10000 --repeat 5 --patches 2000 --output k8s_client.json
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, count):
+    cpu, wall = time.process_time(), time.perf_counter()
+    result = fn()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return result, {"cpu_ms": round(cpu / count * 1000, 3), "wall_ms": round(wall / count * 1000, 3)}
+
+
+def worker(mode, url, repeat, patches):
+    """
+    Ejecuta las llamadas en un modo (model o raw) y devuelve sus medidas.
+    """
+    from kubernetes import client
+    from k8s_raw import RawCoreV1Api, LabelPatches, MERGE_PATCH
+    from pod_index import pod_info_from_dict, pod_info_from_model
+
+    configuration = client.Configuration()
+    configuration.host = url
+    client.Configuration.set_default(configuration)
+    api = client.CoreV1Api()
+    raw = RawCoreV1Api(api)
+    patches_body = LabelPatches("seguridad", ["solo-detectar"])
+    gc.collect()
+    base_rss = rss_mb()
+
+    def list_model():
+        return [pod_info_from_model(p) for p in api.list_pod_for_all_namespaces(watch=False).items]
+
+    def list_raw():
+        resp = api.list_pod_for_all_namespaces(watch=False, _preload_content=False)
+        return [pod_info_from_dict(p) for p in json.loads(resp.data)["items"]]
+
+    list_once = list_model if mode == "model" else list_raw
+    pods = list_once()  # calentamiento: conexión y primeras importaciones
+    pods, list_stats = measure(lambda: [list_once() for _ in range(repeat)][-1], repeat)
+    gc.collect()
+    list_stats["pods"] = len(pods)
+    list_stats["index_rss_mb"] = round(rss_mb() - base_rss, 1)
+    list_stats["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    targets = [pods[i % len(pods)] for i in range(patches)]
+
+    def patch_model():
+        for pod in targets:
+            body = {"metadata": {"uid": pod.uid, "labels": {"seguridad": "solo-detectar"}}}
+            api.patch_namespaced_pod(name=pod.name, namespace=pod.namespace, body=body)
+
+    def patch_raw():
+        for pod in targets:
+            raw.patch_namespaced_pod(pod.name, pod.namespace,
+                                     patches_body.conditional(pod.uid, "solo-detectar"), MERGE_PATCH)
+
+    _, patch_stats = measure(patch_model if mode == "model" else patch_raw, max(patches, 1))
+    patch_stats["patches"] = patches
+    return {"mode": mode, "list": list_stats, "patch": patch_stats, "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(pods, port):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_apiserver.py"), "--pods", str(pods), "--port", str(port),
+         "--seed", "1"],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url + "/fake/stats", timeout=1).read()
+            return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("el fake_apiserver no ha arrancado")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pods", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="LIST completos por modo")
+    parser.add_argument("--patches", type=int, default=2000, help="PATCH por modo")
+    parser.add_argument("--modes", default="model,raw")
+    parser.add_argument("--url", help="usa un servidor ya arrancado en lugar de lanzar fake_apiserver.py")
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.url, args.repeat, args.patches)))
+        return
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_server(args.pods, free_port())
+    try:
+        results = []
+        for mode in args.modes.split(","):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode, "--url", url,
+                 "--repeat", str(args.repeat), "--patches", str(args.patches)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
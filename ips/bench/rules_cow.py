@@ -0,0 +1,110 @@
+"""
+Micro-benchmark de la tabla de reglas: lock global frente a copy-on-write.
+
+Varios hilos hacen búsquedas de signature_id (como /alert) mientras otro hilo
+edita reglas sin parar (como POST/PUT /rules) y otro serializa la tabla entera
+(como GET /rules). Muestra las búsquedas por segundo en cada modo.
+
+    python bench/rules_cow.py --rules 20000 --readers 4 --duration 3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from types import MappingProxyType
+
+
+class LockedTable:
+    """Modo anterior: dict compartido protegido por un lock global."""
+
+    def __init__(self, rules):
+        self.rules = dict(rules)
+        self.lock = threading.Lock()
+
+    def get(self, sig_id):
+        with self.lock:
+            return self.rules.get(sig_id)
+
+    def set(self, sig_id, value):
+        with self.lock:
+            self.rules[sig_id] = value
+
+    def dump(self):
+        with self.lock:
+            return json.dumps([{"rule": k, **v} for k, v in self.rules.items()])
+
+
+class CowTable:
+    """Modo actual: snapshot inmutable que se sustituye entero en cada cambio."""
+
+    def __init__(self, rules):
+        self.rules = MappingProxyType(dict(rules))
+        self.write_lock = threading.Lock()
+
+    def get(self, sig_id):
+        return self.rules.get(sig_id)
+
+    def set(self, sig_id, value):
+        with self.write_lock:
+            rules = dict(self.rules)
+            rules[sig_id] = value
+            self.rules = MappingProxyType(rules)
+
+    def dump(self):
+        rules = self.rules
+        return json.dumps([{"rule": k, **v} for k, v in rules.items()])
+
+
+def run(table, n_rules, readers, duration):
+    stop = threading.Event()
+    counts = [0] * readers
+    edits = [0]
+
+    def reader(i):
+        ids = [random.randrange(n_rules * 2) for _ in range(1024)]
+        n = 0
+        while not stop.is_set():
+            for sig_id in ids:
+                table.get(sig_id)
+            n += len(ids)
+        counts[i] = n
+
+    def writer():
+        while not stop.is_set():
+            table.set(random.randrange(n_rules), {"description": "bench", "action": random.randint(1, 4)})
+            edits[0] += 1
+            time.sleep(0.001)
+
+    def lister():
+        while not stop.is_set():
+            table.dump()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer), threading.Thread(target=lister)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"lookups_per_s": round(sum(counts) / duration), "edits_per_s": round(edits[0] / duration)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+
+    rules = {i: {"description": f"regla {i}", "action": 1 + i % 4} for i in range(args.rules)}
+    results = {
+        "locked": run(LockedTable(rules), args.rules, args.readers, args.duration),
+        "copy_on_write": run(CowTable(rules), args.rules, args.readers, args.duration),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Agrupación y escalado de acciones por pod para no repetir PATCH innecesarios.
+
+Cuando una misma IP dispara la misma firma cientos de veces por minuto (sqlmap,
+bucles de curl contra log4j...), solo tiene sentido enviar un PATCH por pod. El
+resto se descartan si la etiqueta ya está puesta según el índice de pods, si ya se
+envió ese mismo PATCH dentro de la ventana configurada (el watch todavía no ha
+confirmado el cambio), o si la nueva acción no es más fuerte que la que ya tiene
+el pod: el escalado es monótono y una alerta leve nunca rebaja un aislamiento.
+
+Dos PATCH del mismo pod pueden estar en vuelo a la vez (en hilos o workers distintos),
+así que el PATCH lleva además el resourceVersion con el que se decidió: si otro lo ha
+cambiado antes, la API responde 409 y recheck() vuelve a decidir con el pod releído.
+"""
+import threading
+import time
+
+# Motivos por los que se descarta un PATCH
+SUPPRESSED_NOOP = "noop"
+SUPPRESSED_WINDOW = "window"
+SUPPRESSED_WEAKER = "weaker"
+
+
+class PatchCoalescer:
+    """
+    Decide si hay que enviar un PATCH para (pod, etiqueta) y lleva la cuenta
+    de los PATCH enviados y descartados.
+
+    severity es un diccionario etiqueta -> nivel (mayor es más fuerte); las
+    etiquetas que no aparecen en él se consideran de nivel 0.
+    """
+
+    def __init__(self, severity, window=5.0, label_key="seguridad"):
+        self.severity = severity
+        self.window = window
+        self.label_key = label_key
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.patches = 0
+        self.suppressed_noop = 0
+        self.suppressed_window = 0
+        self.suppressed_weaker = 0
+
+    def check(self, pod, label):
+        """
+        Devuelve None si hay que enviar el PATCH (y lo reserva), o el motivo por el
+        que se descarta: SUPPRESSED_NOOP, SUPPRESSED_WINDOW o SUPPRESSED_WEAKER.
+        """
+        current = pod.labels.get(self.label_key)
+        level = self.severity.get(label, 0)
+        key = (pod.namespace, pod.name)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            if current == label:
+                self.suppressed_noop += 1
+                return SUPPRESSED_NOOP
+            if self.severity.get(current, 0) > level:
+                self.suppressed_weaker += 1
+                return SUPPRESSED_WEAKER
+            # PATCH enviado hace poco y que el watch todavía no ha confirmado
+            pending = self._recent.get(key)
+            if pending is not None and now - pending[1] < self.window:
+                if pending[0] == label:
+                    self.suppressed_window += 1
+                    return SUPPRESSED_WINDOW
+                if self.severity.get(pending[0], 0) > level:
+                    self.suppressed_weaker += 1
+                    return SUPPRESSED_WEAKER
+            self._recent[key] = (label, now)
+            self.patches += 1
+        return None
+
+    def recheck(self, pod, label):
+        """
+        Vuelve a evaluar un PATCH ya reservado con check() que la API ha rechazado por un
+        conflicto, con la copia recién leída del pod. Devuelve None si hay que reenviarlo
+        (y renueva la reserva) o el motivo por el que se descarta.
+        """
+        current = pod.labels.get(self.label_key)
+        level = self.severity.get(label, 0)
+        key = (pod.namespace, pod.name)
+        now = time.monotonic()
+        with self._lock:
+            if current == label:
+                self.suppressed_noop += 1
+                return SUPPRESSED_NOOP
+            if self.severity.get(current, 0) > level:
+                self.suppressed_weaker += 1
+                return SUPPRESSED_WEAKER
+            # Otra alerta más fuerte con su PATCH todavía en vuelo
+            pending = self._recent.get(key)
+            if (pending is not None and now - pending[1] < self.window
+                    and self.severity.get(pending[0], 0) > level):
+                self.suppressed_weaker += 1
+                return SUPPRESSED_WEAKER
+            self._recent[key] = (label, now)
+        return None
+
+    def forget(self, namespace, name):
+        """
+        Libera la reserva de un pod, p. ej. si el PATCH ha fallado o si un operador
+        ha cambiado la etiqueta a mano, para que la siguiente alerta se evalúe de nuevo.
+        """
+        with self._lock:
+            self._recent.pop((namespace, name), None)
+
+    def _prune(self, now):
+        # Limpia las entradas caducadas como mucho una vez por ventana
+        if now - self._last_prune < self.window:
+            return
+        self._last_prune = now
+        self._recent = {k: v for k, v in self._recent.items() if now - v[1] < self.window}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_seconds": self.window,
+                "patches": self.patches,
+                "suppressed": self.suppressed_noop + self.suppressed_window + self.suppressed_weaker,
+                "suppressed_noop": self.suppressed_noop,
+                "suppressed_window": self.suppressed_window,
+                "suppressed_weaker": self.suppressed_weaker,
+                "tracked": len(self._recent),
+            }
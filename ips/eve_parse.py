@@ -0,0 +1,87 @@
+"""
+Lectura rápida de registros eve.json de Suricata sin depender de los filtros de fluent-bit.
+
+Suricata escribe cada registro en una línea JSON compacta con los campos de cabecera
+(timestamp, flow_id, event_type, src_ip...) antes del objeto 'alert' y de los datos de
+aplicación. Para cada línea:
+- event_type_of() localiza event_type sin decodificar el JSON, de modo que los
+  registros que no son alertas (flow, http, dns, stats...) se descartan al momento.
+- extract_alert() decodifica solo la cabecera y el objeto 'alert' (no los datos de
+  aplicación, el payload ni flow, que suelen ser la mayor parte de la línea). Dentro
+  de cadenas JSON las comillas van escapadas (\\"), así que un "alert":{ literal en
+  el payload no puede confundirse con la clave. Si la línea no tiene la forma
+  esperada devuelve None y se decodifica completa.
+- normalize_event() acepta un evento ya decodificado, aplanado por fluent-bit o con
+  el objeto 'alert' anidado, y deja los campos de la firma en el primer nivel.
+"""
+import json
+import re
+
+_EVENT_TYPE = re.compile(r'"event_type"\s*:\s*"([^"]*)"')
+_EVENT_TYPE_BYTES = re.compile(rb'"event_type"\s*:\s*"([^"]*)"')
+_ALERT = re.compile(r'"alert"\s*:\s*\{')
+_decoder = json.JSONDecoder()
+
+# Campos que se conservan de la cabecera y del objeto alert
+HEADER_FIELDS = ("timestamp", "flow_id", "event_type", "src_ip", "src_port", "dest_ip", "dest_port", "proto")
+ALERT_FIELDS = (("signature_id", "signature_id"), ("severity", "severity"), ("signature", "signature_text"))
+
+
+def event_type_of(line, pos=0, endpos=None):
+    """
+    Devuelve el event_type de una línea JSON (str o bytes, opcionalmente el tramo
+    [pos, endpos) de un texto mayor) sin decodificarla, o None si no lo contiene.
+    """
+    if endpos is None:
+        endpos = len(line)
+    if isinstance(line, str):
+        m = _EVENT_TYPE.search(line, pos, endpos)
+        return m.group(1) if m else None
+    m = _EVENT_TYPE_BYTES.search(line, pos, endpos)
+    return m.group(1).decode("ascii", "replace") if m else None
+
+
+def extract_alert(line):
+    """
+    Extrae de una línea eve.json de alerta (bytes o str) los campos que usa el listener
+    decodificando solo la cabecera y el objeto 'alert' (no http, payload, flow...).
+    Devuelve None si la línea no tiene esa forma (hay que decodificarla entera).
+    """
+    text = line.decode("utf-8", "replace") if isinstance(line, (bytes, bytearray)) else line
+    m = _ALERT.search(text)
+    if m is None:
+        return None
+    head = text[:m.start()].rstrip()
+    if not head.startswith("{") or not head.endswith(","):
+        return None
+    try:
+        header = json.loads(head[:-1] + "}")
+        alert, _ = _decoder.raw_decode(text, m.end() - 1)
+    except ValueError:
+        return None
+    if not isinstance(alert, dict) or "signature_id" not in alert or "src_ip" not in header:
+        return None
+    event = {key: header[key] for key in HEADER_FIELDS if key in header}
+    for key, name in ALERT_FIELDS:
+        if key in alert:
+            event[name] = alert[key]
+    return event
+
+
+def normalize_event(data):
+    """
+    Devuelve el evento con signature_id, severity y signature_text en el primer nivel.
+    Los eventos ya aplanados por fluent-bit se devuelven tal cual.
+    """
+    if "signature_id" in data:
+        return data
+    alert = data.get("alert")
+    if not isinstance(alert, dict):
+        return data
+    event = dict(data)
+    event["signature_id"] = alert.get("signature_id")
+    if "severity" in alert:
+        event["severity"] = alert["severity"]
+    if "signature" in alert:
+        event["signature_text"] = alert["signature"]
+    return event
@@ -0,0 +1,188 @@
+"""
+Servidor de socket Unix para la salida eve-log de Suricata de tipo unix_stream.
+
+Suricata se conecta como cliente al socket (filetype: unix_stream) y escribe un
+registro JSON por línea. Cada conexión se lee en un hilo con recv_into sobre un
+buffer fijo: las líneas completas se localizan con find() dentro del buffer, se
+copian una sola vez para el handler y la línea incompleta del final se mueve al
+principio del buffer antes de la siguiente lectura. Sin archivo intermedio ni HTTP.
+
+Solo un proceso escucha a la vez: el que obtiene un flock sobre <ruta>.lock (con
+varios workers de gunicorn, los demás quedan de reserva y toman el relevo si cae).
+"""
+import fcntl
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EveSocketServer:
+    """
+    Acepta conexiones en un socket Unix y entrega cada línea (bytes) a handler.
+    """
+
+    def __init__(self, path, handler, buffer_size=1 << 20, max_line=1 << 22, mode=0o660):
+        self.path = path
+        self.handler = handler
+        self.buffer_size = buffer_size
+        self.max_line = max_line
+        self.mode = mode
+        self._sock = None
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.active = False
+        self.connections = 0
+        self.connected = 0
+        self.lines = 0
+        self.bytes = 0
+        self.errors = 0
+        self.oversized = 0
+
+    def _acquire(self):
+        if self._lock_file is None:
+            self._lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _bind(self):
+        # Con el lock adquirido, un socket existente es de un proceso anterior que ya no está
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, self.mode)
+        sock.listen(16)
+        sock.settimeout(1.0)
+        return sock
+
+    def _deliver(self, line):
+        if not line.strip():
+            return
+        self.lines += 1
+        try:
+            self.handler(line)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[eve_socket] Error procesando una línea: {e}")
+
+    def _serve(self, conn):
+        """
+        Lee una conexión hasta que se cierra y entrega sus líneas completas.
+        """
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        filled = 0
+        # Tras descartar el principio de una línea demasiado larga, su resto también se
+        # descarta hasta el siguiente salto de línea
+        skipping = False
+        with self._lock:
+            self.connected += 1
+        try:
+            while not self._stop.is_set():
+                if filled == len(buf):
+                    # Una línea no cabe en el buffer: se amplía hasta max_line o se descarta
+                    if len(buf) < self.max_line:
+                        view.release()
+                        buf.extend(bytes(len(buf)))
+                        view = memoryview(buf)
+                    else:
+                        self.oversized += 1
+                        filled = 0
+                        skipping = True
+                try:
+                    n = conn.recv_into(view[filled:])
+                except socket.timeout:
+                    continue
+                if not n:
+                    break
+                self.bytes += n
+                scan = filled
+                filled += n
+                start = 0
+                if skipping:
+                    end = buf.find(b"\n", scan, filled)
+                    if end < 0:
+                        filled = 0
+                        continue
+                    skipping = False
+                    start = scan = end + 1
+                while True:
+                    end = buf.find(b"\n", scan, filled)
+                    if end < 0:
+                        break
+                    self._deliver(bytes(view[start:end]))
+                    start = scan = end + 1
+                if start:
+                    # Mueve la línea incompleta al principio del buffer
+                    remaining = filled - start
+                    buf[:remaining] = bytes(view[start:filled])
+                    filled = remaining
+            if filled:
+                self._deliver(bytes(view[:filled]))
+        except OSError as e:
+            logger.error(f"[eve_socket] Error en la conexión: {e}")
+        finally:
+            view.release()
+            conn.close()
+            with self._lock:
+                self.connected -= 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._acquire():
+                self._stop.wait(5)
+                continue
+            try:
+                self._sock = self._bind()
+            except OSError as e:
+                logger.error(f"[eve_socket] No se pudo escuchar en {self.path}: {e}")
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._stop.wait(5)
+                continue
+            self.active = True
+            logger.info(f"[eve_socket] Escuchando eventos de Suricata en {self.path}")
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    logger.error(f"[eve_socket] Error aceptando conexiones: {e}")
+                    break
+                conn.settimeout(1.0)
+                self.connections += 1
+                threading.Thread(target=self._serve, args=(conn,), name="eve-socket-conn", daemon=True).start()
+            self._sock.close()
+            self.active = False
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="eve-socket", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "active": self.active,
+            "connections": self.connections,
+            "connected": self.connected,
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "oversized_lines": self.oversized,
+        }
@@ -0,0 +1,331 @@
+"""
+Lectura directa de los eve.json de Suricata, sin pasar por fluent-bit ni por HTTP.
+
+Un hilo sigue los archivos que casan con un patrón (p. ej. /var/log/suricata/alertas.json),
+lee en bloques grandes, separa las líneas completas y se las pasa a un handler. Detecta
+la rotación (el archivo cambia de inodo: se termina de leer el antiguo y se empieza el
+nuevo desde el principio) y el truncado (copytruncate: se vuelve al principio).
+
+La posición leída de cada archivo (inodo y offset de la última línea procesada) se
+guarda periódicamente en un checkpoint JSON con escritura atómica, de modo que tras un
+reinicio se continúa donde se quedó, aunque el archivo haya rotado mientras tanto.
+Solo un proceso sigue los archivos a la vez: el que obtiene un flock sobre el
+checkpoint (con varios workers de gunicorn, los demás esperan de reserva).
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _File:
+    """
+    Estado de un archivo seguido: descriptor, inodo, offset y línea incompleta pendiente.
+    skipping indica que se está descartando el resto de una línea demasiado larga.
+    """
+
+    def __init__(self, path, fd, st, offset, skipping=False):
+        self.path = path
+        self.fd = fd
+        self.ino = (st.st_dev, st.st_ino)
+        self.offset = offset
+        self.pending = b""
+        self.skipping = skipping
+
+    @property
+    def committed(self):
+        # Offset de la última línea completa entregada al handler
+        return self.offset - len(self.pending)
+
+
+class EveTailer:
+    """
+    Sigue uno o varios eve.json y entrega cada línea (bytes, sin el salto) a handler.
+    """
+
+    def __init__(self, pattern, handler, checkpoint_path, chunk_size=1 << 20, poll_interval=0.2,
+                 checkpoint_interval=1.0, start_at_end=True, max_line=1 << 20):
+        self.pattern = pattern
+        self.handler = handler
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.start_at_end = start_at_end
+        self.max_line = max_line
+        self._files = {}
+        self._checkpoint = {}
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self.active = False
+        self.lines = 0
+        self.bytes = 0
+        self.errors = 0
+        self.rotations = 0
+        self.truncations = 0
+        self.oversized = 0
+
+    # --- Checkpoint ---
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"[eve_tail] Checkpoint ilegible, se ignora: {e}")
+            return {}
+
+    def _save_checkpoint(self):
+        for path, f in self._files.items():
+            self._checkpoint[path] = {"dev": f.ino[0], "ino": f.ino[1], "offset": f.committed,
+                                      "skipping": f.skipping}
+        tmp = self.checkpoint_path + ".tmp"
+        try:
+            with open(tmp, "w") as out:
+                json.dump(self._checkpoint, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.checkpoint_path)
+            self._dirty = False
+        except OSError as e:
+            logger.error(f"[eve_tail] No se pudo guardar el checkpoint: {e}")
+
+    def _acquire(self):
+        """
+        Intenta hacerse con el flock del checkpoint; solo un proceso sigue los archivos.
+        """
+        if self._lock_file is None:
+            self._lock_file = open(self.checkpoint_path + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    # --- Apertura y rotación ---
+
+    def _find_rotated(self, path, ino):
+        # Tras un reinicio, el archivo del checkpoint puede haber rotado (alertas.json.1...)
+        directory = os.path.dirname(path) or "."
+        base = os.path.basename(path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        for name in names:
+            if name.startswith(base) and name != base:
+                candidate = os.path.join(directory, name)
+                try:
+                    st = os.stat(candidate)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) == ino:
+                    return candidate
+        return None
+
+    def _open(self, path, first_scan):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        st = os.fstat(fd)
+        saved = self._checkpoint.get(path)
+        offset = 0
+        skipping = False
+        if saved is not None:
+            saved_ino = (saved.get("dev"), saved.get("ino"))
+            if saved_ino == (st.st_dev, st.st_ino):
+                offset = min(int(saved.get("offset", 0)), st.st_size)
+                skipping = bool(saved.get("skipping"))
+            else:
+                # Termina de leer el archivo rotado antes de empezar el nuevo
+                rotated = self._find_rotated(path, saved_ino)
+                if rotated is not None:
+                    self._drain_rotated(rotated, saved_ino, int(saved.get("offset", 0)), bool(saved.get("skipping")))
+        elif first_scan and self.start_at_end:
+            # Sin checkpoint no se reprocesa el histórico: se empieza por el final
+            offset = st.st_size
+        os.lseek(fd, offset, os.SEEK_SET)
+        logger.info(f"[eve_tail] Siguiendo {path} desde el byte {offset}")
+        self._dirty = True
+        return _File(path, fd, st, offset, skipping)
+
+    def _drain_rotated(self, path, ino, offset, skipping=False):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        st = os.fstat(fd)
+        if (st.st_dev, st.st_ino) != ino:
+            os.close(fd)
+            return
+        os.lseek(fd, min(offset, st.st_size), os.SEEK_SET)
+        f = _File(path, fd, st, min(offset, st.st_size), skipping)
+        logger.info(f"[eve_tail] Leyendo el resto de {path} (rotado) desde el byte {f.offset}")
+        self._read(f)
+        self._flush_pending(f)
+        os.close(fd)
+        self.rotations += 1
+
+    def _flush_pending(self, f):
+        # Una última línea sin salto de línea en un archivo que ya no va a crecer
+        if f.pending:
+            line, f.pending = f.pending, b""
+            self._deliver(line)
+
+    def _check_rotation(self, f):
+        """
+        Comprueba si la ruta apunta ya a otro archivo (rotado) o si se ha truncado.
+        Devuelve True si hay que reabrir la ruta.
+        """
+        try:
+            st = os.stat(f.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or (st.st_dev, st.st_ino) != f.ino:
+            # Lo que quede en el descriptor antiguo sigue siendo legible
+            self._read(f)
+            self._flush_pending(f)
+            os.close(f.fd)
+            self._checkpoint.pop(f.path, None)
+            self.rotations += 1
+            logger.info(f"[eve_tail] {f.path} ha rotado")
+            return True
+        if st.st_size < f.offset:
+            logger.info(f"[eve_tail] {f.path} se ha truncado, se vuelve al principio")
+            os.lseek(f.fd, 0, os.SEEK_SET)
+            f.offset = 0
+            f.pending = b""
+            f.skipping = False
+            self.truncations += 1
+        return False
+
+    # --- Lectura ---
+
+    def _deliver(self, line):
+        if not line.strip():
+            return
+        self.lines += 1
+        try:
+            self.handler(line)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[eve_tail] Error procesando una línea: {e}")
+
+    def _read(self, f):
+        """
+        Lee lo disponible en bloques de chunk_size y entrega las líneas completas.
+        Devuelve el número de bytes leídos.
+        """
+        total = 0
+        while True:
+            chunk = os.read(f.fd, self.chunk_size)
+            if not chunk:
+                return total
+            total += len(chunk)
+            f.offset += len(chunk)
+            self.bytes += len(chunk)
+            self._dirty = True
+            if f.skipping:
+                # Resto de una línea descartada: se ignora hasta el siguiente salto de línea
+                end = chunk.find(b"\n")
+                if end < 0:
+                    continue
+                f.skipping = False
+                chunk = chunk[end + 1:]
+            elif f.pending:
+                chunk = f.pending + chunk
+            lines = chunk.split(b"\n")
+            f.pending = lines.pop()
+            if len(f.pending) > self.max_line:
+                # Línea sin fin razonable: se descarta entera para no crecer sin límite
+                self.oversized += 1
+                f.pending = b""
+                f.skipping = True
+            for line in lines:
+                self._deliver(line)
+
+    def _scan(self, first_scan=False):
+        for path in sorted(glob.glob(self.pattern)):
+            if path not in self._files and not os.path.isdir(path):
+                f = self._open(path, first_scan)
+                if f is not None:
+                    self._files[path] = f
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._acquire():
+                # Otro proceso está siguiendo los archivos; se reintenta más tarde
+                self._stop.wait(5)
+                continue
+            self.active = True
+            self._checkpoint = self._load_checkpoint()
+            self._scan(first_scan=True)
+            last_scan = last_save = time.monotonic()
+            while not self._stop.is_set():
+                read = 0
+                for path, f in list(self._files.items()):
+                    try:
+                        read += self._read(f)
+                        if self._check_rotation(f):
+                            del self._files[path]
+                            new = self._open(path, first_scan=False)
+                            if new is not None:
+                                self._files[path] = new
+                                read += self._read(new)
+                    except OSError as e:
+                        logger.error(f"[eve_tail] Error leyendo {path}: {e}")
+                        # Se cierra y se vuelve a abrir en el siguiente _scan
+                        dropped = self._files.pop(path, None)
+                        if dropped is not None:
+                            try:
+                                os.close(dropped.fd)
+                            except OSError:
+                                pass
+                now = time.monotonic()
+                if now - last_scan >= 5:
+                    self._scan()
+                    last_scan = now
+                if self._dirty and now - last_save >= self.checkpoint_interval:
+                    self._save_checkpoint()
+                    last_save = now
+                if not read:
+                    self._stop.wait(self.poll_interval)
+            self._save_checkpoint()
+            for f in self._files.values():
+                os.close(f.fd)
+            self._files = {}
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self.active = False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="eve-tail", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "pattern": self.pattern,
+            "active": self.active,
+            "files": {path: f.committed for path, f in list(self._files.items())},
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "rotations": self.rotations,
+            "truncations": self.truncations,
+            "oversized_lines": self.oversized,
+        }
@@ -0,0 +1,59 @@
+# Configuración de gunicorn para el alert-listener en producción.
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# IPS_CORE elige el núcleo y con él la aplicación y la clase de worker:
+# - asgi (por defecto): asgi.py con uvicorn (requirements-async.txt). Los PATCH en vuelo y
+#   los clientes de /log-stream son corrutinas y tareas, no hilos.
+# - wsgi: la aplicación Flask en hilos (gthread); cada stream SSE abierto ocupa un hilo.
+#
+# IPS_GUNICORN_WORKERS procesos (1 por defecto). El estado del listener vive en memoria de
+# cada worker; con más de uno, cada worker escucha en un socket Unix de IPS_PEER_DIR
+# (peers.py) y pide a los demás lo que no tiene:
+# - /log-stream mezcla las líneas de log de todos los workers.
+# - /jobs/<id> e /incidents/<id> buscan en el worker que los creó; /incidents mezcla todos.
+# - Los umbrales de cada pareja (regla, IP) se cuentan siempre en el mismo worker.
+# - IPS_K8S_QPS e IPS_K8S_BURST se reparten entre los workers.
+# Las reglas se comparten por el archivo (rules_store.py) y solo un worker lee los eve.
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('IPS_PORT', '5000')}"
+
+core = os.environ.get("IPS_CORE", "asgi")
+if core == "asgi":
+    wsgi_app = "asgi:create_asgi_app()"
+    worker_class = "uvicorn_worker.UvicornWorker"
+elif core == "wsgi":
+    wsgi_app = "app:create_app()"
+    worker_class = "gthread"
+else:
+    raise RuntimeError(f"IPS_CORE={core}: debe ser asgi o wsgi")
+
+workers = int(os.environ.get("IPS_GUNICORN_WORKERS", "1"))
+# Los workers heredan el entorno del máster: todos ven el mismo número de workers y el
+# mismo directorio de sockets (mkdtemp lo crea con permisos 0700)
+os.environ["IPS_GUNICORN_WORKERS"] = str(workers)
+peer_dir = None
+if workers > 1 and "IPS_PEER_DIR" not in os.environ:
+    peer_dir = os.environ["IPS_PEER_DIR"] = tempfile.mkdtemp(prefix="ips-peers-")
+# Hilos del worker gthread (IPS_CORE=wsgi); el núcleo asyncio no los usa
+threads = int(os.environ.get("IPS_GUNICORN_THREADS", "32"))
+
+# fluent-bit reutiliza la conexión HTTP entre flushes: mantenerla abierta más que su intervalo
+keepalive = int(os.environ.get("IPS_GUNICORN_KEEPALIVE", "75"))
+timeout = int(os.environ.get("IPS_GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 10
+
+# Cada worker arranca sus propios hilos (índice de pods, remediación) después del fork
+preload_app = False
+
+accesslog = None
+errorlog = "-"
+loglevel = "info"
+
+
+def on_exit(server):
+    if peer_dir is not None:
+        shutil.rmtree(peer_dir, ignore_errors=True)
@@ -0,0 +1,176 @@
+"""
+Medición de la latencia de aislamiento extremo a extremo de cada remediación.
+
+Para cada alerta con regla se abre un incidente con cuatro marcas de tiempo:
+- detected: hora del evento según Suricata (campo timestamp del eve, o date).
+- received: hora a la que el listener recibe la alerta.
+- patched: hora a la que la API de Kubernetes acepta el PATCH de la etiqueta.
+- confirmed: hora a la que el watch del índice de pods ve la etiqueta aplicada.
+Los tramos se publican como histogramas y los últimos incidentes se conservan para
+consultarlos en /incidents. Las marcas son time.time() de cada máquina: detected
+depende de que el reloj del nodo de Suricata esté sincronizado (NTP).
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# Tramos medidos (etiqueta "segment" del histograma)
+SEGMENTS = (
+    ("detect_to_receive", "detected", "received"),
+    ("receive_to_patch", "received", "patched"),
+    ("patch_to_confirm", "patched", "confirmed"),
+    ("detect_to_confirm", "detected", "confirmed"),
+)
+
+
+def event_time(data):
+    """
+    Devuelve la hora de detección de un evento (epoch en segundos) o None.
+    Prefiere el timestamp ISO 8601 de Suricata; date es el epoch que añade fluent-bit
+    (o el simulador) y puede ser la hora de lectura del log, no la de detección.
+    """
+    ts = data.get("timestamp")
+    if isinstance(ts, str):
+        for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
+            try:
+                return datetime.strptime(ts, fmt).timestamp()
+            except ValueError:
+                continue
+    date = data.get("date")
+    if isinstance(date, (int, float)) and date > 0:
+        return float(date)
+    return None
+
+
+class IncidentTracker:
+    """
+    Registro de incidentes recientes y de los PATCH pendientes de confirmar por el watch.
+    """
+
+    def __init__(self, histogram, history=1000, confirm_ttl=120.0, label_key="seguridad"):
+        self.histogram = histogram
+        self.confirm_ttl = confirm_ttl
+        self.label_key = label_key
+        self._recent = OrderedDict()
+        self._history = history
+        self._pending = {}
+        self._expiry = deque()
+        self._lock = threading.Lock()
+        self.confirmed = 0
+        self.unconfirmed = 0
+
+    def open(self, sig_id, src_ip, detected, received=None):
+        """
+        Abre un incidente para una alerta que va a remediarse y lo devuelve.
+        """
+        incident = {
+            "id": uuid.uuid4().hex,
+            "rule_id": sig_id,
+            "src_ip": src_ip,
+            "status": "open",
+            "detected": detected,
+            "received": received if received is not None else time.time(),
+            "patched": None,
+            "confirmed": None,
+        }
+        with self._lock:
+            self._recent[incident["id"]] = incident
+            while len(self._recent) > self._history:
+                self._recent.popitem(last=False)
+        self._observe(incident, "detect_to_receive")
+        return incident
+
+    def close(self, incident, status, **info):
+        """
+        Cierra un incidente sin PATCH aplicado (pod no encontrado, descartado, error...).
+        """
+        with self._lock:
+            incident.update(status=status, **info)
+            key = (incident.get("namespace"), incident.get("pod"))
+            pending = self._pending.get(key)
+            if pending is not None and pending[1] is incident:
+                del self._pending[key]
+
+    def expect(self, incident, namespace, name, label):
+        """
+        Registra, antes de enviar el PATCH, qué etiqueta debe ver el watch en el pod.
+        Se hace antes para no perder una confirmación que llegue antes que la respuesta.
+        """
+        now = time.time()
+        key = (namespace, name)
+        with self._lock:
+            incident.update(status="patching", pod=name, namespace=namespace, label=label)
+            self._pending[key] = (label, incident)
+            self._expiry.append((now + self.confirm_ttl, key, incident))
+            self._expire(now)
+
+    def patched(self, incident):
+        """
+        Marca el PATCH como aceptado por la API de Kubernetes.
+        """
+        with self._lock:
+            incident["patched"] = time.time()
+            if incident["status"] == "patching":
+                incident["status"] = "patched"
+        self._observe(incident, "receive_to_patch")
+        if incident["confirmed"] is not None:
+            self._observe(incident, "patch_to_confirm")
+
+    def confirm(self, pod):
+        """
+        Llamado por el índice de pods con cada pod añadido o modificado: si tiene la
+        etiqueta de un PATCH pendiente, cierra su incidente. O(1) por evento.
+        """
+        key = (pod.namespace, pod.name)
+        pending = self._pending.get(key)
+        if pending is None or pod.labels.get(self.label_key) != pending[0]:
+            return
+        with self._lock:
+            if self._pending.get(key) is not pending:
+                return
+            del self._pending[key]
+            incident = pending[1]
+            incident.update(status="confirmed", confirmed=time.time())
+            self.confirmed += 1
+        self._observe(incident, "detect_to_confirm")
+        if incident["patched"] is not None:
+            self._observe(incident, "patch_to_confirm")
+
+    def _expire(self, now):
+        # Los PATCH que el watch no confirma a tiempo se dan por no confirmados
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key, incident = self._expiry.popleft()
+            pending = self._pending.get(key)
+            if pending is not None and pending[1] is incident:
+                del self._pending[key]
+                incident["status"] = "unconfirmed"
+                self.unconfirmed += 1
+
+    def _observe(self, incident, segment):
+        for name, start, end in SEGMENTS:
+            if name == segment:
+                if incident[start] is not None and incident[end] is not None:
+                    self.histogram.observe(max(0.0, incident[end] - incident[start]), segment=segment)
+                return
+
+    def get(self, incident_id):
+        with self._lock:
+            incident = self._recent.get(incident_id)
+            return dict(incident) if incident is not None else None
+
+    def recent(self, limit=100):
+        with self._lock:
+            self._expire(time.time())
+            items = list(self._recent.values())[-limit:]
+            return [dict(i) for i in reversed(items)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked": len(self._recent),
+                "pending_confirmation": len(self._pending),
+                "confirmed": self.confirmed,
+                "unconfirmed": self.unconfirmed,
+            }
@@ -0,0 +1,105 @@
+"""
+Cliente asíncrono mínimo de la API de Kubernetes para el núcleo asyncio (asgi.py).
+
+Solo implementa las llamadas que hace el listener por petición (listar namespaces y
+pods, leer un pod y los PATCH de etiquetas) sobre una sesión aiohttp con su propio pool
+de conexiones keep-alive. Como RawCoreV1Api, trabaja con JSON y bytes sin modelos: las
+lecturas devuelven dicts y los PATCH aceptan cuerpos ya serializados (k8s_raw.LabelPatches).
+
+El host, los certificados y el token (incluida su renovación en el clúster) salen de la
+misma client.Configuration que usa el cliente síncrono; los errores se lanzan como
+ApiException con status, body y headers, de modo que ratelimit y metrics los tratan igual.
+"""
+import json
+import ssl
+from collections import namedtuple
+from urllib.parse import quote
+
+import aiohttp
+from kubernetes.client.rest import ApiException
+
+from k8s_raw import MERGE_PATCH, auth_headers, pod_path
+
+# Respuesta sin deserializar de un PATCH (como la de RawCoreV1Api)
+Response = namedtuple("Response", ["status", "data"])
+
+
+def ssl_context(configuration):
+    """
+    Contexto TLS equivalente al del cliente síncrono para una client.Configuration.
+    """
+    if not configuration.host.startswith("https"):
+        return None
+    ctx = ssl.create_default_context(cafile=configuration.ssl_ca_cert, cadata=configuration.ca_cert_data)
+    if configuration.cert_file:
+        ctx.load_cert_chain(configuration.cert_file, configuration.key_file)
+    if not configuration.verify_ssl:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    elif configuration.assert_hostname is False:
+        ctx.check_hostname = False
+    return ctx
+
+
+class AsyncCoreV1Api:
+    """
+    Subconjunto asíncrono de CoreV1Api. La sesión se crea en la primera llamada, dentro
+    del bucle de eventos que la va a usar; close() la cierra.
+    """
+
+    def __init__(self, configuration, pool_size=None, request_timeout=None):
+        self.configuration = configuration
+        self.pool_size = pool_size or configuration.connection_pool_maxsize
+        self.request_timeout = request_timeout
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=ssl_context(self.configuration))
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def _headers(self, content_type=None):
+        headers = {"Accept": "application/json", **auth_headers(self.configuration)}
+        if content_type:
+            headers["Content-Type"] = content_type
+        return headers
+
+    async def _request(self, method, path, params=None, body=None, content_type=None):
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        url = self.configuration.host + path
+        async with self._get_session().request(method, url, params=params, data=body,
+                                               headers=self._headers(content_type)) as resp:
+            data = await resp.read()
+            if not 200 <= resp.status <= 299:
+                e = ApiException(status=resp.status, reason=resp.reason)
+                e.body = data.decode("utf-8", "replace")
+                e.headers = resp.headers
+                raise e
+            return Response(resp.status, data)
+
+    async def _get(self, path, params=None):
+        return json.loads((await self._request("GET", path, params)).data)
+
+    async def list_namespace(self):
+        return await self._get("/api/v1/namespaces")
+
+    async def list_namespaced_pod(self, namespace, label_selector=None):
+        params = {"labelSelector": label_selector} if label_selector else None
+        return await self._get(f"/api/v1/namespaces/{quote(namespace, safe='')}/pods", params)
+
+    async def read_namespaced_pod(self, name, namespace):
+        return await self._get(pod_path(namespace, name))
+
+    async def patch_namespaced_pod(self, name, namespace, body, content_type=MERGE_PATCH):
+        """
+        Envía un PATCH (cuerpo en bytes o serializable a JSON) y devuelve la respuesta sin deserializar.
+        """
+        return await self._request("PATCH", pod_path(namespace, name), body=body, content_type=content_type)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
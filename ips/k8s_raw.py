@@ -0,0 +1,101 @@
+"""
+Llamadas a la API de Kubernetes sin los modelos del cliente en el camino caliente.
+
+El cliente de Kubernetes serializa cada cuerpo con json.dumps (los cuerpos en bytes no
+se admiten con Content-Type JSON) y convierte cada respuesta en modelos (V1Pod...).
+Para los PATCH de etiquetas, que se repiten con muy pocas variantes, RawCoreV1Api
+envía cuerpos ya serializados y no deserializa la respuesta. El host y la autenticación
+salen de la client.Configuration pública del cliente y la petición va por su mismo pool
+de conexiones (requirements.txt fija la versión mayor del cliente).
+
+Las lecturas de pods (LIST + WATCH del índice) usan _preload_content=False y
+pod_index.pod_info_from_dict, ver pod_index.ListWatcher.
+"""
+import json
+from urllib.parse import quote
+
+from kubernetes.client.rest import ApiException
+
+MERGE_PATCH = "application/merge-patch+json"
+
+
+def auth_headers(configuration):
+    """
+    Cabeceras de autenticación de una client.Configuration. auth_settings() renueva el
+    token de la cuenta de servicio cuando caduca; los certificados de cliente van en el
+    contexto TLS del pool.
+    """
+    return {auth["key"]: auth["value"] for auth in configuration.auth_settings().values()
+            if auth["in"] == "header" and auth["value"]}
+
+
+def pod_path(namespace, name):
+    return f"/api/v1/namespaces/{quote(namespace, safe='')}/pods/{quote(name, safe='')}"
+
+
+class RawCoreV1Api:
+    """
+    Subconjunto de CoreV1Api que acepta cuerpos en bytes y devuelve la respuesta HTTP
+    sin deserializar (con .status y .data); las lecturas devuelven el JSON como dict.
+    Los errores se lanzan como ApiException.
+    """
+
+    def __init__(self, api, request_timeout=None):
+        self._api_client = api.api_client
+        self._pool = api.api_client.rest_client.pool_manager
+        self.request_timeout = request_timeout
+
+    def _request(self, method, path, body=None, content_type=None):
+        configuration = self._api_client.configuration
+        headers = {
+            "Accept": "application/json",
+            "User-Agent": self._api_client.user_agent,
+            **auth_headers(configuration),
+        }
+        if content_type:
+            headers["Content-Type"] = content_type
+        resp = self._pool.request(method, configuration.host + path, body=body, headers=headers,
+                                  timeout=self.request_timeout)
+        if not 200 <= resp.status <= 299:
+            raise ApiException(http_resp=resp)
+        return resp
+
+    def read_namespaced_pod(self, name, namespace):
+        return json.loads(self._request("GET", pod_path(namespace, name)).data)
+
+    def patch_namespaced_pod(self, name, namespace, body, content_type=MERGE_PATCH):
+        return self._request("PATCH", pod_path(namespace, name), body, content_type)
+
+
+class LabelPatches:
+    """
+    Cuerpos de PATCH precalculados para poner una etiqueta con cada uno de sus valores.
+
+    Son merge patches, que solo tocan esa etiqueta aunque la copia local del pod esté
+    desfasada. conditional(uid, value, resource_version) lleva además metadata.uid y
+    metadata.resourceVersion, que la API trata como precondiciones: si el pod ya no
+    tiene ese UID o ha cambiado desde esa versión responde 409 y no lo modifica.
+    merge(value) es el mismo patch sin condición.
+    """
+
+    def __init__(self, key, values):
+        self.key = key
+        self._labels = {}
+        self._merge = {}
+        for value in values:
+            labels = _dumps({key: value})
+            self._labels[value] = b',"labels":' + labels + b"}}"
+            self._merge[value] = b'{"metadata":{"labels":' + labels + b"}}"
+
+    def conditional(self, uid, value, resource_version=None):
+        if resource_version is None:
+            return b'{"metadata":{"uid":' + _dumps(uid) + self._labels[value]
+        return (b'{"metadata":{"uid":' + _dumps(uid) + b',"resourceVersion":' + _dumps(resource_version)
+                + self._labels[value])
+
+    def merge(self, value):
+        return self._merge[value]
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":")).encode()
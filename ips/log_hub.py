@@ -0,0 +1,222 @@
+"""
+Difusión de los logs de eventos a todos los clientes de /log-stream.
+
+Cada registro de log se numera y se guarda en un buffer circular compartido de
+tamaño fijo (para reenviar lo perdido a un navegador que se reconecta con
+Last-Event-ID) y se copia al buffer acotado de cada suscriptor. Si un cliente es
+lento, se descartan sus líneas más antiguas en lugar de hacer crecer la memoria o
+frenar a los demás.
+
+Los registros se guardan sin formatear: el formateo (y el json.dumps de los eventos
+que se adjuntan al registro) solo se hace cuando un suscriptor va a enviar la línea,
+y una sola vez aunque haya varios suscriptores.
+Sin nadie mirando el panel, publicar un log es un append a un deque.
+
+Con el núcleo asyncio (asgi.py) los suscriptores esperan en el bucle de eventos en
+lugar de ocupar un hilo: publicar despierta al bucle una sola vez por tanda de líneas,
+haya los suscriptores que haya.
+
+Los números de secuencia son la hora en microsegundos (crecientes aunque coincidan dos
+registros): con varios workers de gunicorn /log-stream mezcla las líneas de todos y el
+Last-Event-ID de un navegador sirve para pedir a cada worker lo que le falta.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+
+class Subscriber:
+    """
+    Buffer circular de un cliente de /log-stream.
+    """
+
+    def __init__(self, maxlen):
+        self._buffer = deque(maxlen=maxlen)
+        self._event = threading.Event()
+        self.dropped = 0
+
+    def push(self, item):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(item)
+        self._event.set()
+
+    def wait(self, timeout):
+        """
+        Espera (sin sondear) a que haya líneas nuevas y las devuelve todas.
+        Devuelve una lista vacía si vence el timeout.
+        """
+        if not self._event.wait(timeout):
+            return []
+        self._event.clear()
+        items = []
+        while self._buffer:
+            items.append(self._buffer.popleft())
+        return items
+
+
+class AsyncSubscriber(Subscriber):
+    """
+    Buffer circular de un cliente de /log-stream servido desde un bucle asyncio.
+    """
+
+    def __init__(self, maxlen, notifier):
+        self._buffer = deque(maxlen=maxlen)
+        self._event = asyncio.Event()
+        self._notifier = notifier
+        self.dropped = 0
+
+    def push(self, item):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(item)
+        self._notifier.schedule()
+
+    async def wait(self, timeout):
+        """
+        Como Subscriber.wait(), sin bloquear el bucle.
+        """
+        if not self._buffer:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        items = []
+        while self._buffer:
+            items.append(self._buffer.popleft())
+        return items
+
+
+class LoopNotifier:
+    """
+    Despierta a los AsyncSubscriber de un bucle. schedule() se puede llamar desde
+    cualquier hilo y programa como mucho un aviso pendiente en el bucle.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscribers = set()
+        self._scheduled = False
+
+    def schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self):
+        self._scheduled = False
+        for sub in self.subscribers:
+            if sub._buffer:
+                sub._event.set()
+
+
+class LogHub:
+    """
+    Buffer compartido con los últimos registros y conjunto de suscriptores.
+
+    Cada elemento es una lista [secuencia, registro, línea formateada o None].
+    """
+
+    def __init__(self, formatter=None, history=1000, subscriber_buffer=500, max_line=4096):
+        self.formatter = formatter or logging.Formatter()
+        self.subscriber_buffer = subscriber_buffer
+        self.max_line = max_line
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._notifiers = {}
+        self._seq = 0
+        self.published = 0
+        self._lock = threading.Lock()
+        # Separado de _lock para que formatear no retenga a publish()
+        self._format_lock = threading.Lock()
+        self.evicted = 0
+        self.formatted = 0
+        self.format_errors = 0
+        self._closed_drops = 0
+
+    def publish(self, record):
+        """
+        Publica un registro de log para todos los suscriptores. Devuelve su número de secuencia.
+        """
+        with self._lock:
+            self._seq = max(self._seq + 1, time.time_ns() // 1000)
+            self.published += 1
+            item = [self._seq, record, None]
+            if len(self._history) == self._history.maxlen:
+                self.evicted += 1
+            self._history.append(item)
+            for sub in self._subscribers:
+                sub.push(item)
+            return self._seq
+
+    def format(self, item):
+        """
+        Devuelve la línea formateada de un elemento, formateándola la primera vez.
+        """
+        msg = item[2]
+        if msg is not None:
+            return msg
+        with self._format_lock:
+            # Otro suscriptor puede haberlo formateado (y soltado el registro) mientras tanto
+            msg = item[2]
+            if msg is not None:
+                return msg
+            try:
+                msg = self.formatter.format(item[1])
+            except Exception as e:
+                msg = f"[error formateando log: {e}]"
+                self.format_errors += 1
+            if len(msg) > self.max_line:
+                msg = msg[:self.max_line] + "..."
+            # Se suelta el registro (y sus argumentos) una vez formateado
+            item[2], item[1] = msg, None
+            self.formatted += 1
+        return msg
+
+    def subscribe(self, last_event_id=None, loop=None):
+        """
+        Da de alta un suscriptor. Si se indica last_event_id, se le reenvían primero
+        las líneas posteriores que sigan en el buffer compartido. Con loop (el bucle en
+        ejecución) el suscriptor es un AsyncSubscriber.
+        """
+        with self._lock:
+            if loop is None:
+                sub = Subscriber(self.subscriber_buffer)
+            else:
+                notifier = self._notifiers.get(loop)
+                if notifier is None:
+                    notifier = self._notifiers[loop] = LoopNotifier(loop)
+                sub = AsyncSubscriber(self.subscriber_buffer, notifier)
+                notifier.subscribers.add(sub)
+            if last_event_id is not None:
+                for item in self._history:
+                    if item[0] > last_event_id:
+                        sub.push(item)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.discard(sub)
+                self._closed_drops += sub.dropped
+                if isinstance(sub, AsyncSubscriber):
+                    sub._notifier.subscribers.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "last_event_id": self._seq,
+                "buffer_used": len(self._history),
+                "buffer_capacity": self._history.maxlen,
+                "evicted": self.evicted,
+                "formatted": self.formatted,
+                "format_errors": self.format_errors,
+                "subscriber_drops": self._closed_drops + sum(sub.dropped for sub in self._subscribers),
+                "subscriber_buffer": self.subscriber_buffer,
+            }
@@ -0,0 +1,230 @@
+"""
+Métricas del listener en formato de texto OpenMetrics (endpoint /metrics).
+
+Implementación mínima de contadores, gauges e histogramas con etiquetas, sin
+dependencias externas, para que Prometheus pueda medir dónde pasa el tiempo cada
+alerta (parseo, validación, regla, pod, PATCH) y cómo de saturado está el listener.
+"""
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value):
+    if isinstance(value, float):
+        return "+Inf" if value == float("inf") else repr(value)
+    return str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# TYPE {self.name} {self.type_name}", f"# HELP {self.name} {_escape(self.help)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}_total{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(float(total))}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge o contador cuyo valor se lee de una función en el momento del scrape.
+    La función devuelve un número o un diccionario {tupla de etiquetas: número}.
+    """
+
+    def __init__(self, name, help_text, fn, labelnames=(), type_name="gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+        self.type_name = type_name
+
+    def collect(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        suffix = "_total" if self.type_name == "counter" else ""
+        lines = self.header()
+        for key, value in values.items():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key)} {_num(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_func(self, name, help_text, fn, labelnames=()):
+        return self.register(CallbackMetric(name, help_text, fn, labelnames, "gauge"))
+
+    def counter_func(self, name, help_text, fn, labelnames=()):
+        return self.register(CallbackMetric(name, help_text, fn, labelnames, "counter"))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedApi:
+    """
+    Envuelve un cliente de la API de Kubernetes (p. ej. CoreV1Api) y cuenta y mide
+    cada llamada por operación y código de respuesta. Los métodos asíncronos (p. ej. los
+    de k8s_async.AsyncCoreV1Api) se envuelven con una corrutina.
+    """
+
+    def __init__(self, api, calls, latency):
+        self._api = api
+        self._calls = calls
+        self._latency = latency
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = self._wrap(name, attr)
+        return wrapped
+
+    def _wrap(self, name, fn):
+        calls, latency = self._calls, self._latency
+
+        if inspect.iscoroutinefunction(fn):
+            async def call(*args, **kwargs):
+                start = time.perf_counter()
+                code = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    status = getattr(result, "status", None)
+                    code = str(status) if isinstance(status, int) else "200"
+                    return result
+                except Exception as e:
+                    code = str(getattr(e, "status", None) or "error")
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - start, operation=name)
+                    calls.inc(operation=name, code=code)
+        else:
+            def call(*args, **kwargs):
+                start = time.perf_counter()
+                code = "error"
+                try:
+                    result = fn(*args, **kwargs)
+                    # Con _preload_content=False se devuelve la respuesta HTTP sin deserializar
+                    status = getattr(result, "status", None)
+                    code = str(status) if isinstance(status, int) else "200"
+                    return result
+                except Exception as e:
+                    code = str(getattr(e, "status", None) or "error")
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - start, operation=name)
+                    calls.inc(operation=name, code=code)
+
+        # Watch.stream() inspecciona la documentación y la firma de la función
+        call.__doc__ = fn.__doc__
+        call.__name__ = name
+        call.__wrapped__ = fn
+        return call
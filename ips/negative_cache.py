@@ -0,0 +1,111 @@
+"""
+Caché negativa de IPs de origen que no son de ningún pod.
+
+Cuando el atacante es externo (o una IP de nodo o de Service), cada alerta acababa
+encolando una remediación que solo podía terminar en 404 "Pod no encontrado". Esta
+caché permite responder directamente:
+- Rangos configurados: si se indican las redes de pods (HOME_NET), cualquier IP fuera
+  de ellas no es de un pod; además se pueden declarar redes que nunca lo son (red de
+  nodos, CIDR de Services...).
+- IPs vistas sin pod: se recuerdan durante un TTL y se olvidan en cuanto el watch del
+  índice de pods ve un pod con esa IP.
+"""
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_cidrs(value):
+    """
+    Convierte una lista separada por comas ("10.10.0.0/16, 192.168.1.0/24") en redes.
+    """
+    return tuple(ipaddress.ip_network(c.strip(), strict=False) for c in value.split(",") if c.strip())
+
+
+class NegativeCache:
+    """
+    Consulta O(1) (más una comprobación por red configurada) de si una IP no es de un pod.
+    """
+
+    def __init__(self, ttl=60.0, max_size=10000, pod_cidrs=(), non_pod_cidrs=()):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.pod_cidrs = tuple(pod_cidrs)
+        self.non_pod_cidrs = tuple(non_pod_cidrs)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.cidr_hits = 0
+        self.invalidations = 0
+        self.expired = 0
+
+    def check(self, ip):
+        """
+        Devuelve el motivo por el que la IP (ipaddress o str) no es de un pod, o None si
+        puede serlo y hay que buscarla en el índice.
+        """
+        if not isinstance(ip, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            ip = ipaddress.ip_address(ip)
+        if self.pod_cidrs and not any(ip in net for net in self.pod_cidrs):
+            self.cidr_hits += 1
+            return "outside_pod_cidrs"
+        for net in self.non_pod_cidrs:
+            if ip in net:
+                self.cidr_hits += 1
+                return f"non_pod_cidr:{net}"
+        key = str(ip)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.hits += 1
+                    return "cached"
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+        return None
+
+    def add(self, ip):
+        """
+        Recuerda una IP para la que no se ha encontrado pod.
+        """
+        key = str(ip)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, ip):
+        """
+        Olvida una IP (p. ej. porque acaba de aparecer un pod con ella).
+        """
+        if not ip:
+            return
+        with self._lock:
+            if self._entries.pop(ip, None) is not None:
+                self.invalidations += 1
+
+    def on_pod(self, pod):
+        """
+        Listener del índice de pods: un pod con IP invalida esa IP en la caché.
+        """
+        if pod.ip and pod.ip in self._entries:
+            self.invalidate(pod.ip)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "size": size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cidr_hits": self.cidr_hits,
+            "invalidations": self.invalidations,
+            "expired": self.expired,
+            "pod_cidrs": [str(n) for n in self.pod_cidrs],
+            "non_pod_cidrs": [str(n) for n in self.non_pod_cidrs],
+        }
@@ -0,0 +1,255 @@
+"""
+Consultas entre los workers de gunicorn del listener (IPS_GUNICORN_WORKERS > 1).
+
+Los trabajos de remediación, los incidentes, los logs del panel y los contadores de
+umbral están en memoria del worker que los creó. Cada worker escucha en un socket Unix
+<IPS_PEER_DIR>/<pid>.sock y los demás le piden lo que no tienen:
+- call(): pregunta a todos los demás workers (un trabajo o un incidente de otro worker,
+  la lista de incidentes de todos).
+- call_owner(): ejecuta una operación en el worker dueño de una clave, siempre el mismo
+  mientras no cambien los workers (los umbrales de una pareja regla-IP).
+- follow(): sigue un stream de los demás workers (las líneas de log de /log-stream).
+
+Cada mensaje es una línea JSON: la petición {"op": ..., "args": [...]} y la respuesta
+{"result": ...} o {"error": ...}; en un stream, una línea por mensaje hasta que el
+cliente cierra la conexión. call() y call_owner() bloquean con timeout el hilo que las
+llama; el servidor y los streams seguidos van en un único hilo con su propio bucle
+asyncio, no en un hilo por conexión. gunicorn.conf.py crea el directorio con permisos
+0700: solo se conectan procesos del mismo usuario.
+
+El socket de un worker que muere se queda en el directorio: la primera conexión
+rechazada lo borra.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class PeerNode:
+    """
+    Servidor y cliente de las consultas entre workers de un proceso.
+    """
+
+    def __init__(self, directory, name=None, timeout=1.0, max_line=1 << 20):
+        self.directory = directory
+        self.name = name or str(os.getpid())
+        self.path = self._path(self.name)
+        self.timeout = timeout
+        self.max_line = max_line
+        self.loop = None
+        self._handlers = {}
+        self._streams = {}
+        self._ready = threading.Event()
+        self.served = 0
+        self.calls = 0
+        self.errors = 0
+        self.links = 0
+
+    def handle(self, op, fn):
+        """
+        Registra una operación: fn(*args) devuelve un valor serializable en JSON. Se
+        ejecuta en el hilo del bucle, así que debe ser rápida y no bloquear.
+        """
+        self._handlers[op] = fn
+        return self
+
+    def stream(self, op, fn):
+        """
+        Registra un stream: fn(*args) es un generador asíncrono que produce listas de
+        mensajes (una lista vacía no envía nada).
+        """
+        self._streams[op] = fn
+        return self
+
+    def start(self):
+        threading.Thread(target=self._run, name="peers", daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.sock")
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._forget(self.path)
+            self.loop.run_until_complete(
+                asyncio.start_unix_server(self._serve, path=self.path, limit=self.max_line))
+            atexit.register(self._forget, self.path)
+        except OSError as e:
+            logger.error(f"[peers] No se puede escuchar en {self.path}: {e}")
+        self._ready.set()
+        self.loop.run_forever()
+
+    @staticmethod
+    def _forget(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    # --- Servidor ---
+
+    async def _serve(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            op, args = request["op"], request.get("args", [])
+            if op in self._streams:
+                await self._serve_stream(self._streams[op](*args), reader, writer)
+                return
+            self.served += 1
+            try:
+                response = {"result": self._handlers[op](*args)}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"[peers] Petición descartada: {e}")
+        finally:
+            writer.close()
+
+    async def _serve_stream(self, messages, reader, writer):
+        # El cliente no envía nada más: la lectura termina cuando cierra la conexión
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            while True:
+                batch = asyncio.ensure_future(messages.__anext__())
+                await asyncio.wait((batch, closed), return_when=asyncio.FIRST_COMPLETED)
+                if not batch.done():
+                    batch.cancel()
+                    try:
+                        await batch
+                    except (asyncio.CancelledError, StopAsyncIteration):
+                        pass
+                    break
+                try:
+                    lines = batch.result()
+                except StopAsyncIteration:
+                    break
+                if lines:
+                    writer.write(b"".join(json.dumps(line).encode() + b"\n" for line in lines))
+                    await writer.drain()
+        finally:
+            closed.cancel()
+            await messages.aclose()
+
+    # --- Cliente ---
+
+    def peers(self):
+        """
+        Devuelve los nombres de los demás workers con socket en el directorio.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(n[:-5] for n in names if n.endswith(".sock") and n[:-5] != self.name)
+
+    def _request(self, name, op, args):
+        path = self._path(name)
+        self.calls += 1
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                self._forget(path)
+                raise
+            sock.sendall(json.dumps({"op": op, "args": list(args)}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline(self.max_line))
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def call(self, op, *args):
+        """
+        Ejecuta op en todos los demás workers y devuelve las respuestas de los que
+        contestan (los que fallan se registran y se omiten).
+        """
+        results = []
+        for name in self.peers():
+            try:
+                results.append(self._request(name, op, args))
+            except (OSError, ValueError, RuntimeError) as e:
+                self.errors += 1
+                logger.warning(f"[peers] {op} en el worker {name}: {e}")
+        return results
+
+    def call_owner(self, key, op, *args):
+        """
+        Ejecuta op en el worker dueño de key, que puede ser este: el mismo para todos los
+        workers mientras no cambien. Lanza OSError, ValueError o RuntimeError si el dueño
+        no responde.
+        """
+        while True:
+            names = sorted(self.peers() + [self.name])
+            owner = names[zlib.crc32(key.encode()) % len(names)]
+            if owner == self.name:
+                return self._handlers[op](*args)
+            try:
+                return self._request(owner, op, args)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket de un worker que ya no está (ya borrado): se reparte sin él
+                continue
+            except (OSError, ValueError, RuntimeError):
+                self.errors += 1
+                raise
+
+    def follow(self, op, args, on_message):
+        """
+        Sigue el stream op de cada uno de los demás workers. on_message(mensaje) se llama
+        desde el hilo del bucle. Devuelve una función que cierra los streams.
+        """
+        futures = [asyncio.run_coroutine_threadsafe(self._follow(name, op, args, on_message), self.loop)
+                   for name in self.peers()]
+
+        def close():
+            for future in futures:
+                future.cancel()
+        return close
+
+    async def _follow(self, name, op, args, on_message):
+        path = self._path(name)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path, limit=self.max_line)
+        except (ConnectionRefusedError, FileNotFoundError):
+            self._forget(path)
+            return
+        except OSError as e:
+            self.errors += 1
+            logger.warning(f"[peers] No se puede seguir {op} en el worker {name}: {e}")
+            return
+        self.links += 1
+        try:
+            writer.write(json.dumps({"op": op, "args": list(args)}).encode() + b"\n")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                on_message(json.loads(line))
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            logger.warning(f"[peers] Stream {op} del worker {name} interrumpido: {e}")
+        finally:
+            self.links -= 1
+            writer.close()
+
+    def stats(self):
+        return {
+            "worker": self.name,
+            "peers": len(self.peers()),
+            "served": self.served,
+            "calls": self.calls,
+            "errors": self.errors,
+            "following": self.links,
+        }
@@ -0,0 +1,449 @@
+"""
+Índice en memoria de los pods del clúster, mantenido mediante LIST + WATCH.
+
+En lugar de listar todos los pods del clúster por cada alerta, un hilo en segundo
+plano mantiene un diccionario IP -> pod actualizado con los eventos de la API de
+Kubernetes. Si el watch se corta se reanuda desde el último resourceVersion; si
+ese resourceVersion ha caducado (410 Gone) se vuelve a listar el clúster.
+
+Los pods con hostNetwork comparten la IP del nodo, así que no entran en el índice por
+IP de pod: se guardan aparte (IP del nodo -> pods) para resolverlos con una política
+explícita cuando hay varios.
+
+El CNI reutiliza enseguida las IPs de los pods borrados, así que por cada IP se guarda
+también un historial corto de concesiones (UID del pod, inicio, fin): una alerta que
+llega tarde se resuelve con la hora del evento y no se atribuye al pod que ha heredado
+la IP después.
+"""
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+logger = logging.getLogger(__name__)
+
+# Información mínima de un pod que necesita el listener
+# (started: epoch desde el que el pod tiene su IP, o None si no se conoce)
+PodInfo = namedtuple("PodInfo", ["namespace", "name", "ip", "node", "labels", "host_network", "uid", "started",
+                                 "resource_version"],
+                     defaults=(False, None, None, None))
+
+# Periodo durante el que un pod ha tenido una IP (end None: la sigue teniendo)
+IpLease = namedtuple("IpLease", ["uid", "namespace", "name", "start", "end"])
+
+# Los pods terminados conservan status.podIP, pero su IP ya está libre para otro pod
+TERMINATED_PHASES = ("Succeeded", "Failed")
+
+
+def pod_info_from_model(pod):
+    """
+    Convierte un V1Pod del cliente de Kubernetes en un PodInfo compacto.
+    """
+    status = pod.status
+    ip = status.pod_ip if status and status.phase not in TERMINATED_PHASES else None
+    started = (status.start_time if status else None) or pod.metadata.creation_timestamp
+    return PodInfo(
+        namespace=pod.metadata.namespace,
+        name=pod.metadata.name,
+        ip=ip,
+        node=pod.spec.node_name if pod.spec else None,
+        labels=dict(pod.metadata.labels or {}),
+        host_network=bool(pod.spec and pod.spec.host_network),
+        uid=pod.metadata.uid,
+        started=started.timestamp() if started else None,
+        resource_version=pod.metadata.resource_version,
+    )
+
+
+def _timestamp(value):
+    # RFC 3339 de la API ("2024-05-01T10:00:00Z"); fromisoformat no acepta la Z hasta 3.11
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() if value else None
+
+
+def pod_info_from_dict(pod):
+    """
+    Convierte un pod en JSON (dict tal como lo devuelve la API) en un PodInfo compacto,
+    sin pasar por los modelos V1Pod del cliente.
+    """
+    metadata = pod.get("metadata") or {}
+    spec = pod.get("spec") or {}
+    status = pod.get("status") or {}
+    return PodInfo(
+        namespace=metadata.get("namespace"),
+        name=metadata.get("name"),
+        ip=status.get("podIP") if status.get("phase") not in TERMINATED_PHASES else None,
+        node=spec.get("nodeName"),
+        labels=metadata.get("labels") or {},
+        host_network=bool(spec.get("hostNetwork")),
+        uid=metadata.get("uid"),
+        started=_timestamp(status.get("startTime") or metadata.get("creationTimestamp")),
+        resource_version=metadata.get("resourceVersion"),
+    )
+
+
+def _undocumented(fn):
+    """
+    Envuelve una función list_* sin su documentación: Watch.stream() deduce de ella el
+    modelo al que deserializar cada evento y, sin ella, entrega los objetos como dict.
+    """
+    def call(*args, **kwargs):
+        return fn(*args, **kwargs)
+    return call
+
+
+class ListWatcher:
+    """
+    Mantiene sincronizado un tipo de recurso con LIST + WATCH.
+
+    on_list(items) recibe la lista completa tras cada LIST; on_event(tipo, objeto),
+    cada ADDED/MODIFIED/DELETED del watch. Si el watch se corta se reanuda desde el
+    último resourceVersion; si ha caducado (410 Gone) se vuelve a listar.
+
+    Con raw=True las respuestas no se convierten en modelos del cliente (V1Pod...): el
+    LIST se pide con _preload_content=False y los objetos llegan como dict del JSON.
+    """
+
+    def __init__(self, name, list_fn, on_list, on_event, watch_timeout=300, raw=False):
+        self.name = name
+        self.list_fn = list_fn
+        self.on_list = on_list
+        self.on_event = on_event
+        self.watch_timeout = watch_timeout
+        self.raw = raw
+        self.resource_version = None
+
+    def _relist(self):
+        if self.raw:
+            resp = self.list_fn(watch=False, _preload_content=False)
+            result = json.loads(resp.data)
+            self.on_list(result.get("items") or [])
+            self.resource_version = result["metadata"]["resourceVersion"]
+            return
+        result = self.list_fn(watch=False)
+        self.on_list(result.items)
+        self.resource_version = result.metadata.resource_version
+
+    def _watch(self, stop):
+        w = watch.Watch()
+        stream = w.stream(
+            _undocumented(self.list_fn) if self.raw else self.list_fn,
+            resource_version=self.resource_version,
+            timeout_seconds=self.watch_timeout,
+            allow_watch_bookmarks=True,
+        )
+        for event in stream:
+            if stop.is_set():
+                w.stop()
+                break
+            if event["type"] in ("ADDED", "MODIFIED", "DELETED"):
+                self.on_event(event["type"], event["object"])
+            if self.raw:
+                # Sin modelo, Watch no sigue el resourceVersion (tampoco el de los BOOKMARK)
+                rv = (event["object"].get("metadata") or {}).get("resourceVersion")
+                if rv:
+                    self.resource_version = rv
+            elif w.resource_version:
+                self.resource_version = w.resource_version
+
+    def run(self, stop):
+        backoff = 1
+        while not stop.is_set():
+            try:
+                if self.resource_version is None:
+                    self._relist()
+                self._watch(stop)
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    # resourceVersion caducado: hay que volver a listar
+                    logger.info(f"[{self.name}] resourceVersion caducado, relistando")
+                    self.resource_version = None
+                    continue
+                logger.error(f"[{self.name}] Error en el watch: {e}")
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            except Exception as e:
+                logger.error(f"[{self.name}] Error en el watch: {e}")
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+class PodIndex:
+    """
+    Caché de pods indexada por IP y por (namespace, nombre).
+
+    Las lecturas son O(1) y no hacen ninguna llamada a la API; las escrituras
+    solo las hace el hilo del watch, protegidas por un lock interno.
+
+    Por cada IP se conservan como mucho ip_history concesiones, y las ya terminadas
+    solo durante history_ttl segundos. clock_skew es la tolerancia entre el reloj de
+    Suricata y el de la API al comparar la hora de una alerta con el inicio de un pod.
+    Con raw=True (por defecto) los pods se leen del JSON sin crear modelos V1Pod.
+    """
+
+    def __init__(self, v1, watch_timeout=300, ready_timeout=10, ip_history=4, history_ttl=600.0, clock_skew=2.0,
+                 raw=True):
+        self.v1 = v1
+        self._convert = pod_info_from_dict if raw else pod_info_from_model
+        self.ready_timeout = ready_timeout
+        self.ip_history = ip_history
+        self.history_ttl = history_ttl
+        self.clock_skew = clock_skew
+        self._by_ip = {}
+        self._by_key = {}
+        self._by_host_ip = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._watcher = ListWatcher("pod_index", v1.list_pod_for_all_namespaces,
+                                    self._load, self._apply, watch_timeout, raw=raw)
+        self._thread = None
+        self._listeners = []
+
+    # --- Consultas ---
+
+    def wait_ready(self, timeout=None):
+        """
+        Espera a que se haya completado el primer LIST del clúster.
+        """
+        return self._ready.wait(self.ready_timeout if timeout is None else timeout)
+
+    def is_ready(self):
+        """
+        Indica, sin esperar, si ya se ha completado el primer LIST del clúster.
+        """
+        return self._ready.is_set()
+
+    def get_by_ip(self, ip):
+        """
+        Devuelve el PodInfo asociado a una IP, o None si no hay ningún pod con ella.
+        """
+        self.wait_ready()
+        return self._by_ip.get(ip)
+
+    def resolve_ip(self, ip, at=None):
+        """
+        Devuelve (PodInfo, None) con el pod que tenía la IP en el instante at (epoch; None
+        = ahora), o (None, motivo) si no se debe atribuir a ningún pod actual:
+        - "not_found": ningún pod tenía la IP.
+        - "pod_gone": la tenía un pod que ya se ha borrado.
+        - "ip_reused": el pod que la tiene ahora la recibió después del evento.
+        """
+        self.wait_ready()
+        pod = self._by_ip.get(ip)
+        if at is None:
+            return (pod, None) if pod is not None else (None, "not_found")
+        leases = self._leases.get(ip, ())
+        match = None
+        for lease in reversed(leases):
+            if lease.start <= at:
+                match = lease
+                break
+        if match is None:
+            if not leases:
+                return None, "not_found"
+            # Evento un poco anterior al primer pod conocido: puede ser desfase de relojes
+            if leases[0].start - self.clock_skew > at:
+                return None, "ip_reused"
+            match = leases[0]
+        if match.end is None:
+            if pod is not None and pod.uid == match.uid:
+                return pod, None
+            return None, "not_found"
+        if at <= match.end + self.clock_skew:
+            return None, "pod_gone"
+        return None, "not_found"
+
+    def host_network_pods(self, ip):
+        """
+        Devuelve los pods con hostNetwork del nodo con esa IP (lista vacía si no hay).
+        """
+        self.wait_ready()
+        keys = self._by_host_ip.get(ip)
+        if not keys:
+            return []
+        by_key = self._by_key
+        return [by_key[k] for k in keys if k in by_key]
+
+    def has_host_ip(self, ip):
+        """
+        Indica si la IP es la de un nodo con pods hostNetwork.
+        """
+        return ip in self._by_host_ip
+
+    def get(self, namespace, name):
+        """
+        Devuelve el PodInfo de un pod concreto, o None si no está en el índice.
+        """
+        self.wait_ready()
+        return self._by_key.get((namespace, name))
+
+    def pods(self, namespace=None):
+        """
+        Devuelve una copia de los pods indexados, opcionalmente filtrados por namespace.
+        """
+        self.wait_ready()
+        with self._lock:
+            pods = list(self._by_key.values())
+        if namespace:
+            pods = [p for p in pods if p.namespace == namespace]
+        return pods
+
+    def size(self):
+        """
+        Número de pods en el índice.
+        """
+        return len(self._by_key)
+
+    def add_listener(self, fn):
+        """
+        Registra una función que se llama con el PodInfo de cada pod añadido o
+        modificado por el watch, o por un relist respecto al índice anterior. Se ejecuta
+        en el hilo del watch: debe ser rápida.
+        """
+        self._listeners.append(fn)
+
+    # --- Mantenimiento del índice ---
+
+    def _open_lease(self, info, now):
+        leases = self._leases.get(info.ip, ())
+        if leases and leases[-1].uid == info.uid and leases[-1].end is None:
+            return
+        # Cierra la concesión de un pod anterior cuyo DELETED aún no ha llegado
+        leases = [lease if lease.end is not None else lease._replace(end=now) for lease in leases]
+        start = info.started if info.started is not None else now
+        if leases:
+            # El start_time del pod puede ser anterior a que el pod previo liberara la IP:
+            # ese tramo se atribuye al previo (ya borrado), nunca al nuevo
+            start = max(start, leases[-1].end)
+        leases.append(IpLease(info.uid, info.namespace, info.name, start, None))
+        self._store_leases(info.ip, leases, now)
+
+    def _close_lease(self, info, now):
+        leases = self._leases.get(info.ip)
+        if leases:
+            self._store_leases(info.ip, [lease._replace(end=now) if lease.uid == info.uid and lease.end is None
+                                         else lease for lease in leases], now)
+
+    def _store_leases(self, ip, leases, now):
+        limit = now - self.history_ttl
+        leases = [lease for lease in leases[-self.ip_history:] if lease.end is None or lease.end >= limit]
+        if leases:
+            # Tuplas inmutables: los lectores nunca ven una a medio modificar
+            self._leases[ip] = tuple(leases)
+        else:
+            self._leases.pop(ip, None)
+
+    def _put(self, info):
+        key = (info.namespace, info.name)
+        old = self._by_key.get(key)
+        if old is not None and old.ip and (old.ip != info.ip or old.host_network != info.host_network):
+            self._drop_ip(old)
+        self._by_key[key] = info
+        if info.ip:
+            if info.host_network:
+                # Conjuntos inmutables: los lectores nunca ven uno a medio modificar
+                self._by_host_ip[info.ip] = self._by_host_ip.get(info.ip, frozenset()) | {key}
+            else:
+                self._by_ip[info.ip] = info
+                self._open_lease(info, time.time())
+
+    def _drop_ip(self, info):
+        key = (info.namespace, info.name)
+        if info.host_network:
+            keys = self._by_host_ip.get(info.ip, frozenset()) - {key}
+            if keys:
+                self._by_host_ip[info.ip] = keys
+            else:
+                self._by_host_ip.pop(info.ip, None)
+            return
+        self._close_lease(info, time.time())
+        # Solo se borra la entrada si sigue apuntando a este mismo pod
+        current = self._by_ip.get(info.ip)
+        if current is not None and (current.namespace, current.name) == key:
+            del self._by_ip[info.ip]
+
+    def _remove(self, info):
+        old = self._by_key.pop((info.namespace, info.name), None)
+        if old is not None and old.ip:
+            self._drop_ip(old)
+
+    def _load(self, items):
+        """
+        Reconstruye el índice completo a partir de un LIST de todos los pods.
+        """
+        by_key = {}
+        by_ip = {}
+        by_host_ip = {}
+        convert = self._convert
+        for pod in items:
+            info = convert(pod)
+            key = (info.namespace, info.name)
+            by_key[key] = info
+            if not info.ip:
+                continue
+            if info.host_network:
+                by_host_ip.setdefault(info.ip, set()).add(key)
+            else:
+                by_ip[info.ip] = info
+        now = time.time()
+        with self._lock:
+            previous = self._by_key
+            self._by_key = by_key
+            self._by_ip = by_ip
+            self._by_host_ip = {ip: frozenset(keys) for ip, keys in by_host_ip.items()}
+            # Tras un relist se han podido perder DELETED: se cierran las concesiones de
+            # los pods que ya no tienen la IP y se conserva el resto del historial
+            for ip, leases in list(self._leases.items()):
+                current = by_ip.get(ip)
+                self._store_leases(ip, [lease if lease.end is not None or (current is not None and lease.uid == current.uid)
+                                        else lease._replace(end=now) for lease in leases], now)
+            for info in by_ip.values():
+                self._open_lease(info, now)
+        # En un relist (no en la primera carga) se avisa de lo que haya cambiado mientras
+        # no había watch, como habrían hecho los ADDED/MODIFIED perdidos
+        if self._ready.is_set():
+            for key, info in by_key.items():
+                if previous.get(key) != info:
+                    self._notify(info)
+        self._ready.set()
+        logger.info(f"[pod_index] Índice de pods cargado: {len(by_key)} pods, {len(by_ip)} IPs, "
+                    f"{len(by_host_ip)} nodos con pods hostNetwork")
+
+    def _apply(self, event_type, pod):
+        info = self._convert(pod)
+        with self._lock:
+            if event_type == "DELETED":
+                self._remove(info)
+            else:
+                self._put(info)
+        if event_type != "DELETED":
+            self._notify(info)
+
+    def _notify(self, info):
+        for fn in self._listeners:
+            try:
+                fn(info)
+            except Exception as e:
+                logger.error(f"[pod_index] Error en un listener del índice: {e}")
+
+    def _run(self):
+        self._watcher.run(self._stop)
+
+    def start(self):
+        """
+        Arranca el hilo que mantiene el índice actualizado.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pod-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
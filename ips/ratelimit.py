@@ -0,0 +1,216 @@
+"""
+Límite de peticiones del lado del cliente para la API de Kubernetes.
+
+Durante un ataque llegan ráfagas de alertas y cada una puede acabar en un PATCH; sin
+límite, el listener puede saturar al propio servidor de API (que responde 429 por
+API Priority and Fairness) justo cuando más falta hace. Este módulo:
+- TokenBucket: reparte como mucho qps peticiones por segundo con ráfagas de hasta
+  burst, compartido por todos los hilos del proceso. Al recibir un 429 se pausa
+  entero el tiempo indicado en Retry-After y reduce su ritmo a la mitad; cada
+  petición correcta lo recupera poco a poco hasta qps (AIMD).
+- RateLimitedApi: envuelve un cliente de la API (como metrics.InstrumentedApi), pide un
+  token antes de cada llamada y reintenta las respuestas 429 (y 503 con Retry-After).
+  Los métodos asíncronos (k8s_async.py) esperan el token sin bloquear el bucle.
+"""
+import asyncio
+import inspect
+import threading
+import time
+
+from kubernetes.client.rest import ApiException
+
+
+def retry_after(e):
+    """
+    Segundos de la cabecera Retry-After de un ApiException, o None si no la trae.
+    """
+    headers = getattr(e, "headers", None) or {}
+    value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket con ritmo adaptativo. acquire() bloquea hasta que hay un token.
+    """
+
+    def __init__(self, qps, burst, min_qps=None, recovery=0.02):
+        self.max_qps = float(qps)
+        self.qps = float(qps)
+        self.min_qps = float(min_qps) if min_qps is not None else max(self.max_qps / 16, 0.1)
+        self.burst = max(1.0, float(burst))
+        self.recovery = recovery
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.qps)
+        self._last = now
+
+    def acquire(self):
+        """
+        Reserva un token y espera lo necesario. Devuelve los segundos esperados.
+        """
+        waited = wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            # Un 429 recibido mientras se esperaba también pausa a los que ya tenían token
+            wait = self.paused_for()
+            waited += wait
+        return waited
+
+    async def acquire_async(self):
+        """
+        Como acquire(), pero la espera no bloquea el bucle de eventos.
+        """
+        waited = wait = self.reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.paused_for()
+            waited += wait
+        return waited
+
+    def paused_for(self):
+        """
+        Segundos que quedan de la pausa pedida por el servidor (0 si no hay pausa).
+        """
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def reserve(self):
+        """
+        Reserva un token sin esperar. Devuelve los segundos que hay que esperar para usarlo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # El token se reserva ya (puede quedar en negativo): los hilos que esperan
+            # salen escalonados a 1/qps en lugar de todos a la vez
+            self._tokens -= 1
+            wait = max(-self._tokens / self.qps if self._tokens < 0 else 0.0, self._paused_until - now)
+            if wait > 0:
+                self.waits += 1
+                self.waited += wait
+        return wait
+
+    def success(self):
+        """
+        Petición aceptada: el ritmo vuelve poco a poco hacia qps.
+        """
+        if self.qps < self.max_qps:
+            with self._lock:
+                self.qps = min(self.max_qps, self.qps + self.max_qps * self.recovery)
+
+    def throttle(self, seconds):
+        """
+        El servidor ha pedido esperar: se pausan todas las peticiones durante seconds,
+        se reduce el ritmo a la mitad y se vacía el bucket para no salir en ráfaga.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttled += 1
+            # Las peticiones que ya estaban en vuelo reciben también su 429: el ritmo
+            # se reduce una sola vez por pausa
+            if now >= self._paused_until:
+                self.qps = max(self.min_qps, self.qps / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._paused_until = max(self._paused_until, now + seconds)
+
+    def stats(self):
+        return {
+            "qps": round(self.qps, 3),
+            "max_qps": self.max_qps,
+            "burst": self.burst,
+            "waits": self.waits,
+            "waited_seconds": round(self.waited, 3),
+            "throttled": self.throttled,
+            "paused_for": round(self.paused_for(), 3),
+        }
+
+
+class RateLimitedApi:
+    """
+    Envuelve un cliente de la API de Kubernetes: cada llamada espera un token de bucket
+    y las respuestas 429 se reintentan hasta retries veces, esperando lo que indique
+    Retry-After (como mucho max_retry_after) o, sin cabecera, un backoff exponencial.
+    """
+
+    def __init__(self, api, bucket, retries=3, max_retry_after=30.0, on_wait=None):
+        self._api = api
+        self._bucket = bucket
+        self._retries = retries
+        self._max_retry_after = max_retry_after
+        self._on_wait = on_wait
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = self._wrap(name, attr)
+        return wrapped
+
+    def _throttled(self, e, attempt):
+        """
+        Si la respuesta pide esperar (429, o 503 con Retry-After), pausa el bucket y
+        devuelve True mientras queden reintentos; si no, False y hay que relanzar e.
+        """
+        delay = retry_after(e)
+        if e.status != 429 and not (e.status == 503 and delay is not None):
+            return False
+        if delay is None:
+            delay = min(2.0 ** attempt, self._max_retry_after)
+        self._bucket.throttle(min(delay, self._max_retry_after))
+        return attempt < self._retries
+
+    def _wrap(self, name, fn):
+        bucket, on_wait = self._bucket, self._on_wait
+
+        if inspect.iscoroutinefunction(fn):
+            async def call(*args, **kwargs):
+                attempt = 0
+                while True:
+                    waited = await bucket.acquire_async()
+                    if on_wait is not None:
+                        on_wait(waited, name)
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except ApiException as e:
+                        if not self._throttled(e, attempt):
+                            raise
+                        attempt += 1
+                        continue
+                    bucket.success()
+                    return result
+        else:
+            def call(*args, **kwargs):
+                attempt = 0
+                while True:
+                    waited = bucket.acquire()
+                    if on_wait is not None:
+                        on_wait(waited, name)
+                    try:
+                        result = fn(*args, **kwargs)
+                    except ApiException as e:
+                        if not self._throttled(e, attempt):
+                            raise
+                        attempt += 1
+                        continue
+                    bucket.success()
+                    return result
+
+        # Watch.stream() inspecciona la documentación y la firma de la función
+        call.__doc__ = fn.__doc__
+        call.__name__ = name
+        call.__wrapped__ = fn
+        return call
@@ -0,0 +1,198 @@
+"""
+Persistencia de las reglas en el PVC con journal incremental y snapshots atómicos.
+
+En lugar de reescribir /etc/ips/rules.json en cada cambio, cada operación se añade
+como una línea JSON a rules.json.journal (un único write + fsync por lote de
+cambios). Periódicamente el journal se compacta: se escribe un snapshot completo en
+un archivo temporal, se hace fsync, se renombra atómicamente sobre rules.json y se
+vacía el journal. Un corte a mitad de escritura solo puede dejar incompleta la
+última línea del journal, que se descarta al cargar.
+
+Formato de cada línea del journal:
+    {"op": "set", "rule": 1001, "value": {"description": "...", "action": 3}}
+    {"op": "del", "rule": 1001}
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def set_op(rule_id, value):
+    return {"op": "set", "rule": rule_id, "value": value}
+
+
+def del_op(rule_id):
+    return {"op": "del", "rule": rule_id}
+
+
+def apply_ops(rules, ops):
+    """
+    Aplica una secuencia de operaciones set/del sobre el diccionario rules.
+    """
+    for op in ops:
+        rule_id = int(op["rule"])
+        if op["op"] == "set":
+            rules[rule_id] = op["value"]
+        elif op["op"] == "del":
+            rules.pop(rule_id, None)
+
+
+class RulesStore:
+    """
+    Snapshot + journal de reglas. Seguro entre hilos (lock interno) y entre procesos
+    (flock sobre un archivo .lock), para que varios workers de gunicorn puedan escribir.
+    """
+
+    def __init__(self, path, compact_every=500, compact_interval=60):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.lock_path = path + ".lock"
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._entries = 0
+        self._last_compact = time.monotonic()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --- Lectura ---
+
+    def stamp(self):
+        """
+        Devuelve una marca (mtime, tamaño) del snapshot y del journal para detectar
+        cambios hechos por otros procesos.
+        """
+        result = []
+        for path in (self.path, self.journal_path):
+            try:
+                st = os.stat(path)
+                result.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    def _read_snapshot(self):
+        try:
+            with open(self.path, "r") as f:
+                content = f.read().strip()
+        except FileNotFoundError:
+            return {}
+        if not content:
+            return {}
+        try:
+            data = json.loads(content)
+            return {int(k): v for k, v in data.items()}
+        except (ValueError, AttributeError) as e:
+            # No se sobrescribe nunca un snapshot ilegible: se aparta para revisarlo a mano
+            corrupt = f"{self.path}.corrupt-{int(time.time())}"
+            os.replace(self.path, corrupt)
+            logger.error(f"[rules_store] Snapshot {self.path} ilegible ({e}), movido a {corrupt}")
+            return {}
+
+    def _replay(self, rules):
+        """
+        Aplica el journal sobre rules. Devuelve el número de entradas aplicadas.
+        """
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        applied = 0
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                apply_ops(rules, [json.loads(line)])
+                applied += 1
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"[rules_store] Entrada del journal ignorada ({e}): {line[:200]!r}")
+        if end < len(data):
+            # Última línea incompleta (corte a mitad de escritura): se descarta
+            logger.error(f"[rules_store] Descartados {len(data) - end} bytes incompletos al final de {self.journal_path}")
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+        return applied
+
+    def load(self):
+        """
+        Carga las reglas (snapshot + journal) y devuelve un diccionario signature_id -> regla.
+        """
+        with self._lock, self._file_lock():
+            rules = self._read_snapshot()
+            self._entries = self._replay(rules)
+        return rules
+
+    # --- Escritura ---
+
+    def append(self, ops):
+        """
+        Añade un lote de operaciones al journal con un único write + fsync.
+        Compacta el journal si ha crecido demasiado.
+        """
+        if not ops:
+            return
+        data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+        with self._lock, self._file_lock():
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._entries += len(ops)
+            if self._entries >= self.compact_every:
+                self._compact_locked()
+
+    def maybe_compact(self):
+        """
+        Compacta el journal si tiene entradas y ha pasado compact_interval desde la última vez.
+        """
+        if self._entries and time.monotonic() - self._last_compact >= self.compact_interval:
+            self.compact()
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._compact_locked()
+
+    def _compact_locked(self):
+        # Se parte del estado en disco (no del de memoria) por si otro proceso ha escrito
+        rules = self._read_snapshot()
+        self._replay(rules)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(rules, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._fsync_dir()
+        # Si se corta aquí, reaplicar el journal sobre el nuevo snapshot da el mismo resultado
+        with open(self.journal_path, "w") as f:
+            os.fsync(f.fileno())
+        self._entries = 0
+        self._last_compact = time.monotonic()
+
+    def _fsync_dir(self):
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
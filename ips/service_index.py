@@ -0,0 +1,217 @@
+"""
+Índice en memoria de Services y EndpointSlices, mantenido mediante LIST + WATCH.
+
+Cuando el origen de una alerta es la ClusterIP (o una externalIP) de un Service, el
+índice de pods no encuentra nada: los pods que hay detrás son los endpoints del
+Service. Este índice resuelve IP del Service -> (namespace, nombre) de los pods de sus
+EndpointSlices en O(1), sin llamadas a la API por alerta:
+- Un watch de Services mantiene IP -> Service.
+- Un watch de EndpointSlices (discovery.k8s.io/v1) mantiene Service -> pods (la unión
+  de los targetRef de tipo Pod de todos sus slices).
+"""
+import logging
+import threading
+
+from pod_index import ListWatcher
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME_LABEL = "kubernetes.io/service-name"
+
+
+def service_ips(svc):
+    """
+    IPs por las que se puede ver un Service como origen: ClusterIPs y externalIPs.
+    """
+    spec = svc.spec
+    if spec is None:
+        return ()
+    ips = list(spec.cluster_ips or ([spec.cluster_ip] if spec.cluster_ip else []))
+    ips.extend(spec.external_ips or [])
+    # Los Services headless no tienen IP propia: sus pods se ven con su IP de pod
+    return tuple(ip for ip in ips if ip and ip != "None")
+
+
+def slice_pods(endpoint_slice):
+    """
+    Devuelve el conjunto de (namespace, nombre) de los pods de un EndpointSlice.
+    Los endpoints que ya están terminando no se cuentan.
+    """
+    pods = set()
+    for ep in endpoint_slice.endpoints or []:
+        ref = ep.target_ref
+        if ref is None or ref.kind != "Pod" or not ref.name:
+            continue
+        if ep.conditions is not None and ep.conditions.terminating:
+            continue
+        pods.add((ref.namespace or endpoint_slice.metadata.namespace, ref.name))
+    return frozenset(pods)
+
+
+class ServiceIndex:
+    """
+    Caché de Services indexada por IP con los pods de sus EndpointSlices.
+
+    Las lecturas son O(1) y no hacen ninguna llamada a la API; las escrituras
+    solo las hacen los hilos de los watches, protegidas por un lock interno.
+    """
+
+    def __init__(self, v1, discovery_v1, watch_timeout=300, ready_timeout=10):
+        self.ready_timeout = ready_timeout
+        self._by_ip = {}
+        self._ips = {}
+        self._slices = {}
+        self._slices_by_service = {}
+        self._backends = {}
+        self._lock = threading.Lock()
+        self._services_ready = threading.Event()
+        self._slices_ready = threading.Event()
+        self._stop = threading.Event()
+        self._watchers = (
+            ListWatcher("service_index", v1.list_service_for_all_namespaces,
+                        self._load_services, self._apply_service, watch_timeout),
+            ListWatcher("endpointslice_index", discovery_v1.list_endpoint_slice_for_all_namespaces,
+                        self._load_slices, self._apply_slice, watch_timeout),
+        )
+        self._threads = []
+
+    # --- Consultas ---
+
+    def wait_ready(self, timeout=None):
+        """
+        Espera a que se hayan completado los primeros LIST de Services y EndpointSlices.
+        """
+        timeout = self.ready_timeout if timeout is None else timeout
+        return self._services_ready.wait(timeout) and self._slices_ready.wait(timeout)
+
+    def is_ready(self):
+        """
+        Indica, sin esperar, si ya se han completado los primeros LIST.
+        """
+        return self._services_ready.is_set() and self._slices_ready.is_set()
+
+    def has(self, ip):
+        """
+        Indica si la IP es la de un Service.
+        """
+        return ip in self._by_ip
+
+    def resolve(self, ip):
+        """
+        Devuelve ((namespace, service), pods) para la IP de un Service, donde pods es un
+        frozenset de (namespace, nombre); o None si la IP no es de ningún Service.
+        """
+        self.wait_ready()
+        key = self._by_ip.get(ip)
+        if key is None:
+            return None
+        return key, self._backends.get(key, frozenset())
+
+    def size(self):
+        return len(self._ips)
+
+    def stats(self):
+        return {
+            "services": len(self._ips),
+            "service_ips": len(self._by_ip),
+            "endpoint_slices": len(self._slices),
+            "ready": self.is_ready(),
+        }
+
+    # --- Services ---
+
+    def _put_service(self, key, ips):
+        for ip in self._ips.get(key, ()):
+            if self._by_ip.get(ip) == key:
+                del self._by_ip[ip]
+        if ips:
+            self._ips[key] = ips
+            for ip in ips:
+                self._by_ip[ip] = key
+        else:
+            self._ips.pop(key, None)
+
+    def _load_services(self, items):
+        by_ip = {}
+        ips_by_key = {}
+        for svc in items:
+            key = (svc.metadata.namespace, svc.metadata.name)
+            ips = service_ips(svc)
+            if ips:
+                ips_by_key[key] = ips
+                for ip in ips:
+                    by_ip[ip] = key
+        with self._lock:
+            self._by_ip = by_ip
+            self._ips = ips_by_key
+        self._services_ready.set()
+        logger.info(f"[service_index] Índice de Services cargado: {len(ips_by_key)} Services, {len(by_ip)} IPs")
+
+    def _apply_service(self, event_type, svc):
+        key = (svc.metadata.namespace, svc.metadata.name)
+        with self._lock:
+            self._put_service(key, () if event_type == "DELETED" else service_ips(svc))
+
+    # --- EndpointSlices ---
+
+    def _refresh_backends(self, service):
+        names = self._slices_by_service.get(service)
+        if not names:
+            self._slices_by_service.pop(service, None)
+            self._backends.pop(service, None)
+            return
+        pods = frozenset().union(*(self._slices[(service[0], name)][1] for name in names))
+        self._backends[service] = pods
+
+    def _load_slices(self, items):
+        slices = {}
+        by_service = {}
+        for es in items:
+            service_name = (es.metadata.labels or {}).get(SERVICE_NAME_LABEL)
+            if not service_name:
+                continue
+            service = (es.metadata.namespace, service_name)
+            slices[(es.metadata.namespace, es.metadata.name)] = (service, slice_pods(es))
+            by_service.setdefault(service, set()).add(es.metadata.name)
+        backends = {
+            service: frozenset().union(*(slices[(service[0], name)][1] for name in names))
+            for service, names in by_service.items()
+        }
+        with self._lock:
+            self._slices = slices
+            self._slices_by_service = by_service
+            self._backends = backends
+        self._slices_ready.set()
+        logger.info(f"[service_index] Índice de EndpointSlices cargado: {len(slices)} slices, "
+                    f"{len(backends)} Services con endpoints")
+
+    def _apply_slice(self, event_type, es):
+        key = (es.metadata.namespace, es.metadata.name)
+        service_name = (es.metadata.labels or {}).get(SERVICE_NAME_LABEL)
+        with self._lock:
+            old = self._slices.pop(key, None)
+            if old is not None:
+                self._slices_by_service.get(old[0], set()).discard(es.metadata.name)
+                self._refresh_backends(old[0])
+            if event_type == "DELETED" or not service_name:
+                return
+            service = (es.metadata.namespace, service_name)
+            self._slices[key] = (service, slice_pods(es))
+            self._slices_by_service.setdefault(service, set()).add(es.metadata.name)
+            self._refresh_backends(service)
+
+    # --- Hilos ---
+
+    def start(self):
+        """
+        Arranca los hilos que mantienen el índice actualizado.
+        """
+        if not self._threads:
+            for watcher in self._watchers:
+                t = threading.Thread(target=watcher.run, args=(self._stop,), name=watcher.name, daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,122 @@
+"""
+Umbrales de las reglas: actuar solo tras N alertas de una firma desde la misma IP en T segundos.
+
+Equivale a un threshold.config de Suricata "type threshold, track by_src, count N,
+seconds T": cada N alertas de la misma IP de origen dentro de la ventana se dispara la
+acción una vez y el contador vuelve a empezar. El umbral va en la propia regla:
+
+    {"rule": 1001003, "description": "...", "action": 4, "threshold": {"count": 5, "seconds": 60}}
+
+Cada pareja (regla, IP) guarda solo las horas de sus últimas N alertas en un deque de
+tamaño N: cada alerta es O(1) y la memoria está acotada por max_keys. La ventana se mide
+con la hora del evento (limitada a la hora actual, por si el reloj de Suricata va
+adelantado); las parejas que llevan más de su ventana sin alertas, según el reloj
+monotónico del listener, se olvidan solas.
+
+Los contadores son del proceso; con varios workers de gunicorn, app.threshold_hit() cuenta
+cada pareja siempre en el mismo worker (ver peers.py).
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def parse_threshold(value):
+    """
+    Valida el umbral de una regla ({"count": N, "seconds": T}). Devuelve el umbral
+    normalizado, o None si no hay umbral (ausente, null o count 1), y lanza ValueError
+    si es inválido.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError("threshold debe ser un objeto con count y seconds")
+    try:
+        count = int(value.get("count"))
+        seconds = float(value.get("seconds"))
+    except (TypeError, ValueError):
+        raise ValueError("threshold.count debe ser un entero y threshold.seconds un número")
+    if count < 1 or seconds <= 0:
+        raise ValueError("threshold.count debe ser >= 1 y threshold.seconds > 0")
+    if count == 1:
+        return None
+    return {"count": count, "seconds": int(seconds) if seconds == int(seconds) else seconds}
+
+
+class ThresholdTracker:
+    """
+    Contadores de ventana deslizante por (regla, IP de origen). Seguro entre hilos.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # (regla, IP) -> [deque con las horas de las últimas alertas, ventana en segundos,
+        # time.monotonic() de la última alerta], del menos al más recientemente visto
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.triggered = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def hit(self, rule_id, src_ip, threshold, at=None):
+        """
+        Cuenta una alerta de la regla desde src_ip a la hora at (epoch; por defecto
+        ahora). Devuelve (disparada, alertas en la ventana actual).
+        """
+        wall = time.time()
+        now = wall if at is None else min(at, wall)
+        seen = time.monotonic()
+        count, seconds = threshold["count"], threshold["seconds"]
+        key = (rule_id, src_ip)
+        with self._lock:
+            self.hits += 1
+            entry = self._windows.get(key)
+            if entry is None or entry[0].maxlen != count or entry[1] != seconds:
+                entry = self._windows[key] = [deque(maxlen=count), seconds, seen]
+            else:
+                entry[2] = seen
+                self._windows.move_to_end(key)
+            times = entry[0]
+            # Las alertas pueden llegar algo desordenadas: la ventana se mantiene ordenada
+            if times and times[-1] > now:
+                now = times[-1]
+            times.append(now)
+            # Cada hora sale de la ventana una sola vez: coste amortizado O(1)
+            while now - times[0] > seconds:
+                times.popleft()
+            self._expire(seen)
+            if len(times) == count:
+                times.clear()
+                self.triggered += 1
+                return True, count
+            return False, len(times)
+
+    def _expire(self, now):
+        # Las claves más antiguas están al principio: se olvidan mientras su última alerta
+        # haya salido de su ventana (como mucho las que sobran, coste amortizado O(1))
+        windows = self._windows
+        while windows:
+            key, (times, seconds, seen) = next(iter(windows.items()))
+            if len(windows) > self.max_keys:
+                self.evicted += 1
+            elif not times or now - seen > seconds:
+                self.expired += 1
+            else:
+                break
+            del windows[key]
+
+    def size(self):
+        return len(self._windows)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._windows)
+        return {
+            "tracked": size,
+            "max_keys": self.max_keys,
+            "hits": self.hits,
+            "triggered": self.triggered,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,207 @@
+"""
+Pool de workers de remediación desacoplado de la respuesta HTTP de /alert.
+
+/alert solo valida el evento y encola un trabajo en una cola acotada; un número
+configurable de hilos la vacía y hace la búsqueda del pod y el PATCH contra la API
+de Kubernetes. Si la cola está llena el trabajo se rechaza (backpressure) en lugar
+de bloquear a fluent-bit.
+
+AsyncRemediationPool es la variante del núcleo asyncio (asgi.py): los trabajos son
+corrutinas que se ejecutan en el bucle de eventos, así que los PATCH en vuelo no
+ocupan un hilo cada uno.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class RemediationPool:
+    """
+    Cola acotada de trabajos de remediación y los hilos que la procesan.
+
+    Cada trabajo es una función sin argumentos que devuelve (respuesta, código HTTP),
+    igual que process_event(). El estado de los últimos trabajos se conserva para
+    poder consultarlo en /jobs/<id>. on_start, si se indica, recibe los segundos que
+    ha esperado cada trabajo en la cola.
+    """
+
+    def __init__(self, workers=4, queue_size=1000, history=10000, on_start=None):
+        self.workers = workers
+        self.on_start = on_start
+        self.queue_size = queue_size
+        self.history = history
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Arranca los hilos workers.
+        """
+        for _ in range(self.workers - len(self._threads)):
+            t = threading.Thread(target=self._run, name=f"remediation-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, fn, **info):
+        """
+        Encola un trabajo. Devuelve su id, o None si la cola está llena.
+        """
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": QUEUED, "submitted": time.time(), **info}
+        with self._lock:
+            try:
+                self._put((job, fn))
+            except queue.Full:
+                self.rejected += 1
+                return None
+            self.submitted += 1
+            self._jobs[job_id] = job
+            # Solo se guarda el historial de los últimos trabajos
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        return job_id
+
+    def get(self, job_id):
+        """
+        Devuelve una copia del estado de un trabajo, o None si no existe.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _put(self, item):
+        self._queue.put_nowait(item)
+
+    def _depth(self):
+        return self._queue.qsize()
+
+    def _begin(self, job):
+        with self._lock:
+            self._busy += 1
+            job["status"] = RUNNING
+            job["started"] = time.time()
+        if self.on_start is not None:
+            # Tiempo que el trabajo ha esperado en la cola
+            self.on_start(job["started"] - job["submitted"])
+
+    def _finish(self, job, result, code, error=None):
+        if error is not None:
+            logger.error(f"[workers] Error en el trabajo {job['id']}: {error}")
+            result, code = {"error": str(error)}, 500
+        status = DONE if code < 500 else FAILED
+        with self._lock:
+            self._busy -= 1
+            job.update(status=status, result=result, code=code, finished=time.time())
+            if status == DONE:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def _run(self):
+        while True:
+            job, fn = self._queue.get()
+            self._begin(job)
+            try:
+                result, code = fn()
+            except Exception as e:
+                self._finish(job, None, None, e)
+            else:
+                self._finish(job, result, code)
+            self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "queue_depth": self._depth(),
+                "queue_capacity": self.queue_size,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+class AsyncRemediationPool(RemediationPool):
+    """
+    RemediationPool para un bucle asyncio: cada trabajo es una función sin argumentos
+    que devuelve una corrutina con resultado (respuesta, código HTTP), y workers es el
+    número de tareas que la procesan (los trabajos en vuelo a la vez).
+
+    submit() se puede llamar desde cualquier hilo (p. ej. eve_tailer) y antes de
+    start(): los trabajos esperan en la cola hasta que start() arranca las tareas
+    dentro del bucle.
+    """
+
+    def __init__(self, workers=64, queue_size=1000, history=10000, on_start=None):
+        super().__init__(workers, queue_size, history, on_start)
+        self._queue = None
+        self._pending = deque()
+        self._loop = None
+        self._ready = None
+        self._tasks = []
+
+    def start(self):
+        """
+        Arranca las tareas workers en el bucle que está en ejecución.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._loop = loop
+            self._ready = asyncio.Semaphore(len(self._pending))
+        for _ in range(self.workers - len(self._tasks)):
+            self._tasks.append(loop.create_task(self._run()))
+        return self
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _put(self, item):
+        # Se llama con self._lock tomado
+        if len(self._pending) >= self.queue_size:
+            raise queue.Full
+        self._pending.append(item)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready.release)
+
+    def _depth(self):
+        return len(self._pending)
+
+    async def _run(self):
+        while True:
+            await self._ready.acquire()
+            with self._lock:
+                job, fn = self._pending.popleft()
+            self._begin(job)
+            try:
+                result, code = await fn()
+            except asyncio.CancelledError:
+                self._finish(job, None, None, "cancelado")
+                raise
+            except Exception as e:
+                self._finish(job, None, None, e)
+            else:
+                self._finish(job, result, code)